@@ -1 +0,0 @@
-from .models.settings import wallpaperCfg
\ No newline at end of file
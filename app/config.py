@@ -22,6 +22,10 @@ WALLPAPER_DIR = os.path.join(BASE_DIR, "wallpapers")
 CACHE_DIR = os.path.join(BASE_DIR, "cache")
 TOOLS_DIR = os.path.join(BASE_DIR, "tools")
 INDEX_FILE = os.path.join(BASE_DIR, "wallpaper_index.json")
+INDEX_DB_FILE = os.path.join(BASE_DIR, "wallpaper_index.db")
+INDEX_BIN_FILE = os.path.join(BASE_DIR, "wallpaper_index.bin")
+INDEX_SHARD_DIR = os.path.join(BASE_DIR, "index_shards")  # 附加壁纸目录的索引分片
+THUMBNAIL_PACK_FILE = os.path.join(BASE_DIR, "thumbnails.pack")
 EXCLUDE_FILE = os.path.join(BASE_DIR, "excluded.txt")
 APP_ICON = os.path.join(BASE_DIR, "app_icon.png")
 
@@ -39,3 +43,5 @@ REGISTRY_RUN_KEY = r"Software\Microsoft\Windows\CurrentVersion\Run"
 
 # 默认设置
 DEFAULT_ROTATION_INTERVAL = 30 * 60  # 30 分钟
+DEFAULT_RENDER_CACHE_MB = 2048  # 渲染缓存预算
+DEFAULT_THUMBNAIL_WORKERS = max(1, min(8, (os.cpu_count() or 2) - 1))  # 缩略图工作进程数，留一个核给界面
@@ -4,13 +4,15 @@ import os
 import sys
 import winreg as reg
 from ..views.dialogs import ProgressDialog, show_error, show_info
-import threading, time
+import time
 import random
 from ..utils.image_utils import ImageUtils
+from ..utils.image_metadata import display_size
 
 from .. import wallpaperCfg
 from ..models.wallpaper_model import WallpaperModel
-from ..models import wallpaper_index
+from ..models import wallpaper_index, access_tracker, render_cache
+from ..models.render_cache import render_key
 
 class WallpaperController(QObject):
     """壁纸管理控制器，处理业务逻辑"""
@@ -39,53 +41,124 @@ class WallpaperController(QObject):
     
     def initialize(self):
         """初始化应用"""
-        # 加载索引
-        if not self.model.load_index():
-            if not self.rebuild_index():
-                show_error(self.view, "错误", "构建索引失败!")
-                return False
-                
+        start = time.perf_counter()
+        # 加载索引；没有索引或启动参数要求重建时在后台构建
+        job = self.model.index_job
+        if job is None and not self.model.load_index():
+            job = self.rebuild_index()
+        elif job is None and self.model.has_interrupted_build():
+            # 上次构建被中断，在后台继续构建；已保存的部分可以直接使用
+            job = self.rebuild_index()
+            if self.model.filtered_keys:
+                self._start_session(start)
+                return True
+        if job is not None:
+            # 构建期间新找到的壁纸会陆续出现在图库中，完成后再选择壁纸
+            job.finished.connect(lambda success, cancelled: self._on_initial_build_finished(start, success, cancelled))
+            return True
+        self._start_session(start)
+        return True
+    
+    def _on_initial_build_finished(self, start, success, cancelled):
+        """启动时的构建结束后开始会话；退出时取消构建不会走到这里"""
+        if success and not cancelled and not getattr(self, "_cleaned_up", False):
+            self._start_session(start)
+    
+    def _start_session(self, start):
+        """索引就绪后选择壁纸，并启动缩略图生成、哈希校验和目录监视"""
         # 如果没有壁纸
         if not self.model.filtered_keys:
             show_error(self.view, "错误", "没有可用的壁纸!")
-            return True
+            return
         
         # 随机选择一张壁纸而不是总是从第一张开始
         if self.model.filtered_keys:
             random_key = random.choice(self.model.filtered_keys)
             self.model.set_current_key(random_key)
+            print(f"首张壁纸就绪耗时: {time.perf_counter() - start:.3f}s")
             
             # 异步生成缩略图
             self.generate_thumbnails_batch()
         
-        return True
+        # 后台补算尚未计算的完整哈希
+        self.verify_hashes_background()
+        
+        # 监视壁纸目录，增量更新索引
+        self.model.start_watching()
     
-    def rebuild_index(self):
-        """重建索引"""
-        dlg = ProgressDialog(self.view, "构建索引", "正在构建壁纸索引...")
+    def cleanup(self):
+        """退出前清理：停止监视，写入访问记录和所有未保存的索引修改"""
+        if getattr(self, "_cleaned_up", False):
+            return
+        self._cleaned_up = True
+        self.auto_change_timer.stop()
+        # 进行中的构建保存已应用的结果和检查点，下次启动时继续
+        if self.model.index_job is not None:
+            self.model.index_job.cancel()
+        # 未开始的缩略图任务直接丢弃，下次启动时重新生成
+        if self.model.thumbnail_job is not None:
+            self.model.thumbnail_job.cancel()
+        # 等待补算完整哈希的线程停止，已算出的结果在关闭索引前写入
+        if self.model.hash_verify_job is not None:
+            self.model.hash_verify_job.cancel()
+        self.model.stop_watching()
+        access_tracker.stop()
+        render_cache.stop()
+        wallpaper_index.close()
+        stats = wallpaper_index.save_stats()
+        print(f"索引保存统计: {stats['saves']} 次, 平均 {stats['avg_ms']:.1f} ms, "
+              f"最长 {stats['max_ms']:.1f} ms, 失败 {stats['failures']} 次")
+    
+    def rebuild_index(self, verify=False, on_finished=None):
+        """在后台重建索引，返回构建任务
+        
+        Args:
+            verify (bool): 是否强制重新计算所有文件的哈希
+            on_finished: 构建结束后的回调 (success, cancelled)
+        """
+        if self.model.index_job is not None:
+            show_info(self.view, "提示", "索引正在构建中")
+            return self.model.index_job
+        
+        job = self.model.start_index_job(verify)
+        dlg = ProgressDialog(self.view, "构建索引", "正在构建壁纸索引...", cancellable=True)
         
         # 连接信号
-        def progress_callback(current, total, filename):
-            dlg.update_progress(current, total, os.path.basename(filename))
+        def progress(current, total, filename, eta):
+            dlg.update_progress(current, total, os.path.basename(filename), eta)
         
-        success = self.model.build_index(progress_callback)
-        if not success:
-            show_error(self.view, "错误", "构建索引失败!")
-            
-        return success
+        def finished(success, cancelled):
+            dlg.close()
+            if not success and not cancelled:
+                show_error(self.view, "错误", "构建索引失败!")
+            if on_finished:
+                on_finished(success, cancelled)
+        
+        job.progress.connect(progress)
+        job.finished.connect(finished)
+        dlg.pauseToggled.connect(lambda paused: job.pause() if paused else job.resume())
+        dlg.cancelRequested.connect(job.cancel)
+        dlg.show()
+        return job
     
     @pyqtSlot()
     def refresh_index(self):
         """刷新索引"""
-        if not self.rebuild_index():
-            return
+        def finished(success, cancelled):
+            if cancelled:
+                if not getattr(self, "_cleaned_up", False):
+                    show_info(self.view, "提示", f"已取消刷新，已扫描的部分已保存（当前 {len(self.model.filtered_keys)} 张壁纸）")
+                return
+            if not success:
+                return
+            # 如果有壁纸，选择第一张
+            if self.model.filtered_keys:
+                self.model.set_current_key(self.model.filtered_keys[0])
+                show_info(self.view, "完成", f"索引已刷新! 找到 {len(self.model.filtered_keys)} 张可用壁纸")
+            else:
+                show_info(self.view, "提示", "未找到可用的壁纸!")
         
-        # 如果有壁纸，选择第一张
-        if self.model.filtered_keys:
-            self.model.set_current_key(self.model.filtered_keys[0])
-            show_info(self.view, "完成", f"索引已刷新! 找到 {len(self.model.filtered_keys)} 张可用壁纸")
-        else:
-            show_info(self.view, "提示", "未找到可用的壁纸!")
+        self.rebuild_index(on_finished=finished)
     
     @pyqtSlot()
     def next_wallpaper(self):
@@ -123,20 +196,28 @@ class WallpaperController(QObject):
             return
             
         try:
-            from PyQt6.QtGui import QImage
-            from PyQt6.QtCore import QRectF
-            from screeninfo import get_monitors
+            from PyQt6.QtGui import QImageReader
             
-            # 加载原图
-            original_img = QImage(info["path"])
+            # 原图尺寸取自索引中记录的文件头信息，旧索引没有时由 QImageReader 只读取文件头
+            reader = QImageReader(info["path"])
+            image_width, image_height = info.get("width"), info.get("height")
+            if not image_width or not image_height:
+                size = reader.size()
+                image_width, image_height = size.width(), size.height()
+            if image_width <= 0 or image_height <= 0:
+                raise ValueError("无法读取图片尺寸")
+            # 按 EXIF 方向自动旋转时，视图中的坐标对应旋转后的图片
+            transformed = reader.autoTransform() and info.get("orientation") not in (None, 1)
+            if transformed:
+                image_width, image_height = display_size(image_width, image_height, info["orientation"])
             
             # 获取缩放比例 - 需要场景大小
             scene_rect = self.view.homeInterface.image_view.scene.sceneRect()
             print(f"Scene Rect: {scene_rect}")
             
             # 计算缩放比例
-            scale_x = original_img.width() / scene_rect.width()
-            scale_y = original_img.height() / scene_rect.height()
+            scale_x = image_width / scene_rect.width()
+            scale_y = image_height / scene_rect.height()
             print(f"Scale: {scale_x}, {scale_y}")
 
             # 计算实际裁剪区域
@@ -147,45 +228,83 @@ class WallpaperController(QObject):
             print(f"Crop Rect: {crop_x}, {crop_y}, {crop_w}, {crop_h}")
             
             # 确保裁剪区域在图像范围内
-            crop_x = max(0, min(crop_x, original_img.width() - 1))
-            crop_y = max(0, min(crop_y, original_img.height() - 1))
-            crop_w = max(1, min(crop_w, original_img.width() - crop_x))
-            crop_h = max(1, min(crop_h, original_img.height() - crop_y))
-            
-            # 裁剪图片
-            cropped_img = original_img.copy(int(crop_x), int(crop_y), int(crop_w), int(crop_h))
-            
-            # 保存裁剪后的图片
-            name, ext = os.path.splitext(os.path.basename(info["path"]))
-            cache_filename = f"cropped_{name}{ext}"
-            cache_path = os.path.join(wallpaperCfg.cacheDir.value, cache_filename)
-            cropped_img.save(cache_path)
-            
-            # 获取屏幕分辨率
-            screen_width, screen_height = get_monitors()[0].width, get_monitors()[0].height
-            
-            # 调整图片适配屏幕
-            final_filename = f"fit_{name}{ext}"
-            final_cache_path = os.path.join(wallpaperCfg.cacheDir.value, final_filename)
+            crop_x = max(0, min(crop_x, image_width - 1))
+            crop_y = max(0, min(crop_y, image_height - 1))
+            crop_w = max(1, min(crop_w, image_width - crop_x))
+            crop_h = max(1, min(crop_h, image_height - crop_y))
             
-            # 根据需要缩小或放大图片，保存
-            ImageUtils.fit_image_to_screen(cache_path, final_cache_path, screen_width, screen_height)
-            
-            # 更新索引
             crop_region = {"x": crop_x, "y": crop_y, "width": crop_w, "height": crop_h}
-            self.model.update_crop_region(key, crop_region, final_filename)
+            cache_key, final_cache_path = self.render_crop(info, crop_region)
+            
+            # 更新索引：记录渲染缓存的键
+            self.model.update_crop_region(key, crop_region, cache_key)
             
             # 设置为壁纸
-            self.model.set_wallpaper(final_cache_path, async_mode=False)
+            self.model.set_wallpaper(final_cache_path, async_mode=False, key=key, render_key=cache_key)
             
         except Exception as e:
             show_error(self.view, "错误", f"裁剪失败: {str(e)}")
     
+    def render_crop(self, info, crop_region):
+        """按裁剪区域渲染适配屏幕的壁纸，返回 (渲染缓存的键, 文件路径)，已有渲染结果时直接复用
+        
+        crop_region 为原图坐标（按 EXIF 方向旋转后的图片）。渲染结果被缓存淘汰后，
+        设置壁纸时也由这里按索引中记录的裁剪区域重新渲染。
+        """
+        from PyQt6.QtGui import QImageReader
+        from PyQt6.QtCore import QRect
+        from screeninfo import get_monitors
+        
+        reader = QImageReader(info["path"])
+        transformed = reader.autoTransform() and info.get("orientation") not in (None, 1)
+        clip = QRect(int(crop_region["x"]), int(crop_region["y"]),
+                     int(crop_region["width"]), int(crop_region["height"]))
+        
+        # 获取屏幕分辨率
+        screen_width, screen_height = get_monitors()[0].width, get_monitors()[0].height
+        
+        # 渲染缓存的键由源图内容和全部渲染参数决定，相同的裁剪直接复用已有结果
+        ext = os.path.splitext(info["path"])[1].lower()
+        source_hash = info.get("hash") or info.get("sample_hash")
+        cache_key = render_key(source_hash, (clip.x(), clip.y(), clip.width(), clip.height()),
+                               (screen_width, screen_height), ImageUtils.upscale_params(), ext)
+        final_cache_path = render_cache.get(cache_key)
+        if final_cache_path:
+            return cache_key, final_cache_path
+        
+        # 裁剪图片：只解码裁剪区域；裁剪区域作用于旋转前的坐标，旋转过的图片解码整张再裁剪
+        if transformed:
+            cropped_img = reader.read().copy(clip)
+        else:
+            reader.setClipRect(clip)
+            cropped_img = reader.read()
+        if cropped_img.isNull():
+            raise ValueError(reader.errorString())
+        
+        # 裁剪结果和适配屏幕后的结果都先写到临时文件，完成后移入缓存
+        cropped_path = render_cache.temp_path(ext)
+        rendered_path = render_cache.temp_path(ext)
+        try:
+            cropped_img.save(cropped_path)
+            # 根据需要缩小或放大图片，保存
+            ImageUtils.fit_image_to_screen(cropped_path, rendered_path, screen_width, screen_height,
+                                           size=(cropped_img.width(), cropped_img.height()))
+        finally:
+            if os.path.exists(cropped_path):
+                os.remove(cropped_path)
+        final_cache_path = render_cache.put(cache_key, rendered_path, source_hash, {
+            "crop": [clip.x(), clip.y(), clip.width(), clip.height()],
+            "target": [screen_width, screen_height],
+            "upscale": ImageUtils.upscale_params(),
+            "format": ext,
+        })
+        return cache_key, final_cache_path
+    
     def _on_wallpaper_changed(self, key, info):
         """当前壁纸变化处理"""
         if self.view:
             self.view.update_wallpaper(key, info)
-            self.model.set_current_wallpaper()
+            self.model.set_current_wallpaper(render=self.render_crop)
     
     def open_gallery(self):
         """打开图库视图"""
@@ -253,21 +372,13 @@ class WallpaperController(QObject):
             if hasattr(self.view, "close_gallery"):
                 self.view.close_gallery()
 
-    def generate_thumbnails_batch(self, batch_size=40):
-        """分批生成缩略图"""
-        # 获取所有没有缩略图的壁纸
-        wallpapers = self.model.get_all_wallpapers()
-        need_thumbnail = [key for key, info in wallpapers.items() 
-                        if not info.get("view_pic")]
-        
-        # 优先处理非排除的壁纸
-        active_wallpapers = [k for k in need_thumbnail if not wallpapers[k].get("excluded", False)]
-        excluded_wallpapers = [k for k in need_thumbnail if wallpapers[k].get("excluded", False)]
-        prioritized_list = active_wallpapers + excluded_wallpapers
-        
-        total = len(prioritized_list)
-        if total == 0:
-            return
+    def generate_thumbnails_batch(self):
+        """在工作进程中分批生成缩略图，结果在主线程中写入索引"""
+        # 缩略图位置和颜色特征是延迟加载的字段，这里只按核心字段整理候选（已启用的优先），
+        # 缺少缩略图或颜色特征的由缩略图任务在后台加载完成后筛选
+        candidates = self.model.get_thumbnail_candidates()
+        if not candidates:
+            return None
         
         # 状态更新函数
         def update_status(current, total):
@@ -276,27 +387,13 @@ class WallpaperController(QObject):
                 if current >= total:
                     self.view.statusBar().showMessage("缩略图生成完成", 3000)  # 显示3秒
         
-        def worker():
-            for i in range(0, total, batch_size):
-                # 处理一批
-                batch = prioritized_list[i:i+batch_size]
-                for key in batch:
-                    self.model.get_thumbnail(key)
-                
-                # 更新状态
-                current = min(i + batch_size, total)
-                update_status(current, total)
-                
-                # 每批之间暂停一小段时间，避免占用太多资源
-                time.sleep(0.1)
-        
-        # 开始处理第一批，显示初始状态
-        update_status(0, total)
-        
-        # 启动后台线程
-        thread = threading.Thread(target=worker)
-        thread.daemon = True
-        thread.start()
+        job = self.model.start_thumbnail_job(candidates)
+        job.progress.connect(update_status)
+        return job
+
+    def verify_hashes_background(self):
+        """在后台线程中为只有采样哈希的壁纸补算完整哈希，结果由主线程写入索引"""
+        return self.model.start_hash_verify_job()
 
     def generate_thumbnail_for_file(self, key):
         """为指定文件生成缩略图（可用于在视图中按需生成）"""
@@ -433,6 +530,30 @@ class WallpaperController(QObject):
         if hasattr(self.view, "galleryInterface"):
             self.view.galleryInterface.set_data(wallpaper_data)
 
+    def search_wallpapers(self, query):
+        """搜索壁纸名称或相对路径，返回匹配的键集合"""
+        return self.model.search(query)
+    
+    def find_similar_wallpapers(self, key):
+        """查找与指定壁纸相似的壁纸，按相似程度排序"""
+        return self.model.find_similar(key)
+    
+    def get_duplicate_groups(self):
+        """获取相似壁纸分组"""
+        return self.model.get_duplicate_groups()
+    
+    def get_render_cache_stats(self):
+        """获取渲染缓存统计"""
+        return self.model.get_render_cache_stats()
+    
+    def cleanup_cache(self):
+        """清理无效缓存并按预算淘汰渲染结果，返回删除的文件数量"""
+        return self.model.cleanup_cache() + self.model.evict_render_cache()
+    
+    def trim_render_cache(self):
+        """渲染缓存预算变化后在后台淘汰"""
+        render_cache.request_eviction()
+    
     def get_wallpaper_data(self):
         """获取所有壁纸数据
     
@@ -441,13 +562,13 @@ class WallpaperController(QObject):
         """
         try:
             # 从模型中获取所有壁纸数据
-            wallpaper_data = self.model.get_all_wallpapers()
+            wallpaper_data = self.model.get_all_wallpapers(with_thumbnails=True)
             
             # 如果数据为空，尝试重建索引
             if not wallpaper_data and hasattr(self.model, 'load_index'):
                 print("壁纸数据为空，尝试重新加载索引...")
                 self.model.load_index()
-                wallpaper_data = self.model.get_all_wallpapers()
+                wallpaper_data = self.model.get_all_wallpapers(with_thumbnails=True)
             
             # 如果仍然为空，打印调试信息
             if not wallpaper_data:
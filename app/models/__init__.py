@@ -1,3 +1,8 @@
 from .index_manager import IndexManager
+from .library_index import LibraryIndex
 from .picture import Picture
-wallpaper_index = IndexManager()
\ No newline at end of file
+from .access_tracker import AccessTracker
+from .render_cache import RenderCache
+wallpaper_index = LibraryIndex()
+access_tracker = AccessTracker(wallpaper_index)
+render_cache = RenderCache()
\ No newline at end of file
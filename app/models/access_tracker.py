@@ -0,0 +1,80 @@
+import time
+import threading
+from typing import Callable, Dict, Optional
+
+from .index_manager import IndexManager
+
+
+class AccessTracker:
+    """壁纸展示记录
+
+    只有真正设置为壁纸时才记录访问，读取索引不会改变 last_accessed。
+    记录先进入内存缓冲区（键 -> 时间，同一张图片只保留最近一次），
+    缓冲区满时或定时线程通知后批量写入图片并保存索引。
+    定时线程不访问索引，只通过 start() 传入的回调（排队到主线程的信号）通知写入；
+    record()、flush() 和 stop() 在索引所在的线程调用。
+    """
+
+    def __init__(self, index: IndexManager, flush_interval: float = 60.0, max_pending: int = 256):
+        self.index = index
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, notify: Callable[[], None]) -> None:
+        """启动定时线程，有缓冲的记录时每隔 flush_interval 秒调用一次 notify"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, args=(notify,), daemon=True)
+        self._thread.start()
+
+    def record(self, key: str, timestamp: Optional[float] = None) -> None:
+        """记录一次展示"""
+        with self._lock:
+            self._pending[key] = timestamp or time.time()
+            full = len(self._pending) >= self.max_pending
+        if full:
+            self.flush()
+
+    def last_accessed(self, key: str) -> Optional[float]:
+        """最近一次展示时间（包含尚未写入的记录）"""
+        with self._lock:
+            if key in self._pending:
+                return self._pending[key]
+        pic = self.index.get_picture(key)
+        return pic.last_accessed if pic else None
+
+    def flush(self) -> int:
+        """把缓冲的记录写入索引，返回更新的图片数量"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        count = 0
+        for key, timestamp in pending.items():
+            pic = self.index.get_picture(key)
+            if pic and timestamp > pic.last_accessed:
+                pic.update_access_time(timestamp)
+                count += 1
+        if count:
+            self.index.schedule_save()
+        return count
+
+    def _run(self, notify: Callable[[], None]) -> None:
+        while not self._stop.wait(self.flush_interval):
+            with self._lock:
+                due = bool(self._pending)
+            if due:
+                try:
+                    notify()
+                except Exception as e:
+                    print(f"通知写入访问记录失败: {e}")
+
+    def stop(self) -> None:
+        """停止定时线程并写入剩余记录"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
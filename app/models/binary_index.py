@@ -0,0 +1,226 @@
+import gc
+import os
+import json
+import struct
+from typing import Any, Callable, Dict, List, Optional
+
+from .index_store import JsonIndexStore
+from .picture import parse_timestamp
+
+# 文件格式:
+#   头部: 魔数 | 版本(u16) | 保留(u16) | 元数据长度(u32) | 字符串表长度(u32) | 记录数(u32)
+#   元数据(JSON) | 字符串表(UTF-8，以 \0 分隔) | 定长记录 * 记录数
+MAGIC = b"WKIX"
+FORMAT_VERSION = 2
+HEADER = struct.Struct("<4sHHIII")
+
+# 记录: 11个字符串编号 | 标志(u8) | 访问时间、添加时间(f64) | 文件大小、修改时间(i64)
+#       | inode、设备号(u64) | 缩略图偏移、长度(i64) | 感知哈希(u64，版本2新增)
+RECORD_V1 = struct.Struct("<11IBddqqQQqq")
+RECORD = struct.Struct("<11IBddqqQQqqQ")
+NO_STRING = 0  # 字符串编号从1开始，0 表示 None
+NO_INT = -1
+NO_UINT = 0xFFFFFFFFFFFFFFFF
+
+FLAG_EXCLUDED = 0x01
+FLAG_FULL_RELATIVE = 0x02  # 相对路径不以文件名结尾，完整保存
+
+# 以定长字段保存的记录字段，其余字段以JSON保存在 extra 中
+RECORD_FIELDS = frozenset((
+    "path", "relative_path", "hash", "hash_algo", "sample_hash", "display_name",
+    "crop_region", "cache_path", "thumb_ref", "excluded", "last_accessed",
+    "added_date", "file_size", "mtime_ns", "inode", "device", "phash"))
+
+
+def _migrate_json_v0(data: Dict[str, Any]) -> Dict[str, Any]:
+    """版本0（JSON索引） -> 版本1：时间戳由 ISO 字符串改为 epoch 秒"""
+    for record in data.get("wallpapers", {}).values():
+        for field in ("last_accessed", "added_date"):
+            if field in record:
+                record[field] = parse_timestamp(record[field], 0.0)
+    return data
+
+
+def _migrate_v1(data: Dict[str, Any]) -> Dict[str, Any]:
+    """版本1 -> 版本2：新增感知哈希，旧记录在下次构建时补充"""
+    return data
+
+
+# 版本 n -> n + 1 的迁移函数，作用于解码后的字典
+MIGRATIONS: Dict[int, Callable[[Dict[str, Any]], Dict[str, Any]]] = {
+    0: _migrate_json_v0,
+    1: _migrate_v1,
+}
+
+
+def migrate(data: Dict[str, Any], version: int) -> Dict[str, Any]:
+    """把 version 版本的数据逐步迁移到当前版本"""
+    while version < FORMAT_VERSION:
+        data = MIGRATIONS[version](data)
+        version += 1
+    return data
+
+
+def encode_index(data: Dict[str, Any]) -> bytes:
+    """把索引字典编码为二进制"""
+    strings: List[str] = []
+    string_ids: Dict[str, int] = {}
+
+    def sid(value: Optional[str]) -> int:
+        if value is None:
+            return NO_STRING
+        index = string_ids.get(value)
+        if index is None:
+            index = string_ids[value] = len(strings) + 1
+            strings.append(value)
+        return index
+
+    def json_sid(value: Any) -> int:
+        return NO_STRING if not value else sid(json.dumps(value, ensure_ascii=False))
+
+    def int_or(value: Optional[int], default: int) -> int:
+        return default if value is None else value
+
+    records = bytearray()
+    wallpapers = data.get("wallpapers", {})
+    for key, record in wallpapers.items():
+        path = record.get("path", "")
+        name = os.path.basename(path)
+        relative_path = record.get("relative_path", "")
+        flags = FLAG_EXCLUDED if record.get("excluded") else 0
+        if relative_path.endswith(name):
+            rel = relative_path[:len(relative_path) - len(name)]
+        else:
+            rel = relative_path
+            flags |= FLAG_FULL_RELATIVE
+        display_name = record.get("display_name")
+        thumb_ref = record.get("thumb_ref") or (NO_INT, NO_INT)
+        phash = record.get("phash")
+        extra = {k: v for k, v in record.items() if k not in RECORD_FIELDS}
+        records += RECORD.pack(
+            sid(key), sid(path[:len(path) - len(name)]), sid(name), sid(rel),
+            sid(display_name if display_name is not None and display_name != name else None),
+            sid(record.get("hash")), sid(record.get("hash_algo")), sid(record.get("sample_hash")),
+            sid(record.get("cache_path")), json_sid(record.get("crop_region")), json_sid(extra),
+            flags,
+            parse_timestamp(record.get("last_accessed"), 0.0),
+            parse_timestamp(record.get("added_date"), 0.0),
+            int_or(record.get("file_size"), NO_INT), int_or(record.get("mtime_ns"), NO_INT),
+            int_or(record.get("inode"), NO_UINT), int_or(record.get("device"), NO_UINT),
+            thumb_ref[0], thumb_ref[1], int(phash, 16) if phash else NO_UINT)
+
+    meta = json.dumps({k: v for k, v in data.items() if k != "wallpapers"}).encode("utf-8")
+    string_blob = "\0".join(strings).encode("utf-8")
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(meta), len(string_blob), len(wallpapers))
+    return b"".join((header, meta, string_blob, bytes(records)))
+
+
+def _decode_records(record_struct: struct.Struct, buffer: memoryview, offset: int,
+                    meta: Dict[str, Any], strings: List[Optional[str]],
+                    count: int) -> Dict[str, Any]:
+    """解码定长记录，版本1的记录没有末尾的感知哈希"""
+    wallpapers = {}
+    loads = json.loads
+    end = offset + record_struct.size * count
+    for (key, path_dir, name, rel, display_name, file_hash, hash_algo, sample_hash,
+         cache_path, crop_region, extra, flags, last_accessed, added_date,
+         file_size, mtime_ns, inode, device, thumb_offset, thumb_length, *phash
+         ) in record_struct.iter_unpack(buffer[offset:end]):
+        name = strings[name]
+        record = loads(strings[extra]) if extra != NO_STRING else {}
+        record.update({
+            "path": strings[path_dir] + name,
+            "relative_path": strings[rel] if flags & FLAG_FULL_RELATIVE else strings[rel] + name,
+            "hash": strings[file_hash],
+            "hash_algo": strings[hash_algo],
+            "sample_hash": strings[sample_hash],
+            "display_name": strings[display_name] if display_name != NO_STRING else name,
+            "crop_region": loads(strings[crop_region]) if crop_region != NO_STRING else None,
+            "cache_path": strings[cache_path],
+            "thumb_ref": [thumb_offset, thumb_length] if thumb_offset != NO_INT else None,
+            "excluded": bool(flags & FLAG_EXCLUDED),
+            "last_accessed": last_accessed,
+            "added_date": added_date,
+            "file_size": file_size if file_size != NO_INT else None,
+            "mtime_ns": mtime_ns if mtime_ns != NO_INT else None,
+            "inode": inode if inode != NO_UINT else None,
+            "device": device if device != NO_UINT else None,
+            "phash": f"{phash[0]:016x}" if phash and phash[0] != NO_UINT else None,
+        })
+        wallpapers[strings[key]] = record
+    meta["wallpapers"] = wallpapers
+    return meta
+
+
+# 各版本的记录格式，旧版本解码后再通过 MIGRATIONS 升级
+RECORDS = {
+    1: RECORD_V1,
+    2: RECORD,
+}
+
+
+def decode_index(data: bytes) -> Dict[str, Any]:
+    """解码二进制索引，旧版本自动迁移到当前版本"""
+    buffer = memoryview(data)
+    if len(buffer) < HEADER.size:
+        raise ValueError("索引文件不完整")
+    magic, version, _, meta_len, strings_len, count = HEADER.unpack_from(buffer)
+    if magic != MAGIC:
+        raise ValueError("不是有效的索引文件")
+    if version not in RECORDS:
+        raise ValueError(f"不支持的索引文件版本: {version}")
+
+    offset = HEADER.size
+    meta = json.loads(bytes(buffer[offset:offset + meta_len]))
+    offset += meta_len
+    strings: List[Optional[str]] = [None]
+    if strings_len or count:
+        # 有记录时至少有一个字符串（键），字符串表为空说明只有一个空字符串
+        strings += bytes(buffer[offset:offset + strings_len]).decode("utf-8").split("\0")
+    offset += strings_len
+    if len(buffer) < offset + RECORDS[version].size * count:
+        raise ValueError("索引文件不完整")
+    # 解码会创建大量字典，期间暂停循环垃圾回收（结果不含循环引用）
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        data = _decode_records(RECORDS[version], buffer, offset, meta, strings, count)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return migrate(data, version)
+
+
+class BinaryIndexStore(JsonIndexStore):
+    """二进制快照 + 追加写日志
+
+    快照使用带版本号的定长记录格式，日志和后台合并与 JsonIndexStore 相同。
+    首次使用时如果存在旧的JSON索引，从中迁移（下次合并或整体保存时写出二进制快照）。
+    """
+
+    def __init__(self, path: str, legacy_json: Optional[str] = None, **kwargs):
+        super().__init__(path, **kwargs)
+        self.legacy_json = legacy_json
+
+    def exists(self) -> bool:
+        if super().exists():
+            return True
+        return bool(self.legacy_json and JsonIndexStore(self.legacy_json).exists())
+
+    def _read_snapshot(self) -> Dict[str, Any]:
+        if os.path.exists(self.path):
+            with open(self.path, 'rb') as f:
+                return decode_index(f.read())
+        if self.legacy_json and JsonIndexStore(self.legacy_json).exists():
+            print(f"正在迁移旧索引: {self.legacy_json}")
+            return migrate(JsonIndexStore(self.legacy_json).load() or {"wallpapers": {}}, 0)
+        return {"wallpapers": {}}
+
+    def _write_temp(self, data: Dict[str, Any], suffix: str = ".tmp") -> str:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temp_file = f"{self.path}{suffix}"
+        with open(temp_file, 'wb') as f:
+            f.write(encode_index(data))
+            f.flush()
+            os.fsync(f.fileno())
+        return temp_file
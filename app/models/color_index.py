@@ -0,0 +1,145 @@
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.utils.color_features import PALETTE_SIZE, parse_palettes, rgb_to_lab
+
+MIN_WEIGHT = 0.05  # 占比低于此值的主色不参与按颜色查找
+
+Features = Tuple[float, float, str]  # (平均亮度, 色彩丰富度, 主色)
+
+
+class ColorIndex:
+    """颜色特征的稠密矩阵，查询时对所有图片做一次向量化计算
+
+    每张图片占一行：Lab 主色 (K, 3)、主色占比 (K,)、平均亮度和色彩丰富度，均为 float32。
+    主色按槽位优先存放（形状 (K, N, ...)），在 K 这一维上的归约是对连续数组逐元素计算，比在最内层的小维度上归约快得多。
+    删除的行进入空闲列表复用，修改和删除都是 O(1)，不需要重建矩阵。
+    """
+
+    def __init__(self, palette_size: int = PALETTE_SIZE):
+        self.palette_size = palette_size
+        self.clear()
+
+    def clear(self) -> None:
+        self._rows: Dict[str, int] = {}
+        self._keys: List[Optional[str]] = []
+        self._features: List[Optional[Features]] = []  # 每行的原始特征，未变化时跳过更新
+        self._free: List[int] = []
+        self._colors = np.zeros((self.palette_size, 0, 3), dtype=np.float32)
+        self._norms = np.zeros((self.palette_size, 0), dtype=np.float32)  # 各主色 Lab 向量的平方长度
+        self._weights = np.zeros((self.palette_size, 0), dtype=np.float32)
+        self._luminance = np.zeros(0, dtype=np.float32)
+        self._colorfulness = np.zeros(0, dtype=np.float32)
+        self._valid = np.zeros(0, dtype=bool)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _grow(self, needed: int = 1) -> None:
+        capacity = max(1024, len(self._keys) * 2, len(self._keys) + needed)
+        extra = capacity - len(self._keys)
+        k = self.palette_size
+        self._colors = np.concatenate([self._colors, np.zeros((k, extra, 3), np.float32)], axis=1)
+        self._norms = np.concatenate([self._norms, np.zeros((k, extra), np.float32)], axis=1)
+        self._weights = np.concatenate([self._weights, np.zeros((k, extra), np.float32)], axis=1)
+        self._luminance = np.concatenate([self._luminance, np.zeros(extra, np.float32)])
+        self._colorfulness = np.concatenate([self._colorfulness, np.zeros(extra, np.float32)])
+        self._valid = np.concatenate([self._valid, np.zeros(extra, bool)])
+        self._free.extend(range(capacity - 1, len(self._keys) - 1, -1))
+        self._keys.extend([None] * extra)
+        self._features.extend([None] * extra)
+
+    def add(self, key: str, luminance: float, colorfulness: float, palette: str) -> None:
+        """添加或更新图片的颜色特征"""
+        self.add_many([(key, (luminance, colorfulness, palette))])
+
+    def add_many(self, items: Iterable[Tuple[str, Features]]) -> None:
+        """批量添加或更新，主色解析和颜色空间转换一次完成"""
+        changed = [(key, features) for key, features in items
+                   if key not in self._rows or self._features[self._rows[key]] != features]
+        if not changed:
+            return
+        new_keys = sum(1 for key, _ in changed if key not in self._rows)
+        if new_keys > len(self._free):
+            self._grow(new_keys - len(self._free))
+        rows = []
+        for key, features in changed:
+            row = self._rows.get(key)
+            if row is None:
+                row = self._free.pop()
+                self._rows[key] = row
+                self._keys[row] = key
+            self._features[row] = features
+            rows.append(row)
+        rows = np.asarray(rows)
+        colors, weights = parse_palettes([features[2] for _, features in changed], self.palette_size)
+        colors = colors.transpose(1, 0, 2)
+        self._colors[:, rows] = colors
+        self._norms[:, rows] = (colors * colors).sum(axis=-1)
+        self._weights[:, rows] = weights.T
+        self._luminance[rows] = [features[0] for _, features in changed]
+        self._colorfulness[rows] = [features[1] for _, features in changed]
+        self._valid[rows] = True
+
+    def remove(self, key: str) -> None:
+        row = self._rows.pop(key, None)
+        if row is None:
+            return
+        self._keys[row] = None
+        self._features[row] = None
+        self._valid[row] = False
+        self._free.append(row)
+
+    def _distances(self, colors: np.ndarray) -> np.ndarray:
+        """colors (M, 3) 中每种颜色到库中每种主色的 Lab 距离，形状 (M, K, N)
+
+        用 |a - b|² = |a|² + |b|² - 2a·b 展开，主要计算是一次矩阵乘法。
+        """
+        squared = colors @ self._colors.reshape(-1, 3).T
+        squared *= -2
+        squared += self._norms.reshape(1, -1)
+        squared += (colors * colors).sum(axis=1)[:, None]
+        np.maximum(squared, 0, out=squared)
+        return np.sqrt(squared, out=squared).reshape(len(colors), self.palette_size, -1)
+
+    def _top(self, scores: np.ndarray, limit: Optional[int],
+             skip: Iterable[str] = ()) -> List[Tuple[float, str]]:
+        """有效行中得分最小的 limit 个 (得分, 键)，按得分升序，skip 中的键在取前 limit 个之前去掉"""
+        mask = self._valid & np.isfinite(scores)
+        skipped = [self._rows[key] for key in skip if key in self._rows]
+        if skipped:
+            mask[skipped] = False
+        rows = np.flatnonzero(mask)
+        if limit is not None and limit < len(rows):
+            rows = rows[np.argpartition(scores[rows], limit)[:limit]]
+        rows = rows[np.argsort(scores[rows], kind="stable")]
+        keys = self._keys
+        return [(float(score), keys[row]) for score, row in zip(scores[rows].tolist(), rows.tolist())]
+
+    def by_luminance(self, max_luminance: float = 1.0, min_luminance: float = 0.0,
+                     limit: Optional[int] = None, skip: Iterable[str] = ()) -> List[Tuple[float, str]]:
+        """平均亮度在范围内的 (亮度, 键)，从暗到亮排序"""
+        scores = np.where((self._luminance >= min_luminance) & (self._luminance <= max_luminance),
+                          self._luminance, np.inf)
+        return self._top(scores, limit, skip)
+
+    def similar_palette(self, palette: str, limit: Optional[int] = None,
+                        skip: Iterable[str] = ()) -> List[Tuple[float, str]]:
+        """与给定主色最接近的 (距离, 键)
+
+        距离为双向加权倒角距离：每种主色到对方最近主色的 Lab 距离按占比加权求和，两个方向取平均。
+        """
+        colors, weights = parse_palettes([palette], self.palette_size)
+        distances = self._distances(colors[0])
+        forward = (distances.min(axis=0) * self._weights).sum(axis=0)
+        backward = weights[0] @ distances.min(axis=1)
+        return self._top((forward + backward) / 2, limit, skip)
+
+    def nearest_color(self, rgb: Sequence[int], limit: Optional[int] = None,
+                      skip: Iterable[str] = ()) -> List[Tuple[float, str]]:
+        """主色中含有与 rgb 最接近颜色的 (Lab 距离, 键)"""
+        target = rgb_to_lab(np.asarray([rgb[:3]], dtype=np.float32))
+        distances = self._distances(target)[0]
+        distances[self._weights < MIN_WEIGHT] = np.inf
+        return self._top(distances.min(axis=0), limit, skip)
@@ -0,0 +1,114 @@
+import os
+import json
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+# Windows 上 DirEntry.stat() 来自目录枚举，不需要额外系统调用，但 st_ino/st_dev 为 0，
+# 无法与记录的 inode 比较，只在其他平台上复用
+DIRENTRY_STAT = os.name != "nt"
+MTIME_SLACK_NS = 2_000_000_000  # 扫描前这段时间内修改过的目录不记录（FAT 等文件系统的时间精度为 2 秒）
+
+DirRecord = Tuple[Optional[int], List[str]]  # (目录修改时间, 子目录名)
+
+
+class DirTree:
+    """持久化的目录修改时间树
+
+    记录上次完整扫描时每个目录的修改时间和子目录。目录的修改时间只在其直接子项
+    新增、删除或改名时变化，未变化的目录不需要重新列出，其中的文件直接取自索引。
+    记录与索引的保存时间戳绑定，索引不是由这次记录对应的扫描保存时整体作废。
+    """
+
+    VERSION = 1
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def load(self, root: str, stamp: Optional[float]) -> Optional[Dict[str, DirRecord]]:
+        """读取记录，根目录或索引时间戳不一致时返回 None"""
+        if stamp is None:
+            return None
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"读取目录记录失败: {e}")
+            return None
+        if data.get("version") != self.VERSION or data.get("root") != root or data.get("stamp") != stamp:
+            return None
+        return {rel_dir: (record[0], record[1]) for rel_dir, record in data.get("dirs", {}).items()}
+
+    def save(self, root: str, stamp: Optional[float], dirs: Dict[str, DirRecord]) -> bool:
+        """原子写入记录"""
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            temp_file = f"{self.path}.tmp"
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump({"version": self.VERSION, "root": root, "stamp": stamp, "dirs": dirs},
+                          f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(temp_file, self.path)
+            return True
+        except Exception as e:
+            print(f"保存目录记录失败: {e}")
+            return False
+
+    def restamp(self, root: str, old_stamp: Optional[float], stamp: Optional[float]) -> bool:
+        """索引增量保存后把仍然有效的记录（时间戳为 old_stamp）更新为新的时间戳"""
+        dirs = self.load(root, old_stamp)
+        if dirs is None:
+            return False
+        return self.save(root, stamp, dirs)
+
+
+def scan_images(root: str, previous: Optional[Dict[str, DirRecord]] = None,
+                known_files: Optional[Dict[str, List[str]]] = None,
+                tree: Optional[Dict[str, DirRecord]] = None
+                ) -> Iterator[Tuple[str, Optional[os.stat_result], bool]]:
+    """用 os.scandir 流式遍历图片文件，逐个产出 (路径, 文件状态, 目录是否未变化)
+
+    previous 为上次扫描的目录记录，known_files 为各目录（相对路径）下已索引的文件路径。
+    修改时间与记录一致的目录不再列出，直接产出其中已索引的文件（文件状态为 None），
+    子目录仍逐个检查修改时间。tree 不为 None 时填入本次扫描的目录记录。
+    能复用 DirEntry 的文件状态时一并产出，否则为 None。
+    """
+    limit_ns = time.time_ns() - MTIME_SLACK_NS
+    stack = [""]
+    while stack:
+        rel_dir = stack.pop()
+        path = os.path.join(root, rel_dir) if rel_dir else root
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            continue
+        record = previous.get(rel_dir) if previous is not None else None
+        if record and record[0] == mtime and known_files is not None:
+            # 目录未变化：跳过列目录，已索引的文件直接产出
+            subdirs = record[1]
+            for filepath in known_files.get(rel_dir, ()):
+                yield filepath, None, True
+        else:
+            subdirs = []
+            try:
+                with os.scandir(path) as it:
+                    entries = sorted(it, key=lambda entry: entry.name)
+            except OSError:
+                continue
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.name)
+                        continue
+                    if not entry.name.lower().endswith(IMAGE_EXTENSIONS) or not entry.is_file():
+                        continue
+                    st = entry.stat() if DIRENTRY_STAT else None
+                except OSError:
+                    continue
+                yield entry.path, st, False
+        if tree is not None:
+            # 刚修改过的目录可能在同一时间精度内再次变化，不记录修改时间，下次重新列出
+            tree[rel_dir] = (mtime if mtime < limit_ns else None, subdirs)
+        stack.extend(os.path.join(rel_dir, name) if rel_dir else name for name in reversed(subdirs))
@@ -0,0 +1,127 @@
+import queue
+import threading
+import time
+from typing import List, Optional
+
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+
+from .index_pipeline import HashResult, HashTask, hash_file
+
+_DONE = object()  # 队列结束标记
+
+
+class HashVerifyJob(QObject):
+    """后台补算完整哈希
+
+    工作线程只读取文件计算哈希，结果经队列交回主线程，由定时器分批写入索引
+    （索引只在主线程修改），每隔 commit_interval 秒请求保存一次。
+    cancel() 停止并等待工作线程，退出前在关闭索引之前调用。
+    """
+
+    progress = pyqtSignal(int, int)  # 已完成数, 总数
+    finished = pyqtSignal(bool)  # 是否被取消
+
+    def __init__(self, index, algorithm: str, interval_ms: int = 200,
+                 commit_interval: float = 5.0, parent=None):
+        """
+        Args:
+            index: 提供 hash_verify_tasks() 和 apply_verified_hashes() 的索引（LibraryIndex）
+            algorithm: 哈希算法
+            interval_ms: 两次写入之间的间隔
+            commit_interval: 请求保存的间隔（秒）
+        """
+        super().__init__(parent)
+        self.index = index
+        self.algorithm = algorithm
+        self.commit_interval = commit_interval
+        self._results: queue.Queue = queue.Queue()
+        self._stop = threading.Event()
+        self._worker_done = False
+        self._thread: Optional[threading.Thread] = None
+        self._timer = QTimer(self)
+        self._timer.setInterval(interval_ms)
+        self._timer.timeout.connect(self._tick)
+        self._total = 0
+        self._done = 0
+        self._applied = 0
+        self._last_commit = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self) -> bool:
+        """启动工作线程，没有需要补算的图片时返回 False（finished 仍会异步发出）"""
+        if self._thread is not None:
+            return True
+        tasks = self.index.hash_verify_tasks()
+        if not tasks:
+            QTimer.singleShot(0, lambda: self.finished.emit(False))
+            return False
+        self._total = len(tasks)
+        self._last_commit = time.monotonic()
+        self._thread = threading.Thread(target=self._work, args=(tasks,), daemon=True)
+        self._thread.start()
+        self._timer.start()
+        return True
+
+    def cancel(self, timeout: float = 3.0) -> None:
+        """停止工作线程并写入已算出的结果"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._apply(self._drain())
+        self._finish(cancelled=True)
+
+    def _work(self, tasks: List[HashTask]) -> None:
+        try:
+            for task in tasks:
+                if self._stop.is_set():
+                    break
+                self._results.put(hash_file(task, self.algorithm))
+        finally:
+            self._results.put(_DONE)
+
+    def _drain(self) -> List[HashResult]:
+        """取出已就绪的结果，取到结束标记时记下工作线程已结束"""
+        results: List[HashResult] = []
+        while True:
+            try:
+                item = self._results.get_nowait()
+            except queue.Empty:
+                return results
+            if item is _DONE:
+                self._worker_done = True
+                return results
+            results.append(item)
+
+    def _apply(self, results: List[HashResult]) -> None:
+        if results:
+            self._done += len(results)
+            self._applied += self.index.apply_verified_hashes(results)
+
+    def _tick(self) -> None:
+        try:
+            self._apply(self._drain())
+        except Exception as e:
+            print(f"写入完整哈希失败: {e}")
+            self.cancel()
+            return
+        self.progress.emit(self._done, self._total)
+        if self._worker_done:
+            self._finish(cancelled=False)
+        elif time.monotonic() - self._last_commit >= self.commit_interval:
+            self._commit()
+
+    def _commit(self) -> None:
+        self._last_commit = time.monotonic()
+        if self._applied:
+            self._applied = 0
+            self.index.schedule_save()
+
+    def _finish(self, cancelled: bool) -> None:
+        self._timer.stop()
+        self._thread = None
+        self._commit()
+        self.finished.emit(cancelled)
@@ -0,0 +1,154 @@
+import time
+from typing import List, Optional, Tuple
+
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+
+from .index_manager import IndexManager
+from .index_pipeline import BuildSession
+
+
+class IndexJob(QObject):
+    """后台索引构建任务
+
+    遍历和哈希计算在流水线的后台线程中进行，结果经线程安全的队列交回主线程，
+    由定时器按时间片分批应用（索引只在主线程修改，界面在构建期间保持响应）。
+    已应用的结果每隔 commit_interval 秒提交一次：请求保存并发出 batchCommitted，
+    新找到的壁纸在扫描过程中就会出现在列表中。支持暂停、继续和取消。
+    """
+
+    progress = pyqtSignal(int, int, str, float)  # 已处理数, 已发现数, 文件名, 预计剩余秒数（未知为 -1）
+    batchCommitted = pyqtSignal(int)  # 本批新增的图片数量
+    finished = pyqtSignal(bool, bool)  # 是否完整构建成功（取消时为 False）, 是否被取消
+
+    def __init__(self, index, verify: bool = False, interval_ms: int = 30,
+                 slice_ms: int = 15, commit_interval: float = 1.0, parent=None):
+        """
+        Args:
+            index: 提供 begin_build() 的索引（LibraryIndex）
+            verify: 是否强制重新计算所有文件的完整哈希
+            interval_ms: 两次应用之间的间隔
+            slice_ms: 每次在主线程上应用结果的最长时间
+            commit_interval: 提交已应用结果的间隔（秒）
+        """
+        super().__init__(parent)
+        self.index = index
+        self.verify = verify
+        self.slice = slice_ms / 1000
+        self.commit_interval = commit_interval
+        self._sessions: List[Tuple[IndexManager, BuildSession]] = []
+        self._timer = QTimer(self)
+        self._timer.setInterval(interval_ms)
+        self._timer.timeout.connect(self._tick)
+        self._running = False
+        self._paused_at: Optional[float] = None
+        self._paused_total = 0.0
+        self._started_at = 0.0
+        self._last_commit = 0.0
+        self._uncommitted: List[IndexManager] = []
+        self._added = 0
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    @property
+    def paused(self) -> bool:
+        return self._paused_at is not None
+
+    def start(self) -> bool:
+        """启动流水线，没有可扫描的目录时返回 False（finished 仍会异步发出）"""
+        if self._running:
+            return True
+        self._sessions = self.index.begin_build(self.verify)
+        if not self._sessions:
+            QTimer.singleShot(0, lambda: self.finished.emit(False, False))
+            return False
+        self._running = True
+        self._started_at = self._last_commit = time.monotonic()
+        self._timer.start()
+        return True
+
+    def pause(self) -> None:
+        """暂停遍历、哈希计算和结果应用"""
+        if not self._running or self.paused:
+            return
+        self._paused_at = time.monotonic()
+        self._timer.stop()
+        for _, session in self._sessions:
+            session.pipeline.pause()
+
+    def resume(self) -> None:
+        if not self._running or not self.paused:
+            return
+        self._paused_total += time.monotonic() - self._paused_at
+        self._paused_at = None
+        for _, session in self._sessions:
+            session.pipeline.resume()
+        self._timer.start()
+
+    def cancel(self) -> None:
+        """取消构建，已应用的结果会保存，未扫描到的图片保留到下次构建
+
+        取消的构建不算成功，finished 发出 (False, True)。
+        """
+        if self._running:
+            self._finish(cancelled=True, success=False)
+
+    def _eta(self, processed: int, discovered: int) -> float:
+        """按已处理速度估算剩余时间，遍历未结束时总数还会增长，估算偏低"""
+        elapsed = time.monotonic() - self._started_at - self._paused_total
+        if processed <= 0 or elapsed <= 0:
+            return -1.0
+        return max(0, discovered - processed) * elapsed / processed
+
+    def _tick(self) -> None:
+        deadline = time.perf_counter() + self.slice
+        filename = ""
+        try:
+            for shard, session in self._sessions:
+                pipeline = session.pipeline
+                while not pipeline.finished and time.perf_counter() < deadline:
+                    results = pipeline.poll(timeout=0, limit=64)
+                    if not results:
+                        break
+                    self._added += shard.apply_build_results(session, results)
+                    if shard not in self._uncommitted:
+                        self._uncommitted.append(shard)
+                    filename = results[-1].rel_path
+        except Exception as e:
+            print(f"应用索引结果失败: {e}")
+            self._finish(cancelled=False, success=False)
+            return
+
+        processed = sum(session.pipeline.processed for _, session in self._sessions)
+        discovered = sum(session.pipeline.discovered for _, session in self._sessions)
+        if filename:
+            self.progress.emit(processed, discovered, filename, self._eta(processed, discovered))
+
+        if all(session.pipeline.finished for _, session in self._sessions):
+            self._finish(cancelled=False)
+        elif time.monotonic() - self._last_commit >= self.commit_interval:
+            self._commit()
+
+    def _commit(self) -> None:
+        """提交已应用的结果：后台保存并通知界面刷新"""
+        self._last_commit = time.monotonic()
+        for shard in self._uncommitted:
+            shard.schedule_save()
+        self._uncommitted = []
+        added, self._added = self._added, 0
+        self.batchCommitted.emit(added)
+
+    def _finish(self, cancelled: bool, success: bool = True) -> None:
+        self._timer.stop()
+        self._running = False
+        self._paused_at = None
+        for shard, session in self._sessions:
+            try:
+                shard.finish_build(session, cancelled=cancelled or not success)
+            except Exception as e:
+                print(f"保存索引失败: {shard.root}, 错误: {e}")
+                success = False
+        self._uncommitted = []
+        self._sessions = []
+        self.finished.emit(success, cancelled)
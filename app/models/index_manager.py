@@ -1,39 +1,215 @@
-import time, json
+import time
 import threading, os
 import base64
 from PIL import Image  # 使用 Pillow 处理图像
 from io import BytesIO
-from typing import Dict, List, Optional, Tuple, Callable, Any, Union
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Callable, Any, Union
 from .picture import Picture
+from .index_store import IndexStore, JsonIndexStore, SqliteIndexStore
+from .binary_index import BinaryIndexStore
+from .thumbnail_pack import ThumbnailPack
+from .secondary_index import PictureIndexes
+from .similarity_index import DEFAULT_RADIUS, cluster_hashes
+from .save_scheduler import IndexSnapshot, SaveScheduler
+from .index_pipeline import (BuildCheckpoint, BuildSession, HashPipeline, HashResult, HashTask, ScanResult,
+                             fingerprint_file, hash_file)
+from .dir_scanner import DirTree
+from .thumbnail_engine import ThumbnailResult, ThumbnailTask
+from app.utils.thumbnail import create_thumbnail
 from app.utils.image_utils import ImageUtils  # 确保图像处理工具类已正确导入
+from app.utils.fingerprint import sampled_hash
+from app.utils.color_features import compute_color_features
 
 from .settings import wallpaperCfg # 确保配置类已正确导入
 
+CHECKPOINT_INTERVAL = 30.0  # 构建过程中保存检查点的间隔（秒）
+CHECKPOINT_FILES = 5000  # 或者每处理这么多文件保存一次
+
 class IndexManager:
     """壁纸索引管理类"""
     
-    def __init__(self):
+    def __init__(self, store: Optional[IndexStore] = None, root: Optional[str] = None,
+                 thumbnail_pack: Optional[str] = None, key_prefix: str = ""):
+        """
+        Args:
+            store: 存储后端，默认按配置创建
+            root: 壁纸目录，默认使用配置中的主目录（随配置变化）
+            thumbnail_pack: 缩略图包路径，默认使用配置中的路径
+            key_prefix: 新图片键的前缀，用于区分不同目录的索引分片
+        """
+        self._root = root
+        self.key_prefix = key_prefix
         self.wallpaper_index: Dict[str, Picture] = {}
+        self.indexes = PictureIndexes()
         self.total_count: int = 0
         self.last_updated: Optional[float] = None
-        self._modified: bool = False
-        self.auto_save_timer = None
-        self._start_auto_save()
+        self._modified: bool = False  # 元数据是否修改
+        self._dirty: Set[str] = set()  # 需要写入的图片键
+        self._deleted: Set[str] = set()  # 需要删除的图片键
+        self._picture_listener = self._on_picture_changed  # 所有图片共用一个回调对象
+        self._picture_loader = self._load_picture_extra
+        self._extra_lock = threading.RLock()
+        self._extra_thread: Optional[threading.Thread] = None
+        self._load_generation = 0
+        self._extras_notify: Optional[Callable[[], None]] = None
+        # 后台加载时遇到的旧索引内联缩略图，由 apply_loaded_extras 在索引所在的线程写入缩略图包
+        self._migrations: List[Tuple[Picture, str]] = []
+        self.load_timings: Dict[str, float] = {}  # 核心字段/完整加载耗时（秒）
+        self.store: IndexStore = store or self._create_store()
+        # 目录修改时间记录与索引文件放在一起，没有文件路径的存储不记录
+        store_path = getattr(self.store, "path", None)
+        self.dir_tree: Optional[DirTree] = DirTree(f"{store_path}.dirs") if store_path else None
+        self.checkpoint: Optional[BuildCheckpoint] = BuildCheckpoint(f"{store_path}.build") if store_path else None
+        self.thumbnails = ThumbnailPack(thumbnail_pack or wallpaperCfg.thumbnailPack.value)
+        self.saver = SaveScheduler(self)
+    
+    @property
+    def root(self) -> str:
+        """壁纸目录"""
+        return self._root or wallpaperCfg.wallpaperDir.value
+    
+    @staticmethod
+    def _create_store(shard: Optional[str] = None) -> IndexStore:
+        """根据配置创建存储后端，shard 为附加目录的分片名（存放在分片目录中）"""
+        backend = wallpaperCfg.indexBackend.value
+        if shard:
+            extension = {"sqlite": ".db", "binary": ".bin"}.get(backend, ".json")
+            path = os.path.join(wallpaperCfg.indexShardDir.value, shard + extension)
+            if backend == "sqlite":
+                return SqliteIndexStore(path)
+            if backend == "binary":
+                return BinaryIndexStore(path)
+            return JsonIndexStore(path)
+        if backend == "sqlite":
+            return SqliteIndexStore(wallpaperCfg.indexDbFile.value,
+                                    legacy_json=wallpaperCfg.indexFile.value)
+        if backend == "binary":
+            return BinaryIndexStore(wallpaperCfg.indexBinFile.value,
+                                    legacy_json=wallpaperCfg.indexFile.value)
+        return JsonIndexStore(wallpaperCfg.indexFile.value)
     
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'IndexManager':
         """从字典创建索引"""
         index = cls()
-        index.wallpaper_index = {
-            k: Picture.from_dict(v) if isinstance(v, dict) else v 
-            for k, v in data.get("wallpapers", {}).items()
-        }
-        index.total_count = data.get("total_count", len(index.wallpaper_index))
-        index.last_updated = data.get("last_updated")
+        index._load_dict(data)
         return index
     
+    def _load_dict(self, data: Dict[str, Any], partial: bool = False) -> None:
+        """用字典内容替换当前索引
+        
+        partial 为 True 时记录只含核心字段，其余字段由 _load_extras 在后台填充。
+        """
+        self._load_generation += 1  # 使进行中的后台加载失效
+        with self._extra_lock:
+            self._migrations = []
+        self.wallpaper_index = {}
+        legacy_thumbnails = []
+        for k, v in data.get("wallpapers", {}).items():
+            pic = Picture.from_dict(v, partial=partial) if isinstance(v, dict) else v
+            self._attach(k, pic)
+            self.wallpaper_index[k] = pic
+            if not partial and isinstance(v, dict) and v.get("view_pic") and not pic.thumb_ref:
+                legacy_thumbnails.append((pic, v["view_pic"]))
+        self.indexes.rebuild(self.wallpaper_index)
+        self.total_count = data.get("total_count", len(self.wallpaper_index))
+        self.last_updated = data.get("last_updated")
+        self._modified = False
+        self._dirty = set()
+        self._deleted = set()
+        
+        # 旧索引中内联的base64缩略图迁移到缩略图包
+        for pic, view_pic in legacy_thumbnails:
+            self._migrate_thumbnail(pic, view_pic)
+    
+    def _migrate_thumbnail(self, picture: Picture, view_pic: str) -> None:
+        """把旧索引中内联的base64缩略图写入缩略图包"""
+        try:
+            picture.set_thumbnail(self.thumbnails.append(picture.fingerprint, base64.b64decode(view_pic)))
+        except Exception as e:
+            print(f"迁移缩略图失败: {picture.path}, 错误: {e}")
+    
+    def _fill_extra(self, picture: Picture, extra: Dict[str, Any]) -> None:
+        """填充延迟加载的字段（可能在后台线程中调用，不修改索引）"""
+        picture.load_extra(extra)
+        if extra.get("view_pic") and not picture.thumb_ref:
+            self._migrations.append((picture, extra["view_pic"]))
+    
+    def apply_loaded_extras(self) -> int:
+        """把后台加载时遇到的旧缩略图写入缩略图包（在索引所在的线程调用），返回迁移的数量"""
+        if not self._migrations:
+            return 0
+        with self._extra_lock:
+            migrations, self._migrations = self._migrations, []
+        for picture, view_pic in migrations:
+            if not picture.thumb_ref and self.wallpaper_index.get(picture._key) is picture:
+                self._migrate_thumbnail(picture, view_pic)
+        return len(migrations)
+    
+    def _load_picture_extra(self, key: str, picture: Picture) -> None:
+        """首次访问时加载单张图片的非核心字段"""
+        with self._extra_lock:
+            if not picture._partial:
+                return
+            for _, extra in self.store.load_extra([key]):
+                self._fill_extra(picture, extra)
+                return
+            picture.load_extra({})
+    
+    def _load_extras(self, generation: int, start: float) -> None:
+        """后台线程：分批加载所有图片的非核心字段，有需要写入索引的修改时结束后调用 notify"""
+        try:
+            for key, extra in self.store.load_extra():
+                if generation != self._load_generation:
+                    return
+                pic = self.wallpaper_index.get(key)
+                if pic is None or not pic._partial:
+                    continue
+                with self._extra_lock:
+                    if pic._partial:
+                        self._fill_extra(pic, extra)
+        except Exception as e:
+            print(f"加载索引详细字段失败: {e}")
+        else:
+            self.load_timings["full"] = time.perf_counter() - start
+            print(f"索引完整加载耗时: {self.load_timings['full']:.3f}s")
+        notify = self._extras_notify
+        if notify and self._migrations:
+            try:
+                notify()
+            except Exception as e:
+                print(f"通知写入加载结果失败: {e}")
+    
+    @property
+    def extras_loaded(self) -> bool:
+        """后台加载已结束（之后 wait_loaded 不会阻塞）"""
+        thread = self._extra_thread
+        return not (thread and thread.is_alive())
+    
+    def wait_loaded(self) -> None:
+        """等待后台加载完成（需要全部字段的操作前在索引所在的线程调用）"""
+        thread = self._extra_thread
+        if thread is threading.current_thread():
+            return
+        if thread and thread.is_alive():
+            thread.join()
+        self.apply_loaded_extras()
+    
+    def _attach(self, key: str, picture: Picture) -> None:
+        """监听图片修改，记录到待保存的键集合"""
+        picture._key = key
+        picture._listener = self._picture_listener
+        picture._loader = self._picture_loader
+    
+    def _on_picture_changed(self, key: str, picture: Picture) -> None:
+        """图片被修改时的回调"""
+        if self.wallpaper_index.get(key) is picture:
+            self._dirty.add(key)
+            self.indexes.update(key, picture)
+    
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典"""
+        self.wait_loaded()
         return {
             "wallpapers": {k: v.to_dict() for k, v in self.wallpaper_index.items()},
             "total_count": self.total_count,
@@ -43,24 +219,26 @@ class IndexManager:
     def add_picture(self, key: str, picture: Picture) -> None:
         """添加图片"""
         self.wallpaper_index[key] = picture
-        self._modified = True
+        self._attach(key, picture)
+        self.indexes.update(key, picture)
+        self._dirty.add(key)
+        self._deleted.discard(key)
         self.recount()
     
     def remove_picture(self, key: str) -> bool:
         """删除图片"""
         if key in self.wallpaper_index:
             del self.wallpaper_index[key]
-            self._modified = True
+            self.indexes.remove(key)
+            self._dirty.discard(key)
+            self._deleted.add(key)
             self.recount()
             return True
         return False
     
     def get_picture(self, key: str) -> Optional[Picture]:
-        """获取图片"""
-        pic = self.wallpaper_index.get(key)
-        if pic:
-            pic.update_access_time()
-        return pic
+        """获取图片（只读，不会修改访问时间；展示记录见 AccessTracker）"""
+        return self.wallpaper_index.get(key)
     
     def get_all_keys(self) -> List[str]:
         """获取所有键"""
@@ -68,20 +246,66 @@ class IndexManager:
     
     def get_filtered_keys(self, excluded: bool = False) -> List[str]:
         """获取过滤后的键列表"""
-        return [k for k, v in self.wallpaper_index.items() if v.excluded == excluded]
+        return self.indexes.keys_by_state(excluded)
+    
+    def get_sorted_keys(self, order: str, excluded: Optional[bool] = None,
+                        reverse: bool = False) -> List[str]:
+        """按 name / added / accessed 排序的键列表，excluded 为 None 时包含全部"""
+        return self.indexes.sorted_keys(order, excluded, reverse)
     
     def search_by_name(self, query: str) -> List[str]:
-        """按名称搜索"""
-        query = query.lower()
-        return [k for k, v in self.wallpaper_index.items() 
-                if query in v.display_name.lower() or query in v.path.lower()]
+        """按名称或相对路径搜索（空白分隔的多个词需同时匹配）"""
+        return list(self.indexes.search(query))
     
     def search_by_hash(self, hash_value: str) -> Optional[str]:
         """按哈希值搜索"""
-        for k, v in self.wallpaper_index.items():
-            if v.hash == hash_value:
-                return k
-        return None
+        keys = self.indexes.keys_by_hash(hash_value)
+        return min(keys) if keys else None
+    
+    def find_similar(self, phash: str, radius: int = DEFAULT_RADIUS) -> List[Tuple[int, str]]:
+        """感知哈希距离不超过 radius 的 (距离, 键) 列表，按距离排序"""
+        self.wait_loaded()
+        return self.indexes.similar(phash, radius)
+    
+    def phash_items(self) -> List[Tuple[str, int]]:
+        """所有已计算感知哈希的 (键, 哈希值)"""
+        self.wait_loaded()
+        return self.indexes.phash_items()
+    
+    def duplicate_groups(self, radius: int = DEFAULT_RADIUS) -> List[List[str]]:
+        """相似图片分组（缩放、重新编码的副本）"""
+        items = self.phash_items()
+        return cluster_hashes([key for key, _ in items], [value for _, value in items], radius)
+    
+    def find_by_luminance(self, max_luminance: float = 1.0, min_luminance: float = 0.0,
+                          limit: Optional[int] = None,
+                          excluded: Optional[bool] = None) -> List[Tuple[float, str]]:
+        """平均亮度在 [min_luminance, max_luminance] 内的 (亮度, 键)，从暗到亮排序"""
+        self.wait_loaded()
+        return self.indexes.by_luminance(max_luminance, min_luminance, limit, excluded)
+    
+    def find_similar_palette(self, palette: str, limit: Optional[int] = None,
+                             excluded: Optional[bool] = None) -> List[Tuple[float, str]]:
+        """主色与 palette 最接近的 (距离, 键)，按距离排序"""
+        self.wait_loaded()
+        return self.indexes.similar_palette(palette, limit, excluded)
+    
+    def find_nearest_color(self, rgb: Tuple[int, int, int],
+                           limit: Optional[int] = None,
+                           excluded: Optional[bool] = None) -> List[Tuple[float, str]]:
+        """主色中含有与 rgb 最接近颜色的 (距离, 键)，按距离排序"""
+        self.wait_loaded()
+        return self.indexes.nearest_color(rgb, limit, excluded)
+    
+    def get_keys_by_resolution(self, min_width: int = 0, min_height: int = 0) -> List[str]:
+        """显示尺寸不小于 min_width x min_height 的键列表（使用索引中记录的尺寸）"""
+        self.wait_loaded()
+        keys = []
+        for key, pic in self.wallpaper_index.items():
+            size = pic.display_size
+            if size and size[0] >= min_width and size[1] >= min_height:
+                keys.append(key)
+        return keys
     
     def recount(self) -> None:
         """重新计数"""
@@ -95,230 +319,565 @@ class IndexManager:
     
     def is_modified(self) -> bool:
         """索引是否被修改"""
-        if self._modified:
-            return True
-        
-        # 检查任何图片是否被修改
-        for pic in self.wallpaper_index.values():
-            if pic.is_modified():
-                return True
-        
-        return False
+        return self._modified or bool(self._dirty) or bool(self._deleted)
     
     def mark_saved(self) -> None:
         """标记为已保存"""
         self._modified = False
-        for pic in self.wallpaper_index.values():
-            pic.mark_saved()
+        self._dirty.clear()
+        self._deleted.clear()
 
     def clear(self) -> None:
         """清空索引"""
+        self._deleted.update(self.wallpaper_index)
+        self._dirty.clear()
         self.wallpaper_index.clear()
+        self.indexes.rebuild(self.wallpaper_index)
         self.total_count = 0
         self.last_updated = None
-        self._modified = False
+        self._modified = True
 
-    # def save(self) -> bool:
-    #     """保存索引到文件"""
-    #     try:
-    #         with open(wallpaperCfg.indexFile, 'w', encoding='utf-8') as f:
-    #             json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
-    #         self.mark_saved()
-    #         return True
-    #     except Exception as e:
-    #         print(f"保存索引失败: {e}")
-    #         return False
-        
-    def _start_auto_save(self, interval: int = 300) -> None:
-        """启动自动保存定时器"""
-        def auto_save():
-            while True:
-                time.sleep(interval)
-                if self.is_modified():
-                    self.save()
-        
-        self.auto_save_timer = threading.Thread(
-            target=auto_save, daemon=True
-        )
-        self.auto_save_timer.start()
 
-    def _create_thumbnail_base64(self, image_path: str, max_size: Tuple[int, int] = (120, 120)) -> Optional[str]:
-        """创建图片缩略图并返回base64编码"""
+    def _ensure_color_features(self, pic: Picture, thumbnail: bytes) -> None:
+        """旧索引或共用缩略图的图片没有颜色特征时，由缩略图JPEG计算"""
+        if pic.palette:
+            return
         try:
-            with Image.open(image_path) as img:
-                img.thumbnail(max_size, Image.LANCZOS)
-                if img.mode != 'RGB':
-                    img = img.convert('RGB')
-                
-                buffer = BytesIO()
-                img.save(buffer, format='JPEG', quality=85)
-                buffer.seek(0)
-                
-                return base64.b64encode(buffer.read()).decode('utf-8')
-                
+            with Image.open(BytesIO(thumbnail)) as img:
+                pic.set_color_features(compute_color_features(img))
         except Exception as e:
-            print(f"创建缩略图失败: {image_path}, 错误: {e}")
-            return None
+            print(f"计算颜色特征失败: {pic.path}, 错误: {e}")
     
     def _generate_key_from_file(self, file_hash: str, filename: str) -> str:
         """从文件信息生成唯一键"""
-        return f"{file_hash[:12]}_{filename}"
+        return f"{self.key_prefix}{file_hash[:12]}_{filename}"
     
-    def build_index(self, progress_callback: Callable = None) -> bool:
-        """构建壁纸索引，增量更新"""
-        if not os.path.exists(wallpaperCfg.wallpaperDir.value):
-            return False
+    def _rekey(self, key: str, filename: str) -> str:
+        """文件改名后沿用原键的哈希前缀生成新键"""
+        return f"{key.split('_', 1)[0]}_{filename}"
+    
+    def _same_content(self, pic: Picture, result: ScanResult) -> bool:
+        """采样哈希相同时，用完整哈希确认内容一致"""
+        algo = pic.hash_algo or wallpaperCfg.hashAlgorithm.value
+        old_hash = pic.hash
+        if not old_hash:
+            if pic.path == result.filepath or not os.path.exists(pic.path):
+                # 原文件已不存在，大小和采样块都相同，视为同一文件
+                return True
+            old_hash = ImageUtils.calculate_file_hash(pic.path, algo)
+            pic.set_fingerprint(file_hash=old_hash, hash_algo=algo)
+        return result.content_hash(algo) == old_hash
+    
+    def _find_existing(self, result: ScanResult, sample_index: Dict[str, List[str]],
+                       legacy_hashes: Dict[str, str], claimed: set) -> Optional[str]:
+        """查找内容相同的已有图片：先按采样哈希初筛，冲突时再比较完整哈希"""
+        for key in sample_index.get(result.sample_hash, ()):
+            pic = self.wallpaper_index.get(key)
+            if pic and key not in claimed and self._same_content(pic, result):
+                return key
+        
+        if legacy_hashes and result.legacy_md5:
+            # 旧索引中还没有采样哈希的图片只能按完整MD5匹配（MD5已在计算指纹时算好）
+            key = legacy_hashes.get(result.legacy_md5)
+            if key in self.wallpaper_index and key not in claimed:
+                return key
+        return None
+    
+    def _scan_lookups(self) -> Tuple[Dict[str, List[str]], Dict[str, str], Dict[str, Tuple[str, Picture]]]:
+        """暂存已知文件的指纹和路径，用于扫描时快速查找"""
+        sample_index: Dict[str, List[str]] = {}
+        legacy_hashes: Dict[str, str] = {}
+        for key, pic in self.wallpaper_index.items():
+            if pic.sample_hash:
+                sample_index.setdefault(pic.sample_hash, []).append(key)
+            elif pic.hash and pic.hash_algo == "md5":
+                legacy_hashes[pic.hash] = key
+        known_paths = {pic.path: (key, pic) for key, pic in self.wallpaper_index.items()}
+        return sample_index, legacy_hashes, known_paths
+    
+    def _apply_scan_result(self, result: ScanResult, sample_index: Dict[str, List[str]],
+                           legacy_hashes: Dict[str, str], processed_keys: set) -> Optional[str]:
+        """把单个文件的扫描结果应用到索引，返回其键"""
+        if result.failed:
+            # 计算指纹出错：已有记录不变（文件状态不更新，下次构建重新计算），新文件跳过
+            if result.known_key in self.wallpaper_index:
+                processed_keys.add(result.known_key)
+                return result.known_key
+            return None
+        if result.stat is None and not result.unchanged:
+            return None
+        
+        # 快速路径：内容未变化，只补充指纹和文件状态（所在目录未变化时没有新的文件状态）
+        pic = self.wallpaper_index.get(result.known_key) if result.known_key else None
+        if pic:
+            if result.stat is not None:
+                pic.update_stat(result.stat)
+            pic.set_fingerprint(result.sample_hash, result.file_hash, result.hash_algo)
+            pic.set_phash(result.phash)
+            pic.set_image_info(result.image_info)
+            processed_keys.add(result.known_key)
+            return result.known_key
             
-        # 先加载现有索引
-        self.load_index()
-        
-        # 暂存已知文件的哈希值，用于快速查找
-        existing_hashes = {pic.hash: key for key, pic in self.wallpaper_index.items()}
-        
-        # 扫描文件系统
-        image_files = []
-        for root, _, files in os.walk(wallpaperCfg.wallpaperDir.value):
-            for file in files:
-                if file.lower().endswith(('.jpg', '.jpeg', '.png', '.bmp', '.webp')):
-                    filepath = os.path.join(root, file)
-                    rel_path = os.path.relpath(filepath, wallpaperCfg.wallpaperDir.value)
-                    image_files.append((rel_path, filepath))
-
-        # 跟踪已处理文件，用于检测删除的文件
-        processed_keys = set()
-        total_files = len(image_files)
+        if not result.sample_hash:
+            result.sample_hash = sampled_hash(result.filepath, result.stat.st_size)
+            if not result.sample_hash:
+                return None
+            
+        filepath, rel_path = result.filepath, result.rel_path
+        filename = os.path.basename(filepath)
+        existing_key = self._find_existing(result, sample_index, legacy_hashes, processed_keys)
         
-        for i, (rel_path, filepath) in enumerate(image_files):
-            if progress_callback:
-                progress_callback(i, total_files, rel_path)
-                
-            file_hash = ImageUtils.calculate_file_hash(filepath)
-            if not file_hash:
-                continue
-                
-            filename = os.path.basename(filepath)
-            key = self._generate_key_from_file(file_hash, filename)
+        if existing_key:
+            pic = self.wallpaper_index[existing_key]
+            key = self._rekey(existing_key, filename)
             processed_keys.add(key)
             
-            # 检查是否存在具有相同哈希的文件
-            if file_hash in existing_hashes:
-                existing_key = existing_hashes[file_hash]
-                pic = self.get_picture(existing_key)
+            # 路径可能有变化
+            if pic.path != filepath:
+                pic.update_path(filepath, rel_path)
+            pic.update_stat(result.stat)
+            pic.set_fingerprint(result.sample_hash, result.file_hash, result.hash_algo)
+            pic.set_phash(result.phash)
+            pic.set_image_info(result.image_info)
                 
-                # 路径可能有变化
-                if pic.path != filepath:
-                    pic.update_path(filepath, rel_path)
-                    
-                # 如果键名不同，更新键名（例如文件被重命名）
-                if existing_key != key:
-                    self.add_picture(key, pic)
-                    self.remove_picture(existing_key)
+            # 如果键名不同，更新键名（例如文件被重命名）
+            if existing_key != key:
+                self.add_picture(key, pic)
+                self.remove_picture(existing_key)
+                sample_index.setdefault(pic.sample_hash, []).append(key)
+        else:
+            # 新文件，创建新的Picture对象
+            new_pic = Picture(
+                path=filepath, 
+                relative_path=rel_path,
+                file_hash=result.file_hash,
+                display_name=filename,
+                sample_hash=result.sample_hash,
+                hash_algo=result.hash_algo
+            )
+            new_pic.update_stat(result.stat)
+            new_pic.set_phash(result.phash)
+            new_pic.set_image_info(result.image_info)
+            key = self._generate_key_from_file(new_pic.fingerprint, filename)
+            processed_keys.add(key)
+            self.add_picture(key, new_pic)
+        return key
+    
+    def build_index(self, progress_callback: Callable = None, verify: bool = False,
+                    resume: bool = True) -> bool:
+        """构建壁纸索引，增量更新
+        
+        文件大小、修改时间和 inode 与记录一致时直接信任已存储的哈希，
+        其余文件先计算采样哈希匹配，只有采样哈希冲突时才计算完整哈希。
+        verify 为 True 时强制重新计算所有文件的完整哈希。
+        构建过程中定期保存检查点，resume 为 True 时继续上次中断的构建。
+        """
+        session = self.begin_build(verify, resume)
+        if session is None:
+            return False
+        
+        for result in session.pipeline.run():
+            if progress_callback:
+                progress_callback(result.seq, session.pipeline.discovered, result.rel_path)
+            self.apply_build_results(session, [result])
+        return self.finish_build(session)
+    
+    def has_interrupted_build(self) -> bool:
+        """是否有中断的构建可以继续"""
+        return bool(self.checkpoint and self.checkpoint.exists())
+    
+    def begin_build(self, verify: bool = False, resume: bool = True) -> Optional[BuildSession]:
+        """开始一次构建：准备查找表并启动遍历和哈希流水线，目录不存在时返回 None
+        
+        结果由调用方通过 session.pipeline.poll() 取出后交给 apply_build_results，
+        可以分多次在同一线程上应用，最后调用 finish_build。
+        有中断的构建且 resume 为 True 时继续该构建：已保存的文件在上次构建中已经处理过，
+        文件状态未变化时直接沿用（校验模式下也不再重新计算完整哈希）。
+        """
+        root = self.root
+        if not os.path.exists(root):
+            # 目录不存在（例如移动硬盘未连接）时跳过，保留已有记录
+            return None
+            
+        # 先加载现有索引（已加载时保留内存中的状态）
+        if not self.wallpaper_index:
+            self.load_index()
+        self.wait_loaded()
+        
+        sample_index, legacy_hashes, known_paths = self._scan_lookups()
+        
+        # 遍历和哈希计算在后台线程中流水线进行，结果按遍历顺序在调用线程应用；
+        # 上次扫描后修改时间未变化的目录不再列出
+        previous = self.dir_tree.load(root, self.last_updated) if self.dir_tree else None
+        
+        resumed = None
+        if self.checkpoint:
+            state = self.checkpoint.load(root) if resume else None
+            if state:
+                # 沿用中断的构建的校验模式
+                verify = verify or state[0]
+                resumed = state[1]
+                print(f"继续中断的索引构建: {root}, 已保存 {len(resumed)} 个文件")
             else:
-                # 新文件，创建新的Picture对象
-                new_pic = Picture(
-                    path=filepath, 
-                    relative_path=rel_path,
-                    file_hash=file_hash,
-                    display_name=filename
-                )
-                self.add_picture(key, new_pic)
-        
-        # 检测并删除已从文件系统中删除的文件
-        keys_to_remove = set(self.get_all_keys()) - processed_keys
-        for key in keys_to_remove:
-            self.remove_picture(key)
-        
-        # 更新时间戳并保存
-        self.update_timestamp()
-        self.save()
-        return True
+                self.checkpoint.start(root, verify)
+        
+        pipeline = HashPipeline(root, known_paths,
+                                workers=wallpaperCfg.hashWorkers.value, verify=verify,
+                                algorithm=wallpaperCfg.hashAlgorithm.value, previous=previous,
+                                resumed=resumed, legacy=bool(legacy_hashes))
+        pipeline.start()
+        return BuildSession(root, pipeline, sample_index, legacy_hashes)
+    
+    def apply_build_results(self, session: BuildSession, results: List[ScanResult]) -> int:
+        """应用一批扫描结果，返回新增到索引中的图片数量；到时间时保存检查点"""
+        before = len(self.wallpaper_index)
+        for result in results:
+            if self._apply_scan_result(result, session.sample_index, session.legacy_hashes,
+                                       session.processed_keys):
+                session.unsaved_paths.append(result.filepath)
+        if (len(session.unsaved_paths) >= CHECKPOINT_FILES
+                or time.monotonic() - session.last_checkpoint >= CHECKPOINT_INTERVAL):
+            self.save_checkpoint(session)
+        return max(0, len(self.wallpaper_index) - before)
     
-    def load_index(self) -> bool:
-        """加载索引文件"""
-        if not os.path.exists(wallpaperCfg.indexFile.value):
+    def save_checkpoint(self, session: BuildSession) -> bool:
+        """立即保存已应用的结果，并在检查点中记录这些文件"""
+        session.last_checkpoint = time.monotonic()
+        if not self.save():
             return False
+        if self.checkpoint and session.unsaved_paths:
+            self.checkpoint.append(session.unsaved_paths)
+        session.unsaved_paths = []
+        return True
+    
+    def finish_build(self, session: BuildSession, cancelled: bool = False) -> bool:
+        """结束构建并保存
+        
+        完整扫描后删除已不存在的文件、记录目录修改时间并删除检查点；
+        取消时只保存已应用的结果并更新检查点，未扫描到的图片保留到下次构建。
+        """
+        pipeline = session.pipeline
+        pipeline.cancel()
+        # 只有遍历完整结束、且发现的文件全部应用过才算完整扫描，部分扫描不能用来判断删除
+        complete = not cancelled and pipeline.completed and pipeline.processed == pipeline.discovered
+        if complete:
+            # 检测并删除已从文件系统中删除的文件
+            keys_to_remove = set(self.get_all_keys()) - session.processed_keys
+            for key in keys_to_remove:
+                self.remove_picture(key)
             
+            # 回收已删除图片的缩略图空间
+            self.compact_thumbnails()
+        
+        # 更新时间戳并保存；未完成的构建保留检查点，下次构建时继续
+        self.update_timestamp()
+        if complete:
+            if self.save():
+                if self.dir_tree:
+                    self.dir_tree.save(session.root, self.last_updated, pipeline.tree)
+                if self.checkpoint:
+                    self.checkpoint.clear()
+        else:
+            self.save_checkpoint(session)
+        if pipeline.previous is not None:
+            print(f"目录扫描: {len(pipeline.tree)} 个目录, {pipeline.skipped}/{pipeline.discovered} 个文件沿用记录")
+        return True
+    
+    def apply_changes(self, changed: Set[str], deleted: Set[str]) -> bool:
+        """按文件系统事件增量更新索引，不遍历整个壁纸目录
+        
+        先处理新增/修改的文件（移动的文件会按指纹匹配到原图片并更新路径），
+        再删除已不存在的文件或目录下的图片。返回索引是否有变化。
+        """
+        root = self.root
+        self.wait_loaded()
+        sample_index, legacy_hashes, known_paths = self._scan_lookups()
+        processed_keys = set()
+        before = set(self.wallpaper_index)
+        updated = False
+        
+        for seq, filepath in enumerate(sorted(changed)):
+            result = ScanResult(seq, os.path.relpath(filepath, root), filepath)
+            try:
+                result.stat = os.stat(filepath)
+            except OSError:
+                continue
+            entry = known_paths.get(filepath)
+            if entry and entry[1].stat_matches(result.stat):
+                continue
+            fingerprint_file(result, known_paths, algorithm=wallpaperCfg.hashAlgorithm.value,
+                             legacy=bool(legacy_hashes))
+            if self._apply_scan_result(result, sample_index, legacy_hashes, processed_keys):
+                updated = True
+        
+        if deleted:
+            paths = {pic.path: key for key, pic in self.wallpaper_index.items()}
+            for path in deleted:
+                if os.path.exists(path):
+                    continue
+                if path in paths:
+                    self.remove_picture(paths[path])
+                    continue
+                # 目录被删除或移走
+                prefix = path.rstrip(os.sep) + os.sep
+                for pic_path, key in paths.items():
+                    if pic_path.startswith(prefix):
+                        self.remove_picture(key)
+        
+        changed_keys = updated or before != set(self.wallpaper_index)
+        if changed_keys:
+            old_stamp = self.last_updated
+            self.update_timestamp()
+            # 变化所在目录的修改时间已不同于记录，下次扫描时会重新列出，其余记录仍然有效
+            if self.save() and self.dir_tree:
+                self.dir_tree.restamp(root, old_stamp, self.last_updated)
+        return changed_keys
+    
+    def hash_verify_tasks(self) -> List[HashTask]:
+        """只有采样哈希的图片，交给后台线程补算完整哈希"""
+        return [(key, pic.path) for key, pic in self.wallpaper_index.items() if not pic.hash]
+    
+    def apply_verified_hashes(self, results: Iterable[HashResult]) -> int:
+        """写入后台线程算出的完整哈希（在索引所在的线程调用），返回写入数量
+        
+        图片已被删除、移动或文件与索引记录的大小和修改时间不一致时跳过（由构建或监视器处理）。
+        """
+        count = 0
+        for key, path, algorithm, file_hash, stat_key in results:
+            pic = self.wallpaper_index.get(key)
+            if not file_hash or not pic or pic.path != path or pic.hash:
+                continue
+            if pic.file_size is not None and (pic.file_size, pic.mtime_ns) != stat_key:
+                continue
+            pic.set_fingerprint(file_hash=file_hash, hash_algo=algorithm)
+            count += 1
+        return count
+    
+    def verify_hashes(self, progress_callback: Callable = None,
+                      stop_event: Optional[threading.Event] = None) -> int:
+        """在调用线程中同步补算完整哈希（命令行使用），返回补算数量"""
+        algo = wallpaperCfg.hashAlgorithm.value
+        self.wait_loaded()
+        tasks = self.hash_verify_tasks()
+        results = []
+        for i, task in enumerate(tasks):
+            if stop_event and stop_event.is_set():
+                break
+            if progress_callback:
+                progress_callback(i, len(tasks), self.wallpaper_index[task[0]].relative_path)
+            results.append(hash_file(task, algo))
+        count = self.apply_verified_hashes(results)
+        if count:
+            self.save()
+        return count
+    
+    def load_index(self, lazy: bool = False, notify: Optional[Callable[[], None]] = None) -> bool:
+        """加载索引
+        
+        Args:
+            lazy (bool): 先只加载核心字段（足够过滤、排序和选择壁纸），
+                缩略图位置、裁剪区域等字段在后台线程或首次访问时加载
+            notify: 后台加载结束且有需要写入索引的修改时调用（在加载线程中），
+                应让索引所在的线程调用 apply_loaded_extras；为 None 时在下次 wait_loaded 时写入
+        """
+        start = time.perf_counter()
+        lazy = lazy and self.store.supports_lazy_load
         try:
-            with open(wallpaperCfg.indexFile.value, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                self.from_dict(data)
-            return True
+            data = self.store.load_core() if lazy else self.store.load()
         except Exception as e:
             print(f"加载索引失败: {e}")
             return False
+        if data is None:
+            return False
+        self._load_dict(data, partial=lazy)
+        
+        self.load_timings = {"core": time.perf_counter() - start}
+        print(f"索引核心字段加载耗时: {self.load_timings['core']:.3f}s")
+        if lazy:
+            self._extras_notify = notify
+            self._extra_thread = threading.Thread(
+                target=self._load_extras, args=(self._load_generation, start), daemon=True)
+            self._extra_thread.start()
+        else:
+            self.load_timings["full"] = self.load_timings["core"]
+        return True
     
-    def save(self) -> bool:
-        """保存索引文件"""
+    def take_snapshot(self) -> Optional[IndexSnapshot]:
+        """取出自上次快照以来的变化（在修改索引的线程上调用），没有变化时返回 None"""
         if not self.is_modified():
-            return True  # 没有修改，不需要保存
-            
-        try:
-            indexFile = wallpaperCfg.indexFile.value
-            # 确保目录存在
-            os.makedirs(os.path.dirname(indexFile), exist_ok=True)
-            
-            # 先写入临时文件，成功后再替换
-            temp_file = f"{indexFile}.tmp"
-            with open(temp_file, 'w', encoding='utf-8') as f:
-                json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
-
-            # 原子替换原文件
-            if os.path.exists(indexFile):
-                os.replace(temp_file, indexFile)
-            else:
-                os.rename(temp_file, indexFile)
-                
-            self.mark_saved()
-            return True
-        except Exception as e:
-            print(f"保存索引失败: {e}")
-            return False
+            return None
+        
+        # 取出待保存的集合，之后的新修改进入新集合
+        dirty, self._dirty = self._dirty, set()
+        deleted, self._deleted = self._deleted, set()
+        self._modified = False
+        meta = {
+            "total_count": self.total_count,
+            "last_updated": self.last_updated
+        }
+        
+        if not self.store.supports_row_updates:
+            return IndexSnapshot(meta=meta, full=self.to_dict())
+        
+        # 只包含变化的图片，耗时与修改量成正比
+        upserts = {}
+        for key in dirty:
+            pic = self.wallpaper_index.get(key)
+            if pic:
+                upserts[key] = pic.to_dict()
+                pic.mark_saved()
+        return IndexSnapshot(upserts, deleted - upserts.keys(), meta)
+    
+    def write_snapshot(self, snapshot: IndexSnapshot) -> bool:
+        """把快照写入存储（可在后台线程调用）"""
+        if snapshot.full is not None:
+            return self.store.save(snapshot.full)
+        return self.store.write_changes(snapshot.upserts, snapshot.deletes, snapshot.meta)
     
-    def get_thumbnail_base64(self, key: str) -> Optional[str]:
-        """获取壁纸缩略图的base64编码，如果不存在则生成"""
+    def schedule_save(self) -> None:
+        """请求保存，短时间内的多次修改合并为一次后台写入"""
+        self.saver.request()
+    
+    def save(self) -> bool:
+        """立即保存索引（包括尚未写入的已调度修改）"""
+        return self.saver.flush()
+    
+    def close(self) -> None:
+        """写入剩余修改并关闭存储"""
+        self.saver.stop()
+        self.store.close()
+        self.thumbnails.close()
+    
+    def read_thumbnail(self, key: str) -> Optional[bytes]:
+        """读取已有的缩略图JPEG字节，不存在时不生成"""
+        pic = self.wallpaper_index.get(key)
+        if not pic or not pic.thumb_ref:
+            return None
+        # 核对记录的哈希：压缩中断时索引中的偏移可能指向其他图片的缩略图
+        return self.thumbnails.read(*pic.thumb_ref, hashes=(pic.hash, pic.sample_hash))
+    
+    def get_thumbnail_bytes(self, key: str) -> Optional[bytes]:
+        """获取壁纸缩略图的JPEG字节，如果不存在则生成"""
         pic = self.get_picture(key)
         if not pic:
             return None
         
         # 如果已有缩略图，直接返回
-        if pic.view_pic:
-            return pic.view_pic
-        
-        # 否则生成缩略图
-        thumbnail = self._create_thumbnail_base64(pic.path)
+        thumbnail = self.read_thumbnail(key)
         if thumbnail:
-            pic.set_thumbnail(thumbnail)
+            self._ensure_color_features(pic, thumbnail)
+            return thumbnail
         
-        return thumbnail
+        # 相同内容的图片共用缩略图
+        ref = self.thumbnails.lookup(pic.fingerprint)
+        if ref:
+            pic.set_thumbnail(ref)
+            thumbnail = self.thumbnails.read(*ref)
+            if thumbnail:
+                self._ensure_color_features(pic, thumbnail)
+            return thumbnail
+        
+        return self.regenerate_thumbnail(key)
     
-    def regenerate_thumbnail(self, key: str) -> Optional[str]:
+    def regenerate_thumbnail(self, key: str) -> Optional[bytes]:
         """重新生成缩略图"""
         pic = self.get_picture(key)
         if not pic:
             return None
             
-        thumbnail = self._create_thumbnail_base64(pic.path)
+        thumbnail, features = create_thumbnail(pic.path)
         if thumbnail:
-            pic.set_thumbnail(thumbnail)
+            pic.set_thumbnail(self.thumbnails.append(pic.fingerprint, thumbnail))
+            pic.set_color_features(features)
             
         return thumbnail
     
+    def thumbnail_task(self, key: str) -> Optional[ThumbnailTask]:
+        """需要生成缩略图或补算颜色特征时返回交给缩略图进程的任务
+        
+        相同内容的图片已有缩略图时直接共用；已有缩略图的只补算颜色特征，任务中带上缩略图字节。
+        """
+        self.wait_loaded()
+        pic = self.get_picture(key)
+        if not pic:
+            return None
+        thumbnail = self.read_thumbnail(key)
+        if not thumbnail:
+            ref = self.thumbnails.lookup(pic.fingerprint)
+            if ref:
+                pic.set_thumbnail(ref)
+                thumbnail = self.thumbnails.read(*ref)
+        if thumbnail and pic.palette:
+            return None
+        return key, pic.path, thumbnail
+    
+    def needs_thumbnail(self, key: str) -> bool:
+        """缺少缩略图或颜色特征（需要全部字段，后台加载未完成时会等待）"""
+        self.wait_loaded()
+        pic = self.wallpaper_index.get(key)
+        return pic is not None and not (pic.thumb_ref and pic.palette)
+    
+    def apply_thumbnail(self, result: ThumbnailResult) -> bool:
+        """写入缩略图进程返回的结果（在索引所在的线程调用）"""
+        key, path, thumbnail, features = result
+        pic = self.get_picture(key)
+        if not pic or pic.path != path or not thumbnail:
+            return False
+        if not pic.thumb_ref:
+            # 同一批中内容相同的图片共用先写入的缩略图
+            ref = self.thumbnails.lookup(pic.fingerprint)
+            pic.set_thumbnail(ref or self.thumbnails.append(pic.fingerprint, thumbnail))
+        if features:
+            pic.set_color_features(features)
+        return True
+    
+    def compact_thumbnails(self, min_garbage_ratio: float = 0.3) -> bool:
+        """压缩缩略图包，回收已删除图片占用的空间"""
+        self.wait_loaded()
+        live = {tuple(pic.thumb_ref) for pic in self.wallpaper_index.values() if pic.thumb_ref}
+        if self.thumbnails.garbage_ratio(live) < min_garbage_ratio:
+            return False
+        
+        return self.thumbnails.compact(live, self._persist_thumbnail_refs) is not None
+    
+    def _persist_thumbnail_refs(self, moved: Dict[Tuple[int, int], Tuple[int, int]]) -> bool:
+        """压缩后的缩略图包替换原文件之前，把新的偏移写入索引并保存，保存失败时恢复原偏移"""
+        self._remap_thumbnails(moved)
+        if self.save():
+            return True
+        self._remap_thumbnails({new: old for old, new in moved.items()})
+        return False
     
-    def cleanup_cache(self) -> int:
-        """清理无效的缓存文件，返回清理的文件数量"""
+    def _remap_thumbnails(self, moved: Dict[Tuple[int, int], Tuple[int, int]]) -> None:
+        for pic in self.wallpaper_index.values():
+            if pic.thumb_ref:
+                ref = moved.get(tuple(pic.thumb_ref))
+                if ref:
+                    pic.set_thumbnail(ref)
+                else:
+                    pic.clear_thumbnail()
+    
+    def cache_files(self) -> Set[str]:
+        """本索引引用的渲染缓存键（旧索引中为缓存文件名）"""
+        self.wait_loaded()
+        return {pic.cache_path for pic in self.wallpaper_index.values() if pic.cache_path}
+    
+    def cleanup_cache(self, valid_cache_files: Optional[Set[str]] = None) -> int:
+        """清理无效的缓存文件，返回清理的文件数量
+        
+        Args:
+            valid_cache_files: 需要保留的缓存文件名，默认为本索引引用的文件
+        """
         if not os.path.exists(wallpaperCfg.cacheDir.value):
             return 0
             
-        # 收集所有有效的缓存文件路径
-        valid_cache_files = set()
-        for pic in self.wallpaper_index.values():
-            if pic.cache_path:
-                valid_cache_files.add(pic.cache_path)
+        if valid_cache_files is None:
+            valid_cache_files = self.cache_files()
         
-        # 删除无效的缓存文件
+        # 删除无效的缓存文件（子目录为渲染缓存，由 RenderCache 管理）
         deleted_count = 0
         for file in os.listdir(wallpaperCfg.cacheDir.value):
-            if file not in valid_cache_files:
+            if file not in valid_cache_files and os.path.isfile(os.path.join(wallpaperCfg.cacheDir.value, file)):
                 try:
                     os.remove(os.path.join(wallpaperCfg.cacheDir.value, file))
                     deleted_count += 1
@@ -0,0 +1,375 @@
+import os
+import json
+import time
+import queue
+import threading
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from .picture import Picture
+from .dir_scanner import DirRecord, scan_images
+from app.utils.fingerprint import sampled_hash, full_hash
+from app.utils.perceptual_hash import dhash
+from app.utils.image_metadata import read_image_info
+
+_DONE = object()  # 队列结束标记
+
+HashTask = Tuple[str, str]  # (键, 路径)
+HashResult = Tuple[str, str, str, Optional[str], Optional[Tuple[int, int]]]  # (键, 路径, 算法, 完整哈希, (文件大小, 修改时间))
+
+
+class ScanResult:
+    """流水线中单个文件的处理结果"""
+
+    __slots__ = ("seq", "rel_path", "filepath", "stat", "sample_hash",
+                 "file_hash", "hash_algo", "phash", "image_info", "known_key", "unchanged", "failed", "legacy_md5")
+
+    def __init__(self, seq: int, rel_path: str, filepath: str,
+                 stat: Optional[os.stat_result] = None, unchanged: bool = False):
+        self.seq = seq
+        self.rel_path = rel_path
+        self.filepath = filepath
+        self.stat = stat  # 遍历时能复用 DirEntry 的状态则已填充
+        self.unchanged = unchanged  # 所在目录未变化，沿用索引中的记录
+        self.sample_hash: Optional[str] = None
+        self.file_hash: Optional[str] = None  # 完整哈希，只在需要时计算
+        self.hash_algo: Optional[str] = None
+        self.phash: Optional[str] = None  # 感知哈希，只为新文件、变化的文件和缺少的图片计算
+        self.image_info: Optional[Dict] = None  # 文件头中的图片信息，计算时机与感知哈希相同
+        self.known_key: Optional[str] = None  # 内容未变化时对应的已有键
+        self.failed = False  # 计算指纹时出错，已有记录保留到下次构建
+        self.legacy_md5: Optional[str] = None  # 完整MD5，只在旧索引中有按MD5匹配的图片时计算
+
+    def content_hash(self, algorithm: str) -> Optional[str]:
+        """按指定算法获取完整哈希，未计算过时现场计算"""
+        if self.file_hash is None or self.hash_algo != algorithm:
+            self.file_hash = full_hash(self.filepath, algorithm)
+            self.hash_algo = algorithm
+        return self.file_hash
+
+
+def hash_file(task: HashTask, algorithm: str) -> HashResult:
+    """计算完整哈希（只读取文件，不访问索引），计算期间文件被修改时哈希为 None"""
+    key, path = task
+    try:
+        before = os.stat(path)
+        file_hash = full_hash(path, algorithm)
+        after = os.stat(path)
+    except OSError:
+        return key, path, algorithm, None, None
+    stat_key = (after.st_size, after.st_mtime_ns)
+    if (before.st_size, before.st_mtime_ns) != stat_key:
+        return key, path, algorithm, None, None
+    return key, path, algorithm, file_hash, stat_key
+
+
+def _hash_legacy_md5(item: ScanResult) -> None:
+    """旧索引中还没有采样哈希的图片只能按完整MD5匹配，已按MD5计算过时直接沿用"""
+    item.legacy_md5 = item.file_hash if item.hash_algo == "md5" else full_hash(item.filepath, "md5")
+
+
+def fingerprint_file(item: ScanResult, known: Dict[str, Tuple[str, Picture]],
+                     verify: bool = False, algorithm: str = "md5", legacy: bool = False) -> None:
+    """计算单个文件的指纹（item.stat 需已填充）
+
+    legacy 为 True 时，不能按已知记录确认的文件同时计算完整MD5，应用结果时只比较算好的哈希。
+    """
+    entry = known.get(item.filepath)
+    if entry:
+        key, pic = entry
+        if not verify and pic.stat_matches(item.stat):
+            # 文件未变化，沿用已存储的哈希；旧索引补充采样哈希、感知哈希和图片信息
+            item.known_key = key
+            if not pic.sample_hash:
+                item.sample_hash = sampled_hash(item.filepath, item.stat.st_size)
+            if not pic.phash:
+                item.phash = dhash(item.filepath)
+            if pic.width is None:
+                item.image_info = read_image_info(item.filepath)
+            return
+        item.phash = dhash(item.filepath)
+        item.image_info = read_image_info(item.filepath)
+        if verify:
+            # 校验模式：按记录的算法重新计算，确认内容是否变化
+            item.sample_hash = sampled_hash(item.filepath, item.stat.st_size)
+            item.content_hash(pic.hash_algo or algorithm)
+            if pic.hash:
+                unchanged = item.file_hash == pic.hash
+            else:
+                unchanged = item.sample_hash == pic.sample_hash
+            if item.file_hash and unchanged:
+                item.known_key = key
+            elif legacy:
+                _hash_legacy_md5(item)
+            return
+
+    item.sample_hash = sampled_hash(item.filepath, item.stat.st_size)
+    item.phash = dhash(item.filepath)
+    item.image_info = read_image_info(item.filepath)
+    if verify:
+        item.content_hash(algorithm)
+    if legacy:
+        _hash_legacy_md5(item)
+
+
+class HashPipeline:
+    """目录遍历与哈希计算的生产者/消费者流水线
+
+    遍历线程用 os.scandir 边遍历边把文件送入有界队列，多个哈希线程（hashlib 计算时会释放GIL）
+    并行计算，结果按遍历顺序交还给调用线程，与顺序构建的结果完全一致。
+    默认只计算采样哈希，verify 为 True 时同时计算完整哈希；legacy 为 True 时新文件和变化的文件还会计算完整MD5。
+    给出上次的目录记录（previous）时，修改时间未变化的目录不再列出，其中的文件沿用索引中的记录；
+    遍历完成后 tree 为本次扫描的目录记录。
+    """
+
+    def __init__(self, root: str, known: Dict[str, Tuple[str, Picture]],
+                 workers: int = 4, queue_size: int = 256, verify: bool = False,
+                 algorithm: str = "md5", previous: Optional[Dict[str, DirRecord]] = None,
+                 resumed: Optional[Set[str]] = None, legacy: bool = False):
+        self.root = root
+        self.known = known  # 路径 -> (键, 图片)，只读快照
+        self.workers = max(1, workers)
+        self.verify = verify
+        self.resumed = resumed or set()  # 中断前已校验并保存的文件，继续时不再重新计算
+        self.algorithm = algorithm
+        self.legacy = legacy  # 旧索引中有只能按完整MD5匹配的图片
+        self.previous = None if verify else previous
+        self.tree: Dict[str, DirRecord] = {}
+        self.completed = False  # 遍历是否完整结束，未完成时 tree 不可用
+        self.discovered = 0  # 已发现的文件数，遍历结束前会持续增长
+        self.skipped = 0  # 未变化目录中直接沿用记录的文件数
+        self._paths: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._results: queue.Queue = queue.Queue()
+        self._stop = threading.Event()
+        self._running = threading.Event()  # 清除时遍历和哈希线程在处理下一个文件前暂停
+        self._running.set()
+        self._threads: List[threading.Thread] = []
+        self._pending: Dict[int, ScanResult] = {}  # 已完成但还没轮到交出的结果
+        self._next_seq = 0
+        self._finished_workers = 0
+
+    def _wait_running(self) -> bool:
+        """暂停时等待恢复，取消时返回 False"""
+        while not self._running.wait(0.1):
+            if self._stop.is_set():
+                return False
+        return not self._stop.is_set()
+
+    def _put(self, q: queue.Queue, item) -> bool:
+        """可被取消的阻塞写入"""
+        while self._wait_running():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _known_files(self) -> Optional[Dict[str, List[str]]]:
+        """按所在目录（相对路径）分组的已索引文件"""
+        if self.previous is None:
+            return None
+        by_dir: Dict[str, List[str]] = {}
+        for path in self.known:
+            by_dir.setdefault(os.path.dirname(path), []).append(path)
+        # 按实际路径分组，相对路径每个目录只计算一次
+        known_files: Dict[str, List[str]] = {}
+        for directory, paths in by_dir.items():
+            rel_dir = os.path.relpath(directory, self.root)
+            known_files[rel_dir if rel_dir != os.curdir else ""] = paths
+        return known_files
+
+    def _walk(self) -> None:
+        """生产者：流式遍历目录"""
+        try:
+            seq = 0
+            for filepath, st, unchanged in scan_images(self.root, self.previous,
+                                                       self._known_files(), self.tree):
+                rel_path = unchanged and self.known[filepath][1].relative_path or os.path.relpath(filepath, self.root)
+                if not self._put(self._paths, ScanResult(seq, rel_path, filepath, st, unchanged)):
+                    return
+                seq += 1
+                self.discovered = seq
+                if unchanged:
+                    self.skipped += 1
+            self.completed = True
+        finally:
+            for _ in range(self.workers):
+                self._put(self._paths, _DONE)
+
+    def _hash_worker(self) -> None:
+        """消费者：计算哈希；单个文件出错时标记为失败，结束标记总会送出"""
+        try:
+            while not self._stop.is_set():
+                try:
+                    item = self._paths.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if item is _DONE:
+                    break
+                if not self._wait_running():
+                    break
+                try:
+                    self._fingerprint(item)
+                except Exception as e:
+                    print(f"计算指纹失败: {item.filepath}, 错误: {e}")
+                    entry = self.known.get(item.filepath)
+                    item.failed = True
+                    item.known_key = entry[0] if entry else None
+                self._results.put(item)
+        finally:
+            self._results.put(_DONE)
+
+    def _fingerprint(self, item: ScanResult) -> None:
+        if item.unchanged:
+            key, pic = self.known[item.filepath]
+            if pic.sample_hash and pic.phash and pic.width is not None:
+                item.known_key = key
+                return
+            # 旧索引缺少的字段需要读取文件补充
+            item.unchanged = False
+        if item.stat is None:
+            try:
+                item.stat = os.stat(item.filepath)
+            except OSError:
+                return
+        verify = self.verify and item.filepath not in self.resumed
+        fingerprint_file(item, self.known, verify, self.algorithm, self.legacy)
+
+    def start(self) -> None:
+        """启动遍历和哈希线程"""
+        if self._threads:
+            return
+        self._threads = [threading.Thread(target=self._walk, daemon=True)]
+        self._threads += [threading.Thread(target=self._hash_worker, daemon=True)
+                          for _ in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    @property
+    def finished(self) -> bool:
+        """所有结果都已交出（或已取消）"""
+        return self._finished_workers >= self.workers and not self._pending
+
+    @property
+    def processed(self) -> int:
+        """已交出的结果数"""
+        return self._next_seq
+
+    def poll(self, timeout: Optional[float] = None, limit: Optional[int] = None) -> List[ScanResult]:
+        """按遍历顺序取出已就绪的结果
+
+        timeout 为 None 时阻塞到至少有一个结果或流水线结束，为 0 时只取出已就绪的结果。
+        """
+        ready: List[ScanResult] = []
+        block = timeout is None or timeout > 0
+        while self._finished_workers < self.workers and (limit is None or len(ready) < limit):
+            try:
+                item = self._results.get(block=block and not ready, timeout=timeout)
+            except queue.Empty:
+                break
+            if item is _DONE:
+                self._finished_workers += 1
+                continue
+            self._pending[item.seq] = item
+            # 重排序：只按遍历顺序交出结果
+            while self._next_seq in self._pending and (limit is None or len(ready) < limit):
+                ready.append(self._pending.pop(self._next_seq))
+                self._next_seq += 1
+        while self._next_seq in self._pending and (limit is None or len(ready) < limit):
+            ready.append(self._pending.pop(self._next_seq))
+            self._next_seq += 1
+        if self._finished_workers >= self.workers and self._stop.is_set():
+            self._pending.clear()  # 取消后不再交出剩余结果
+        return ready
+
+    def pause(self) -> None:
+        self._running.clear()
+
+    def resume(self) -> None:
+        self._running.set()
+
+    def cancel(self) -> None:
+        """停止遍历和哈希线程，已取出的结果不受影响"""
+        self._stop.set()
+        self._running.set()
+
+    def run(self) -> Iterator[ScanResult]:
+        """启动流水线，按遍历顺序逐个产出结果"""
+        self.start()
+        try:
+            while not self.finished:
+                yield from self.poll()
+        finally:
+            self.cancel()
+
+
+class BuildSession:
+    """一次构建的状态：流水线、扫描时使用的查找表和已处理的键"""
+
+    def __init__(self, root: str, pipeline: HashPipeline,
+                 sample_index: Dict[str, List[str]], legacy_hashes: Dict[str, str]):
+        self.root = root
+        self.pipeline = pipeline
+        self.sample_index = sample_index
+        self.legacy_hashes = legacy_hashes
+        self.processed_keys: Set[str] = set()  # 用于检测删除的文件
+        self.unsaved_paths: List[str] = []  # 上次检查点之后应用的文件
+        self.last_checkpoint = time.monotonic()
+
+
+class BuildCheckpoint:
+    """构建检查点，中断（关闭或崩溃）后下次构建从这里继续
+
+    第一行为构建信息，之后每个检查点追加一行：本批已写入索引的文件路径。
+    只在索引保存成功后追加，记录中的文件一定已经保存；完整扫描结束后删除。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def start(self, root: str, verify: bool) -> None:
+        """开始新的构建"""
+        try:
+            with open(self.path, 'w', encoding='utf-8') as f:
+                f.write(json.dumps({"root": root, "verify": verify, "started": time.time()}) + "\n")
+        except Exception as e:
+            print(f"写入构建检查点失败: {e}")
+
+    def load(self, root: str) -> Optional[Tuple[bool, Set[str]]]:
+        """读取中断的构建，返回 (是否为校验模式, 已保存的文件)，没有或目录不一致时返回 None"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                lines = f.read().splitlines()
+            header = json.loads(lines[0])
+        except (OSError, ValueError, IndexError):
+            return None
+        if header.get("root") != root:
+            return None
+        processed: Set[str] = set()
+        for line in lines[1:]:
+            try:
+                processed.update(json.loads(line))
+            except ValueError:
+                break  # 崩溃时写了一半的行
+        return bool(header.get("verify")), processed
+
+    def append(self, paths: List[str]) -> None:
+        """记录一批已保存的文件"""
+        try:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(paths, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        except Exception as e:
+            print(f"写入构建检查点失败: {e}")
+
+    def clear(self) -> None:
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"删除构建检查点失败: {e}")
@@ -0,0 +1,395 @@
+import os
+import json
+import sqlite3
+import threading
+from typing import Dict, Iterable, Iterator, Optional, Tuple, Any
+
+# 单独成列的核心字段，其余字段以JSON形式存放在 extra 列中
+CORE_FIELDS = ("path", "relative_path", "hash", "display_name",
+               "excluded", "last_accessed", "added_date")
+
+
+class IndexStore:
+    """索引存储后端基类
+
+    load() 返回与 IndexManager.to_dict() 相同结构的字典，不存在时返回 None。
+    supports_row_updates 为 True 的后端支持只写入变化的记录，否则只能整体保存。
+    supports_lazy_load 为 True 的后端可以先只加载核心字段（load_core），
+    其余字段再通过 load_extra 分批读取。
+    """
+
+    supports_row_updates = False
+    supports_lazy_load = False
+
+    def exists(self) -> bool:
+        """存储是否已存在"""
+        raise NotImplementedError
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        """加载整个索引"""
+        raise NotImplementedError
+
+    def load_core(self) -> Optional[Dict[str, Any]]:
+        """只加载核心字段，不支持时加载完整索引"""
+        return self.load()
+
+    def load_extra(self, keys: Optional[Iterable[str]] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """逐条读取非核心字段，keys 为 None 时读取全部"""
+        raise NotImplementedError
+
+    def save(self, data: Dict[str, Any]) -> bool:
+        """整体保存索引"""
+        raise NotImplementedError
+
+    def write_changes(self, upserts: Dict[str, Dict[str, Any]], deletes: Iterable[str],
+                      meta: Dict[str, Any]) -> bool:
+        """原子地写入一批变化：插入或更新的记录、删除的键和元数据"""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """关闭存储"""
+        pass
+
+
+class JsonIndexStore(IndexStore):
+    """JSON快照 + 追加写日志
+
+    每次保存只把变化的记录作为一行追加到日志并 fsync，加载时读取快照后重放日志。
+    日志超过阈值后在后台线程中合并为新快照：先把日志改名为 .old，
+    之后的写入进入新日志，合并完成后再删除 .old（重放是幂等的，中途崩溃也不会丢数据）。
+    """
+
+    supports_row_updates = True
+
+    def __init__(self, path: str, compact_threshold: int = 4 * 1024 * 1024):
+        self.path = path
+        self.journal_path = f"{path}.journal"
+        self.rotated_path = f"{self.journal_path}.old"
+        self.compact_threshold = compact_threshold
+        self._lock = threading.RLock()
+        self._compact_lock = threading.Lock()
+        self._compactor: Optional[threading.Thread] = None
+
+    def exists(self) -> bool:
+        return any(os.path.exists(p) for p in (self.path, self.journal_path, self.rotated_path))
+
+    # 快照的读写，子类可替换为其他格式
+    def _read_snapshot(self) -> Dict[str, Any]:
+        if not os.path.exists(self.path):
+            return {"wallpapers": {}}
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write_temp(self, data: Dict[str, Any], suffix: str = ".tmp") -> str:
+        """把快照写入临时文件，返回临时文件路径"""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temp_file = f"{self.path}{suffix}"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        return temp_file
+
+    @staticmethod
+    def _apply_batch(data: Dict[str, Any], batch: Dict[str, Any]) -> None:
+        wallpapers = data.setdefault("wallpapers", {})
+        wallpapers.update(batch.get("put", {}))
+        for key in batch.get("del", ()):
+            wallpapers.pop(key, None)
+        data.update(batch.get("meta", {}))
+
+    def _replay(self, journal: str, data: Dict[str, Any], repair: bool = False) -> None:
+        """重放日志，遇到不完整的尾部记录时停止（repair 为 True 时截断）"""
+        if not os.path.exists(journal):
+            return
+        good_size = 0
+        with open(journal, 'rb') as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    batch = json.loads(line)
+                except ValueError:
+                    break
+                self._apply_batch(data, batch)
+                good_size += len(line)
+        file_size = os.path.getsize(journal)
+        if repair and good_size < file_size:
+            # 上次写入中断，截掉不完整的尾部记录
+            print(f"索引日志尾部损坏，截断 {file_size - good_size} 字节")
+            with open(journal, 'r+b') as f:
+                f.truncate(good_size)
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if not self.exists():
+                return None
+            data = self._read_snapshot()
+            self._replay(self.rotated_path, data)
+            self._replay(self.journal_path, data, repair=True)
+            return data
+
+    def save(self, data: Dict[str, Any]) -> bool:
+        try:
+            self._wait_compaction()
+            with self._lock:
+                os.replace(self._write_temp(data), self.path)
+                # 快照已包含全部数据，日志可以丢弃
+                for journal in (self.rotated_path, self.journal_path):
+                    if os.path.exists(journal):
+                        os.remove(journal)
+            return True
+        except Exception as e:
+            print(f"保存索引失败: {e}")
+            return False
+
+    def write_changes(self, upserts: Dict[str, Dict[str, Any]], deletes: Iterable[str],
+                      meta: Dict[str, Any]) -> bool:
+        batch = {"put": upserts, "del": list(deletes), "meta": meta}
+        line = (json.dumps(batch, ensure_ascii=False) + "\n").encode('utf-8')
+        try:
+            with self._lock:
+                os.makedirs(os.path.dirname(self.journal_path) or ".", exist_ok=True)
+                with open(self.journal_path, 'ab') as f:
+                    f.write(line)
+                    f.flush()
+                    os.fsync(f.fileno())
+                    size = f.tell()
+        except Exception as e:
+            print(f"写入索引日志失败: {e}")
+            return False
+
+        if size >= self.compact_threshold:
+            self.compact_async()
+        return True
+
+    def compact(self) -> bool:
+        """把日志合并进快照"""
+        with self._compact_lock:
+            with self._lock:
+                if os.path.exists(self.journal_path) and not os.path.exists(self.rotated_path):
+                    os.replace(self.journal_path, self.rotated_path)
+                if not os.path.exists(self.rotated_path):
+                    return False
+            try:
+                # 只有合并线程会替换快照，读取和写入临时文件时无需持有锁
+                data = self._read_snapshot()
+                self._replay(self.rotated_path, data)
+                temp_file = self._write_temp(data, ".compact.tmp")
+                with self._lock:
+                    os.replace(temp_file, self.path)
+                    os.remove(self.rotated_path)
+                return True
+            except Exception as e:
+                print(f"合并索引日志失败: {e}")
+                return False
+
+    def compact_async(self) -> None:
+        """在后台线程中合并日志"""
+        if self._compactor and self._compactor.is_alive():
+            return
+        self._compactor = threading.Thread(target=self.compact, daemon=True)
+        self._compactor.start()
+
+    def _wait_compaction(self) -> None:
+        if self._compactor and self._compactor.is_alive():
+            self._compactor.join()
+
+    def close(self) -> None:
+        self._wait_compaction()
+
+
+class SqliteIndexStore(IndexStore):
+    """SQLite存储，每次保存在一个事务中只写入变化的行
+
+    首次打开时如果数据库为空且存在旧的JSON索引，会自动迁移一次。
+    """
+
+    supports_row_updates = True
+    supports_lazy_load = True
+
+    def __init__(self, path: str, legacy_json: Optional[str] = None):
+        self.path = path
+        self.legacy_json = legacy_json
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.RLock()
+
+    def _connect(self) -> sqlite3.Connection:
+        """延迟打开数据库连接"""
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            # 自动保存线程和缩略图线程也会写入，使用锁串行化
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS pictures ("
+                "key TEXT PRIMARY KEY, path TEXT, relative_path TEXT, hash TEXT, "
+                "display_name TEXT, excluded INTEGER, last_accessed TEXT, "
+                "added_date TEXT, extra TEXT)")
+            conn.commit()
+            self._conn = conn
+            self._migrate_legacy_json()
+        return self._conn
+
+    def _migrate_legacy_json(self) -> None:
+        """从旧的 wallpaper_index.json 迁移（只执行一次）"""
+        if not self.legacy_json or not os.path.exists(self.legacy_json):
+            return
+        if self._get_meta("migrated_from") is not None:
+            return
+        if self._conn.execute("SELECT 1 FROM pictures LIMIT 1").fetchone():
+            return
+
+        try:
+            data = JsonIndexStore(self.legacy_json).load()
+        except Exception as e:
+            print(f"读取旧索引失败: {e}")
+            return
+
+        print(f"正在迁移旧索引: {self.legacy_json}")
+        if self._write_all(data or {}):
+            self._set_meta("migrated_from", self.legacy_json)
+            self._conn.commit()
+
+    def _get_meta(self, name: str) -> Any:
+        row = self._conn.execute(
+            "SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _set_meta(self, name: str, value: Any) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)",
+            (name, json.dumps(value)))
+
+    @staticmethod
+    def _to_row(key: str, record: Dict[str, Any]) -> tuple:
+        """记录字典转换为数据库行"""
+        extra = {k: v for k, v in record.items() if k not in CORE_FIELDS}
+        return (key, record.get("path", ""), record.get("relative_path", ""),
+                record.get("hash", ""), record.get("display_name", ""),
+                1 if record.get("excluded") else 0,
+                record.get("last_accessed"), record.get("added_date"),
+                json.dumps(extra, ensure_ascii=False))
+
+    @staticmethod
+    def _from_row(row: tuple) -> Dict[str, Any]:
+        """数据库行转换为记录字典"""
+        record = json.loads(row[8]) if row[8] else {}
+        record.update(zip(CORE_FIELDS, row[1:8]))
+        record["excluded"] = bool(record["excluded"])
+        return record
+
+    def _write_all(self, data: Dict[str, Any]) -> bool:
+        try:
+            self._conn.execute("DELETE FROM pictures")
+            self._conn.executemany(
+                "INSERT INTO pictures VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (self._to_row(k, v) for k, v in data.get("wallpapers", {}).items()))
+            self._set_meta("total_count", data.get("total_count", 0))
+            self._set_meta("last_updated", data.get("last_updated"))
+            return True
+        except Exception as e:
+            self._conn.rollback()
+            print(f"写入索引数据库失败: {e}")
+            return False
+
+    def exists(self) -> bool:
+        if os.path.exists(self.path):
+            return True
+        return bool(self.legacy_json and os.path.exists(self.legacy_json))
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        if not self.exists():
+            return None
+        with self._lock:
+            conn = self._connect()
+            rows = conn.execute(
+                "SELECT key, path, relative_path, hash, display_name, excluded, "
+                "last_accessed, added_date, extra FROM pictures").fetchall()
+            wallpapers = {row[0]: self._from_row(row) for row in rows}
+            return {
+                "wallpapers": wallpapers,
+                "total_count": self._get_meta("total_count") or len(wallpapers),
+                "last_updated": self._get_meta("last_updated")
+            }
+
+    def load_core(self) -> Optional[Dict[str, Any]]:
+        if not self.exists():
+            return None
+        with self._lock:
+            conn = self._connect()
+            rows = conn.execute(
+                "SELECT key, path, relative_path, hash, display_name, excluded, "
+                "last_accessed, added_date FROM pictures").fetchall()
+            wallpapers = {}
+            for row in rows:
+                record = dict(zip(CORE_FIELDS, row[1:]))
+                record["excluded"] = bool(record["excluded"])
+                wallpapers[row[0]] = record
+            return {
+                "wallpapers": wallpapers,
+                "total_count": self._get_meta("total_count") or len(wallpapers),
+                "last_updated": self._get_meta("last_updated")
+            }
+
+    def load_extra(self, keys: Optional[Iterable[str]] = None,
+                   batch_size: int = 1000) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        if keys is not None:
+            for key in keys:
+                with self._lock:
+                    row = self._connect().execute(
+                        "SELECT extra FROM pictures WHERE key = ?", (key,)).fetchone()
+                if row:
+                    yield key, json.loads(row[0]) if row[0] else {}
+            return
+
+        # 按 rowid 分批读取，每批之间释放锁，不阻塞保存
+        last_rowid = 0
+        while True:
+            with self._lock:
+                rows = self._connect().execute(
+                    "SELECT rowid, key, extra FROM pictures WHERE rowid > ? "
+                    "ORDER BY rowid LIMIT ?", (last_rowid, batch_size)).fetchall()
+            if not rows:
+                return
+            for rowid, key, extra in rows:
+                yield key, json.loads(extra) if extra else {}
+            last_rowid = rows[-1][0]
+
+    def save(self, data: Dict[str, Any]) -> bool:
+        with self._lock:
+            self._connect()
+            if not self._write_all(data):
+                return False
+            self._conn.commit()
+            return True
+
+    def write_changes(self, upserts: Dict[str, Dict[str, Any]], deletes: Iterable[str],
+                      meta: Dict[str, Any]) -> bool:
+        with self._lock:
+            try:
+                conn = self._connect()
+                conn.executemany(
+                    "INSERT OR REPLACE INTO pictures VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (self._to_row(k, v) for k, v in upserts.items()))
+                conn.executemany(
+                    "DELETE FROM pictures WHERE key = ?", ((k,) for k in deletes))
+                for name, value in meta.items():
+                    self._set_meta(name, value)
+                conn.commit()
+                return True
+            except Exception as e:
+                if self._conn is not None:
+                    self._conn.rollback()
+                print(f"提交索引数据库失败: {e}")
+                return False
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.commit()
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,277 @@
+import os
+import sys
+import time
+import select
+import struct
+import ctypes
+import ctypes.util
+import threading
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from .index_pipeline import IMAGE_EXTENSIONS
+
+# 事件类型
+CHANGED = "changed"
+DELETED = "deleted"
+RESYNC = "resync"  # 事件丢失，需要整体同步
+
+Event = Tuple[str, str]
+
+
+def _is_image(path: str) -> bool:
+    return path.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def _list_images(directory: str) -> List[str]:
+    """列出目录（含子目录）中的所有图片"""
+    result = []
+    for root, _, files in os.walk(directory):
+        result.extend(os.path.join(root, f) for f in files if _is_image(f))
+    return result
+
+
+class InotifyBackend:
+    """Linux inotify 后端（通过 ctypes 调用，无额外依赖）"""
+
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+
+    WATCH_MASK = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+                  | IN_CREATE | IN_DELETE | IN_DELETE_SELF)
+    EVENT_HEADER = struct.Struct("iIII")
+
+    def __init__(self, root: str):
+        self.root = root
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self._watches: Dict[int, str] = {}
+        self._add_tree(root)
+
+    @staticmethod
+    def available() -> bool:
+        return sys.platform.startswith("linux")
+
+    def _add_tree(self, directory: str) -> None:
+        """递归添加目录监视"""
+        for root, _, _ in os.walk(directory):
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(root), self.WATCH_MASK)
+            if wd >= 0:
+                self._watches[wd] = root
+
+    def poll(self, timeout: float) -> List[Event]:
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events: List[Event] = []
+        offset = 0
+        while offset + self.EVENT_HEADER.size <= len(data):
+            wd, mask, _, name_len = self.EVENT_HEADER.unpack_from(data, offset)
+            offset += self.EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + name_len].rstrip(b"\0"))
+            offset += name_len
+
+            if mask & self.IN_Q_OVERFLOW:
+                events.append((RESYNC, self.root))
+                continue
+            if mask & self.IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            directory = self._watches.get(wd)
+            if directory is None:
+                continue
+            path = os.path.join(directory, name) if name else directory
+
+            if mask & self.IN_ISDIR:
+                if mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                    # 新目录：添加监视，并补报监视建立前已写入的文件
+                    self._add_tree(path)
+                    events.extend((CHANGED, p) for p in _list_images(path))
+                elif mask & (self.IN_DELETE | self.IN_MOVED_FROM):
+                    events.append((DELETED, path))
+            elif mask & (self.IN_MOVED_FROM | self.IN_DELETE):
+                if _is_image(path):
+                    events.append((DELETED, path))
+            elif mask & (self.IN_CREATE | self.IN_MODIFY | self.IN_CLOSE_WRITE | self.IN_MOVED_TO):
+                if _is_image(path):
+                    events.append((CHANGED, path))
+        return events
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class PollingBackend:
+    """可移植的轮询后端，只在目录修改时间变化时重新列出该目录"""
+
+    def __init__(self, root: str, interval: float = 2.0):
+        self.root = root
+        self.interval = interval
+        self._dirs: Dict[str, int] = {}  # 目录 -> mtime_ns
+        self._files: Dict[str, Dict[str, Tuple[int, int]]] = {}  # 目录 -> {文件名: (大小, mtime_ns)}
+        self._subdirs: Dict[str, Set[str]] = {}
+        self._last_scan = time.monotonic()
+        self._snapshot(root, [], report=False)
+
+    def _snapshot(self, directory: str, events: List[Event], report: bool = True) -> None:
+        """记录目录状态，report 为 True 时把与上次记录的差异作为事件上报"""
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+            entries = list(os.scandir(directory))
+        except OSError:
+            return
+        files, subdirs = {}, set()
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.add(entry.path)
+                elif _is_image(entry.name):
+                    st = entry.stat()
+                    files[entry.name] = (st.st_size, st.st_mtime_ns)
+            except OSError:
+                continue
+
+        old_files = self._files.get(directory, {})
+        if report:
+            for name, state in files.items():
+                if old_files.get(name) != state:
+                    events.append((CHANGED, os.path.join(directory, name)))
+            for name in old_files.keys() - files.keys():
+                events.append((DELETED, os.path.join(directory, name)))
+
+        self._dirs[directory] = mtime
+        self._files[directory] = files
+        old_subdirs = self._subdirs.get(directory, set())
+        self._subdirs[directory] = subdirs
+        for sub in old_subdirs - subdirs:
+            self._forget(sub)
+            events.append((DELETED, sub))
+        for sub in subdirs - old_subdirs:
+            self._snapshot(sub, events, report)
+
+    def _forget(self, directory: str) -> None:
+        """移除目录及其子目录的记录"""
+        self._dirs.pop(directory, None)
+        self._files.pop(directory, None)
+        for sub in self._subdirs.pop(directory, set()):
+            self._forget(sub)
+
+    def poll(self, timeout: float) -> List[Event]:
+        time.sleep(timeout)
+        if time.monotonic() - self._last_scan < self.interval:
+            return []
+        self._last_scan = time.monotonic()
+        events: List[Event] = []
+        for directory, mtime in list(self._dirs.items()):
+            if directory not in self._dirs:
+                continue  # 已在本轮中被移除
+            try:
+                changed = os.stat(directory).st_mtime_ns != mtime
+            except OSError:
+                if directory != self.root:
+                    continue  # 由父目录的变化上报删除
+                changed = True
+            if changed:
+                self._snapshot(directory, events)
+        return events
+
+    def close(self) -> None:
+        pass
+
+
+class IndexWatcher:
+    """监视壁纸目录，把文件系统事件合并后批量交给回调
+
+    一段静默期（debounce）内没有新事件，或距第一条未处理事件超过 max_delay 时，
+    以 on_changes(changed, deleted) 调用一次回调；事件丢失时两者均为 None，
+    表示需要整体同步。回调在监视线程中执行。
+    """
+
+    def __init__(self, root: str, on_changes: Callable[[Optional[Set[str]], Optional[Set[str]]], None],
+                 debounce: float = 1.0, max_delay: float = 10.0, force_polling: bool = False):
+        self.root = root
+        self.on_changes = on_changes
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.force_polling = force_polling
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def _create_backend(self):
+        if not self.force_polling and InotifyBackend.available():
+            try:
+                return InotifyBackend(self.root)
+            except Exception as e:
+                print(f"inotify 不可用，改用轮询: {e}")
+        return PollingBackend(self.root)
+
+    def start(self) -> None:
+        """启动监视线程；遍历目录树建立监视或快照也在监视线程中进行，不阻塞调用线程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=3)
+            self._thread = None
+
+    def _run(self) -> None:
+        try:
+            backend = self._create_backend()
+        except Exception as e:
+            print(f"监视目录失败: {self.root}, 错误: {e}")
+            return
+        pending: Dict[str, str] = {}
+        resync = False
+        first_event = last_event = 0.0
+        try:
+            while not self._stop.is_set():
+                for kind, path in backend.poll(0.2):
+                    now = time.monotonic()
+                    if not pending and not resync:
+                        first_event = now
+                    last_event = now
+                    if kind == RESYNC:
+                        resync = True
+                    else:
+                        pending[path] = kind  # 同一路径只保留最后一次事件
+
+                if not pending and not resync:
+                    continue
+                now = time.monotonic()
+                if now - last_event < self.debounce and now - first_event < self.max_delay:
+                    continue
+
+                try:
+                    if resync:
+                        self.on_changes(None, None)
+                    else:
+                        changed = {p for p, k in pending.items() if k == CHANGED}
+                        deleted = {p for p, k in pending.items() if k == DELETED}
+                        self.on_changes(changed, deleted)
+                except Exception as e:
+                    print(f"处理文件变化失败: {e}")
+                pending = {}
+                resync = False
+        finally:
+            backend.close()
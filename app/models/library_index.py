@@ -0,0 +1,375 @@
+import os
+import heapq
+import itertools
+import time
+import hashlib
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from .picture import Picture
+from .index_manager import IndexManager
+from .index_pipeline import BuildSession, HashResult, HashTask
+from .secondary_index import PictureIndexes
+from .similarity_index import DEFAULT_RADIUS, cluster_hashes
+from .thumbnail_engine import ThumbnailResult, ThumbnailTask
+from .settings import wallpaperCfg
+
+
+def shard_name(root: str) -> str:
+    """附加目录的分片名，由规范化的目录路径生成"""
+    normalized = os.path.normcase(os.path.abspath(root))
+    return hashlib.md5(normalized.encode("utf-8")).hexdigest()[:8]
+
+
+class LibraryIndex:
+    """多个壁纸目录的合并索引
+
+    主目录（wallpaperDir）沿用原有的索引文件；每个附加目录（extraWallpaperDirs）
+    有独立的索引分片和缩略图包，新图片的键带有分片前缀，不同目录中的相同文件不会冲突。
+    构建时每个目录在各自的线程中扫描，慢速磁盘不会拖慢其他目录。
+    不可访问的目录（例如未连接的移动硬盘）跳过扫描并从合并视图中隐藏，记录保留到目录重新连接。
+    """
+
+    def __init__(self):
+        self.primary = IndexManager()
+        self._extra: Dict[str, IndexManager] = {}  # 附加目录 -> 分片
+        self._offline: Set[IndexManager] = set()
+        self._loaded = False
+        self._extras_notify: Optional[Callable[[], None]] = None
+        self._lock = threading.RLock()
+
+    def _create_shard(self, root: str) -> IndexManager:
+        name = shard_name(root)
+        return IndexManager(
+            store=IndexManager._create_store(name), root=root,
+            thumbnail_pack=os.path.join(wallpaperCfg.indexShardDir.value, f"{name}.pack"),
+            key_prefix=f"{name}:")
+
+    def refresh_roots(self) -> None:
+        """按配置同步附加目录的分片，并重新检查各目录是否在线"""
+        with self._lock:
+            primary_root = os.path.normcase(os.path.abspath(self.primary.root))
+            roots = []
+            for root in wallpaperCfg.extraWallpaperDirs.value:
+                normalized = os.path.normcase(os.path.abspath(root))
+                if normalized != primary_root and root not in roots:
+                    roots.append(root)
+
+            for root in list(self._extra):
+                if root not in roots:
+                    self._extra.pop(root).close()
+            for root in roots:
+                if root not in self._extra:
+                    shard = self._create_shard(root)
+                    if self._loaded:
+                        shard.load_index(lazy=True, notify=self._extras_notify)
+                    self._extra[root] = shard
+
+            self._offline = {shard for shard in self.all_shards() if not os.path.isdir(shard.root)}
+            for shard in self._offline:
+                print(f"壁纸目录不可访问，已跳过: {shard.root}")
+
+    def all_shards(self) -> List[IndexManager]:
+        """全部分片（包括离线目录）"""
+        return [self.primary, *self._extra.values()]
+
+    @property
+    def shards(self) -> List[IndexManager]:
+        """在线目录的分片，合并视图只包含这些分片"""
+        return [shard for shard in self.all_shards() if shard not in self._offline]
+
+    def roots(self) -> List[str]:
+        """在线的壁纸目录"""
+        return [shard.root for shard in self.shards]
+
+    def _shard_of(self, key: str) -> Optional[IndexManager]:
+        for shard in self.shards:
+            if key in shard.wallpaper_index:
+                return shard
+        return None
+
+    def _shard_for_path(self, path: str) -> Optional[IndexManager]:
+        """文件所在目录的分片，目录嵌套时取最深的一个"""
+        best, best_len = None, -1
+        for shard in self.shards:
+            root = shard.root.rstrip(os.sep) + os.sep
+            if path.startswith(root) and len(root) > best_len:
+                best, best_len = shard, len(root)
+        return best
+
+    def __contains__(self, key: str) -> bool:
+        return self._shard_of(key) is not None
+
+    # 查询：合并各分片的结果
+
+    @property
+    def total_count(self) -> int:
+        return sum(shard.total_count for shard in self.shards)
+
+    def get_picture(self, key: str) -> Optional[Picture]:
+        """获取图片（只读）"""
+        shard = self._shard_of(key)
+        return shard.get_picture(key) if shard else None
+
+    def get_all_keys(self) -> List[str]:
+        return [key for shard in self.shards for key in shard.get_all_keys()]
+
+    def get_filtered_keys(self, excluded: bool = False) -> List[str]:
+        return [key for shard in self.shards for key in shard.get_filtered_keys(excluded)]
+
+    def get_sorted_keys(self, order: str, excluded: Optional[bool] = None,
+                        reverse: bool = False) -> List[str]:
+        """各分片已排序的键列表做归并，结果与整体排序一致"""
+        shards = self.shards
+        if len(shards) == 1:
+            return shards[0].get_sorted_keys(order, excluded, reverse)
+        sort_value = PictureIndexes.ORDERS[order]
+        runs = []
+        for shard in shards:
+            pictures = shard.wallpaper_index
+            keys = shard.get_sorted_keys(order, excluded, reverse)
+            runs.append([(sort_value(pictures[key]), key) for key in keys])
+        return [key for _, key in heapq.merge(*runs, reverse=reverse)]
+
+    def search_by_name(self, query: str) -> List[str]:
+        return [key for shard in self.shards for key in shard.search_by_name(query)]
+
+    def search_by_hash(self, hash_value: str) -> Optional[str]:
+        keys = [key for key in (shard.search_by_hash(hash_value) for shard in self.shards) if key]
+        return min(keys) if keys else None
+
+    @staticmethod
+    def _merge_ranked(runs: List[List[Tuple[float, str]]], limit: Optional[int]) -> List[str]:
+        """归并各分片按得分升序的结果"""
+        return [key for _, key in itertools.islice(heapq.merge(*runs), limit)]
+
+    def find_by_luminance(self, max_luminance: float = 1.0, min_luminance: float = 0.0,
+                          limit: Optional[int] = None, excluded: Optional[bool] = None) -> List[str]:
+        return self._merge_ranked([shard.find_by_luminance(max_luminance, min_luminance, limit, excluded)
+                                   for shard in self.shards], limit)
+
+    def find_similar_palette(self, key: str, limit: Optional[int] = None,
+                             excluded: Optional[bool] = None) -> List[str]:
+        """主色与指定图片最接近的其他图片，excluded 含义同 get_sorted_keys"""
+        pic = self.get_picture(key)
+        if not pic or not pic.palette:
+            return []
+        shard_limit = limit + 1 if limit is not None else None  # 结果可能包含图片本身
+        runs = [shard.find_similar_palette(pic.palette, shard_limit, excluded) for shard in self.shards]
+        keys = [match for match in self._merge_ranked(runs, None) if match != key]
+        return keys[:limit] if limit is not None else keys
+
+    def find_nearest_color(self, rgb: Tuple[int, int, int], limit: Optional[int] = None,
+                           excluded: Optional[bool] = None) -> List[str]:
+        return self._merge_ranked([shard.find_nearest_color(rgb, limit, excluded)
+                                   for shard in self.shards], limit)
+
+    def get_keys_by_resolution(self, min_width: int = 0, min_height: int = 0) -> List[str]:
+        return [key for shard in self.shards for key in shard.get_keys_by_resolution(min_width, min_height)]
+
+    def find_similar(self, key: str, radius: int = DEFAULT_RADIUS) -> List[str]:
+        """与指定图片相似的其他图片，按感知哈希距离排序"""
+        pic = self.get_picture(key)
+        if not pic or not pic.phash:
+            return []
+        matches = [match for shard in self.shards for match in shard.find_similar(pic.phash, radius)]
+        matches.sort()
+        return [match_key for _, match_key in matches if match_key != key]
+
+    def duplicate_groups(self, radius: int = DEFAULT_RADIUS) -> List[List[str]]:
+        """所有在线目录中的相似图片分组（跨目录的副本也会归为一组）"""
+        keys, values = [], []
+        for shard in self.shards:
+            for key, value in shard.phash_items():
+                keys.append(key)
+                values.append(value)
+        return cluster_hashes(keys, values, radius)
+
+    # 加载和构建
+
+    def load_index(self, lazy: bool = False, notify: Optional[Callable[[], None]] = None) -> bool:
+        """加载所有分片，任一在线目录没有索引时返回 False（需要构建）
+
+        notify 见 IndexManager.load_index，收到后在索引所在的线程调用 apply_loaded_extras。
+        """
+        with self._lock:
+            self._loaded = True
+            self._extras_notify = notify
+            self.refresh_roots()
+            loaded = [shard.load_index(lazy=lazy, notify=notify) for shard in self.all_shards()]
+            online = [ok for shard, ok in zip(self.all_shards(), loaded) if shard not in self._offline]
+            return bool(online) and all(online)
+
+    @property
+    def extras_loaded(self) -> bool:
+        """各分片的后台加载都已结束"""
+        return all(shard.extras_loaded for shard in self.all_shards())
+
+    def apply_loaded_extras(self) -> int:
+        return sum(shard.apply_loaded_extras() for shard in self.all_shards())
+
+    def build_index(self, progress_callback: Callable = None, verify: bool = False) -> bool:
+        """同步构建所有在线目录的索引（命令行和同步重建使用，界面中用 IndexJob）
+
+        各目录的遍历和哈希在各自流水线的线程中并行进行，结果在调用线程上轮询后交给所属分片应用，
+        分片只在调用线程上修改。进度回调参数为所有目录合计的 (已处理数, 已发现数, filename)。
+        """
+        sessions = self.begin_build(verify)
+        if not sessions:
+            return False
+
+        results: Dict[IndexManager, bool] = {}
+        pending = list(sessions)
+        while pending:
+            idle = True
+            for shard, session in list(pending):
+                pipeline = session.pipeline
+                try:
+                    batch = pipeline.poll(timeout=0, limit=64)
+                    if batch:
+                        idle = False
+                        shard.apply_build_results(session, batch)
+                        if progress_callback:
+                            progress_callback(sum(s.pipeline.processed for _, s in sessions),
+                                              sum(s.pipeline.discovered for _, s in sessions), batch[-1].rel_path)
+                    if pipeline.finished:
+                        pending.remove((shard, session))
+                        results[shard] = shard.finish_build(session)
+                except Exception as e:
+                    print(f"构建索引失败: {shard.root}, 错误: {e}")
+                    if (shard, session) in pending:
+                        pending.remove((shard, session))
+                        pipeline.cancel()
+                    results[shard] = False
+            if idle and pending:
+                time.sleep(0.01)
+        return any(results.values())
+
+    def has_interrupted_build(self) -> bool:
+        """是否有目录的构建被中断（关闭或崩溃），可以继续"""
+        self.refresh_roots()
+        return any(shard.has_interrupted_build() for shard in self.shards)
+
+    def begin_build(self, verify: bool = False, resume: bool = True) -> List[Tuple[IndexManager, BuildSession]]:
+        """为每个在线目录启动构建流水线，结果由调用方轮询后交给对应分片应用"""
+        self.refresh_roots()
+        sessions = []
+        for shard in self.shards:
+            session = shard.begin_build(verify, resume)
+            if session:
+                sessions.append((shard, session))
+        return sessions
+
+    def apply_changes(self, changed: Set[str], deleted: Set[str]) -> bool:
+        """把文件变化分发到所在目录的分片"""
+        batches: Dict[IndexManager, tuple] = {}
+        for paths, slot in ((changed, 0), (deleted, 1)):
+            for path in paths:
+                shard = self._shard_for_path(path)
+                if shard:
+                    batches.setdefault(shard, (set(), set()))[slot].add(path)
+        updated = False
+        for shard, (shard_changed, shard_deleted) in batches.items():
+            if shard.apply_changes(shard_changed, shard_deleted):
+                updated = True
+        return updated
+
+    def hash_verify_tasks(self) -> List[HashTask]:
+        tasks = []
+        for shard in self.shards:
+            tasks += shard.hash_verify_tasks()
+        return tasks
+
+    def apply_verified_hashes(self, results: Iterable[HashResult]) -> int:
+        count = 0
+        for result in results:
+            shard = self._shard_of(result[0])
+            if shard:
+                count += shard.apply_verified_hashes([result])
+        return count
+
+    def verify_hashes(self, progress_callback: Callable = None,
+                      stop_event: Optional[threading.Event] = None) -> int:
+        return sum(shard.verify_hashes(progress_callback, stop_event) for shard in self.shards)
+
+    # 保存
+
+    def schedule_save(self) -> None:
+        for shard in self.all_shards():
+            shard.schedule_save()
+
+    def save(self) -> bool:
+        results = [shard.save() for shard in self.all_shards()]
+        return all(results)
+
+    def close(self) -> None:
+        for shard in self.all_shards():
+            shard.close()
+
+    def save_stats(self) -> Dict[str, float]:
+        """所有分片合计的保存耗时统计"""
+        stats = {"saves": 0, "failures": 0, "rows": 0, "max_ms": 0.0, "total_ms": 0.0}
+        for shard in self.all_shards():
+            shard_stats = shard.saver.stats()
+            for name in ("saves", "failures", "rows", "total_ms"):
+                stats[name] += shard_stats[name]
+            stats["max_ms"] = max(stats["max_ms"], shard_stats["max_ms"])
+        stats["avg_ms"] = stats["total_ms"] / stats["saves"] if stats["saves"] else 0.0
+        return stats
+
+    # 缩略图和缓存
+
+    def read_thumbnail(self, key: str) -> Optional[bytes]:
+        shard = self._shard_of(key)
+        return shard.read_thumbnail(key) if shard else None
+
+    def get_thumbnail_bytes(self, key: str) -> Optional[bytes]:
+        shard = self._shard_of(key)
+        return shard.get_thumbnail_bytes(key) if shard else None
+
+    def regenerate_thumbnail(self, key: str) -> Optional[bytes]:
+        shard = self._shard_of(key)
+        return shard.regenerate_thumbnail(key) if shard else None
+
+    def keys_needing_thumbnails(self, keys: Iterable[str]) -> List[str]:
+        """keys 中缺少缩略图或颜色特征的键，保持顺序"""
+        result = []
+        for key in keys:
+            shard = self._shard_of(key)
+            if shard and shard.needs_thumbnail(key):
+                result.append(key)
+        return result
+
+    def thumbnail_tasks(self, keys: Iterable[str]) -> List[ThumbnailTask]:
+        """需要交给缩略图进程处理的任务，保持 keys 的顺序"""
+        tasks = []
+        for key in keys:
+            shard = self._shard_of(key)
+            task = shard.thumbnail_task(key) if shard else None
+            if task:
+                tasks.append(task)
+        return tasks
+
+    def apply_thumbnails(self, results: Iterable[ThumbnailResult]) -> int:
+        """写入缩略图进程返回的结果，返回写入的数量"""
+        applied = 0
+        for result in results:
+            shard = self._shard_of(result[0])
+            if shard and shard.apply_thumbnail(result):
+                applied += 1
+        return applied
+
+    def compact_thumbnails(self) -> bool:
+        results = [shard.compact_thumbnails() for shard in self.shards]
+        return any(results)
+
+    def cache_files(self) -> Set[str]:
+        """所有分片引用的缓存（缓存目录共用，离线目录引用的也包括在内）"""
+        valid_cache_files = set()
+        for shard in self.all_shards():
+            valid_cache_files |= shard.cache_files()
+        return valid_cache_files
+
+    def cleanup_cache(self) -> int:
+        """清理缓存目录中无效的旧缓存文件"""
+        return self.primary.cleanup_cache(self.cache_files())
@@ -1,88 +1,343 @@
 import os
+import sys
+import time
 import datetime
 from typing import Dict, List, Optional, Tuple, Callable, Any, Union
 
+from app.utils.image_metadata import display_size
+
+
+def parse_timestamp(value: Any, default: float) -> float:
+    """解析时间戳：兼容旧索引的 ISO-8601 字符串"""
+    if value is None or value == "":
+        return default
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return default
+
+
+class _ExtraField:
+    """延迟加载的非核心字段：读写前先加载，稍后加载的旧值不会覆盖本次会话中的修改"""
+    
+    def __set_name__(self, owner, name: str) -> None:
+        self.slot = "_" + name
+    
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        obj.ensure_loaded()
+        return getattr(obj, self.slot)
+    
+    def __set__(self, obj, value) -> None:
+        obj.ensure_loaded()
+        setattr(obj, self.slot, value)
+
+
 class Picture:
-    """图片对象，封装图片的所有属性和处理方法"""
+    """图片对象，封装图片的所有属性和处理方法
     
-    def __init__(self, path: str, relative_path: str, file_hash: str, display_name: str = None):
-        self.path = path
-        self.relative_path = relative_path
-        self.hash = file_hash
-        self.display_name = display_name or os.path.basename(path)
+    为了在十万级索引下节省内存：使用 __slots__，路径拆分为驻留的目录字符串和文件名，
+    时间戳保存为 epoch 浮点数，显示名与文件名相同时不单独保存。
+    """
+    
+    __slots__ = ("_dir", "_rel_dir", "_rel_path", "_name", "_display_name", "hash", "_hash_algo",
+                 "_sample_hash", "_phash", "_crop_region", "_cache_path", "_thumb_ref", "excluded",
+                 "last_accessed", "added_date", "_file_size", "_mtime_ns", "_inode", "_device",
+                 "_width", "_height", "_image_format", "_color_mode", "_orientation",
+                 "_luminance", "_colorfulness", "_palette", "_modified", "_key", "_listener", "_loader", "_partial")
+    
+    # 只在索引核心列中保存的字段，其余字段可延迟加载
+    CORE_FIELDS = ("path", "relative_path", "hash", "display_name",
+                   "excluded", "last_accessed", "added_date")
+    # 索引时从文件头读取的图片信息
+    IMAGE_INFO_FIELDS = ("width", "height", "image_format", "color_mode", "orientation")
+    # 生成缩略图时计算的颜色特征
+    COLOR_FIELDS = ("luminance", "colorfulness", "palette")
+    # 核心字段以外的字段都在首次读写时加载（部分加载的图片上 hash_algo 等字段还不是索引中的值）
+    EXTRA_FIELDS = ("hash_algo", "sample_hash", "phash", "crop_region", "cache_path", "thumb_ref",
+                    "file_size", "mtime_ns", "inode", "device") + IMAGE_INFO_FIELDS + COLOR_FIELDS
+    
+    hash_algo = _ExtraField()
+    sample_hash = _ExtraField()
+    phash = _ExtraField()
+    crop_region = _ExtraField()
+    cache_path = _ExtraField()
+    thumb_ref = _ExtraField()
+    file_size = _ExtraField()
+    mtime_ns = _ExtraField()
+    inode = _ExtraField()
+    device = _ExtraField()
+    width = _ExtraField()
+    height = _ExtraField()
+    image_format = _ExtraField()
+    color_mode = _ExtraField()
+    orientation = _ExtraField()
+    luminance = _ExtraField()
+    colorfulness = _ExtraField()
+    palette = _ExtraField()
+    
+    def __init__(self, path: str, relative_path: str, file_hash: Optional[str],
+                 display_name: str = None, sample_hash: Optional[str] = None,
+                 hash_algo: Optional[str] = None):
+        self._partial = False  # 为 True 时非核心字段尚未加载
+        self._loader: Optional[Callable[[str, 'Picture'], None]] = None
+        self._set_paths(path, relative_path)
+        self.hash = file_hash or None  # 完整内容哈希，可能延迟到后台校验时计算
+        self.hash_algo = hash_algo or ("md5" if file_hash else None)
+        self.sample_hash = sample_hash  # 快速采样哈希，用于初筛
+        self.phash = None  # 感知哈希（dHash），用于查找相似图片
+        self.display_name = display_name
         self.crop_region = None
-        self.cache_path = None
-        self.view_pic = None  # base64缩略图
+        self.cache_path = None  # 渲染缓存的键（旧索引中为缓存目录下的文件名）
+        self.thumb_ref = None  # 缩略图在缩略图包中的 [偏移, 长度]
         self.excluded = False
-        self.last_accessed = datetime.datetime.now().isoformat()
-        self.added_date = datetime.datetime.now().isoformat()
+        now = time.time()
+        self.last_accessed = now
+        self.added_date = now
+        # 文件状态，用于重建索引时跳过未变化文件的哈希计算
+        self.file_size = None
+        self.mtime_ns = None
+        self.inode = None
+        self.device = None
+        # 图片信息，只解析文件头得到，判断尺寸时不需要解码整张图片
+        self.width = None
+        self.height = None
+        self.image_format = None
+        self.color_mode = None
+        self.orientation = None
+        # 颜色特征：平均亮度、色彩丰富度和主色（rrggbbww 十六进制）
+        self.luminance = None
+        self.colorfulness = None
+        self.palette = None
         self._modified = False
+        # 修改回调，由索引设置为共享的 listener(key, picture)
+        self._key: Optional[str] = None
+        self._listener: Optional[Callable[[str, 'Picture'], None]] = None
+    
+    def _set_paths(self, path: str, relative_path: str) -> None:
+        """拆分路径，同一目录下的图片共用驻留的目录字符串
+        
+        相对路径通常是相对目录加上文件名，只保存目录；文件名与 path 不同（子目录作为根、
+        文件被重命名）时原样保存整个相对路径。没有相对路径时由文件名得出。
+        """
+        directory, self._name = os.path.split(path)
+        self._dir = sys.intern(directory)
+        rel_dir = os.path.dirname(relative_path) if relative_path else ""
+        self._rel_dir = sys.intern(rel_dir)
+        derived = os.path.join(rel_dir, self._name) if rel_dir else self._name
+        self._rel_path = relative_path if relative_path and relative_path != derived else None
+    
+    @property
+    def path(self) -> str:
+        return os.path.join(self._dir, self._name) if self._dir else self._name
+    
+    @property
+    def relative_path(self) -> str:
+        if self._rel_path is not None:
+            return self._rel_path
+        return os.path.join(self._rel_dir, self._name) if self._rel_dir else self._name
+    
+    @property
+    def display_name(self) -> str:
+        return self._display_name or self._name
+    
+    @display_name.setter
+    def display_name(self, value: Optional[str]) -> None:
+        self._display_name = value if value and value != self._name else None
+    
+    def ensure_loaded(self) -> None:
+        """确保非核心字段已加载"""
+        if self._partial and self._loader:
+            self._loader(self._key, self)
+    
+    def load_extra(self, data: Dict[str, Any]) -> None:
+        """填充延迟加载的字段（不标记修改）
+        
+        直接写入内部字段，全部写完后才清除 _partial：其他线程在此期间读写这些字段时
+        会进入加载回调等待，不会先写入再被这里覆盖。
+        """
+        for field in self.EXTRA_FIELDS:
+            if field != "hash_algo":
+                setattr(self, "_" + field, data.get(field))
+        if data.get("hash_algo"):
+            self._hash_algo = data["hash_algo"]
+        self._partial = False
     
     @classmethod
-    def from_dict(cls, data: Dict[str, Any]) -> 'Picture':
-        """从字典创建Picture对象"""
+    def from_dict(cls, data: Dict[str, Any], partial: bool = False) -> 'Picture':
+        """从字典创建Picture对象
+        
+        partial 为 True 时 data 只含核心字段，其余字段稍后通过 load_extra 填充。
+        """
         pic = cls(
             path=data.get("path", ""),
             relative_path=data.get("relative_path", ""),
-            file_hash=data.get("hash", ""),
-            display_name=data.get("display_name", "")
+            file_hash=data.get("hash"),
+            display_name=data.get("display_name", ""),
+            sample_hash=data.get("sample_hash"),
+            # 旧索引没有记录算法，其哈希均为MD5
+            hash_algo=data.get("hash_algo")
         )
-        pic.crop_region = data.get("crop_region")
-        pic.cache_path = data.get("cache_path")
-        pic.view_pic = data.get("view_pic")
         pic.excluded = data.get("excluded", False)
-        pic.last_accessed = data.get("last_accessed", pic.last_accessed)
-        pic.added_date = data.get("added_date", pic.added_date)
+        pic.last_accessed = parse_timestamp(data.get("last_accessed"), pic.last_accessed)
+        pic.added_date = parse_timestamp(data.get("added_date"), pic.added_date)
+        if partial:
+            pic._partial = True
+        else:
+            pic.load_extra(data)
         pic._modified = False
         return pic
     
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典"""
+        self.ensure_loaded()
         return {
             "path": self.path,
             "relative_path": self.relative_path, 
             "hash": self.hash,
+            "hash_algo": self.hash_algo,
+            "sample_hash": self.sample_hash,
+            "phash": self.phash,
             "display_name": self.display_name,
             "crop_region": self.crop_region,
             "cache_path": self.cache_path,
-            "view_pic": self.view_pic,
+            "thumb_ref": self.thumb_ref,
             "excluded": self.excluded,
             "last_accessed": self.last_accessed,
-            "added_date": self.added_date
+            "added_date": self.added_date,
+            "file_size": self.file_size,
+            "mtime_ns": self.mtime_ns,
+            "inode": self.inode,
+            "device": self.device,
+            "width": self.width,
+            "height": self.height,
+            "image_format": self.image_format,
+            "color_mode": self.color_mode,
+            "orientation": self.orientation,
+            "luminance": self.luminance,
+            "colorfulness": self.colorfulness,
+            "palette": self.palette
         }
     
     def update_path(self, new_path: str, new_relative_path: str) -> None:
         """更新路径"""
-        self.path = new_path
-        self.relative_path = new_relative_path
-        self._modified = True
+        self._set_paths(new_path, new_relative_path)
+        self._notify()
+    
+    @property
+    def fingerprint(self) -> Optional[str]:
+        """内容标识：优先使用完整哈希，尚未计算时使用采样哈希"""
+        return self.hash or self.sample_hash
+    
+    def set_fingerprint(self, sample_hash: Optional[str] = None,
+                        file_hash: Optional[str] = None, hash_algo: Optional[str] = None) -> None:
+        """补充采样哈希或完整哈希"""
+        changed = False
+        if sample_hash and sample_hash != self.sample_hash:
+            self.sample_hash = sample_hash
+            changed = True
+        if file_hash and (file_hash != self.hash or hash_algo != self.hash_algo):
+            self.hash = file_hash
+            self.hash_algo = hash_algo
+            changed = True
+        if changed:
+            self._notify()
+    
+    def set_phash(self, phash: Optional[str]) -> None:
+        """设置感知哈希"""
+        if phash and phash != self.phash:
+            self.phash = phash
+            self._notify()
+    
+    def set_image_info(self, info: Optional[Dict[str, Any]]) -> None:
+        """设置从文件头读取的图片信息"""
+        self._set_fields(self.IMAGE_INFO_FIELDS, info)
+    
+    def set_color_features(self, features: Optional[Dict[str, Any]]) -> None:
+        """设置颜色特征"""
+        self._set_fields(self.COLOR_FIELDS, features)
+    
+    def _set_fields(self, fields: Tuple[str, ...], values: Optional[Dict[str, Any]]) -> None:
+        if not values:
+            return
+        changed = False
+        for field in fields:
+            if values.get(field) != getattr(self, field):
+                setattr(self, field, values.get(field))
+                changed = True
+        if changed:
+            self._notify()
+    
+    @property
+    def display_size(self) -> Optional[Tuple[int, int]]:
+        """按 EXIF 方向旋转后的 (宽, 高)，尚未读取时为 None"""
+        if not self.width or not self.height:
+            return None
+        return display_size(self.width, self.height, self.orientation)
+    
+    @property
+    def aspect_ratio(self) -> Optional[float]:
+        """显示宽高比"""
+        size = self.display_size
+        return size[0] / size[1] if size else None
+    
+    def stat_matches(self, st: os.stat_result) -> bool:
+        """文件状态是否与记录一致（一致时可信任已存储的哈希）"""
+        return (self.file_size is not None
+                and self.file_size == st.st_size
+                and self.mtime_ns == st.st_mtime_ns
+                and self.inode == st.st_ino
+                and self.device == st.st_dev)
+    
+    def update_stat(self, st: os.stat_result) -> None:
+        """记录文件状态"""
+        if self.stat_matches(st):
+            return
+        self.file_size = st.st_size
+        self.mtime_ns = st.st_mtime_ns
+        self.inode = st.st_ino
+        self.device = st.st_dev
+        self._notify()
     
     def update_crop(self, crop_region: Dict[str, float], cache_path: str = None) -> None:
         """更新裁剪区域"""
         self.crop_region = crop_region
         if cache_path:
             self.cache_path = cache_path
-        self._modified = True
+        self._notify()
     
-    def set_thumbnail(self, thumbnail: str) -> None:
-        """设置缩略图"""
-        self.view_pic = thumbnail
-        self._modified = True
+    def set_thumbnail(self, thumb_ref: Tuple[int, int]) -> None:
+        """设置缩略图位置"""
+        self.thumb_ref = list(thumb_ref)
+        self._notify()
     
     def clear_thumbnail(self) -> None:
         """清除缩略图"""
-        self.view_pic = None
-        self._modified = True
+        self.thumb_ref = None
+        self._notify()
     
     def set_excluded(self, excluded: bool) -> None:
         """设置排除状态"""
         self.excluded = excluded
-        self._modified = True
+        self._notify()
     
-    def update_access_time(self) -> None:
+    def update_access_time(self, timestamp: Optional[float] = None) -> None:
         """更新访问时间"""
-        self.last_accessed = datetime.datetime.now().isoformat()
+        self.last_accessed = timestamp or time.time()
+        self._notify()
+    
+    def _notify(self) -> None:
+        """标记修改并通知所属索引"""
         self._modified = True
+        if self._listener:
+            self._listener(self._key, self)
     
     def is_modified(self) -> bool:
         """是否被修改过"""
@@ -0,0 +1,294 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+from .settings import wallpaperCfg
+
+RENDER_DIR = "renders"  # 缓存目录下存放渲染结果的子目录
+MANIFEST_FILE = "manifest.json"
+TEMP_DIR = "tmp"
+EVICT_BATCH = 32  # 后台淘汰时每次持锁删除的最多条目数
+
+
+def render_key(source_hash: str, crop: Optional[Tuple[int, int, int, int]],
+               target: Tuple[int, int], upscale: Optional[Tuple[str, int]], output_format: str) -> str:
+    """渲染结果的内容地址：由源图内容哈希和全部渲染参数决定，与文件名和所在目录无关"""
+    params = [source_hash, list(crop) if crop else None, list(target),
+              list(upscale) if upscale else None, output_format.lower()]
+    return hashlib.sha1(json.dumps(params).encode("utf-8")).hexdigest()
+
+
+class RenderCache:
+    """内容寻址的渲染缓存（裁剪、缩放、超分后的壁纸）
+
+    结果按键的前两级十六进制分目录存放（renders/ab/cd/<键>.<扩展名>），
+    清单文件记录每个键的文件、大小、源图哈希、渲染参数和使用时间。
+    相同的渲染请求直接返回已有文件；不同目录中的同名图片不会相互覆盖。
+
+    条目按最近使用顺序排列，总大小超过预算时由后台线程从最久未使用的一端分批淘汰，
+    固定的条目（当前壁纸）不会被淘汰。被淘汰的渲染在下次设置该壁纸时按索引中的裁剪区域重新生成。
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: Optional[int] = None,
+                 check_interval: float = 60.0):
+        self._cache_dir = cache_dir
+        self._max_bytes = max_bytes
+        self.check_interval = check_interval
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()  # 从最久未使用到最近使用
+        self._size = 0
+        self._pinned: Set[str] = set()
+        self._dirty = False  # 使用时间有未保存的变化
+        self._loaded_root: Optional[str] = None
+        self._lock = threading.RLock()
+        self.metrics: Dict[str, int] = {"hits": 0, "misses": 0, "evictions": 0, "evicted_bytes": 0}
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @property
+    def root(self) -> str:
+        return os.path.join(self._cache_dir or wallpaperCfg.cacheDir.value, RENDER_DIR)
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.root, MANIFEST_FILE)
+
+    @property
+    def max_bytes(self) -> int:
+        """字节预算，未指定时读取设置（MB）"""
+        if self._max_bytes is not None:
+            return self._max_bytes
+        return wallpaperCfg.renderCacheLimit.value * 1024 * 1024
+
+    def _load(self) -> None:
+        """加载清单（缓存目录变化后重新加载）"""
+        root = self.root
+        if self._loaded_root == root:
+            return
+        self._loaded_root = root
+        self._entries = OrderedDict()
+        self._dirty = False
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                entries = json.load(f).get("entries", {})
+            # 旧清单不保证顺序，按使用时间重新排列
+            self._entries = OrderedDict(sorted(entries.items(), key=lambda item: item[1].get("last_used", 0)))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"读取渲染缓存清单失败: {e}")
+        self._size = sum(entry.get("size", 0) for entry in self._entries.values())
+
+    def save(self) -> bool:
+        """原子写入清单"""
+        with self._lock:
+            self._load()
+            try:
+                os.makedirs(self.root, exist_ok=True)
+                temp_file = f"{self.manifest_path}.tmp"
+                with open(temp_file, 'w', encoding='utf-8') as f:
+                    json.dump({"version": 1, "entries": self._entries}, f, ensure_ascii=False)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp_file, self.manifest_path)
+                self._dirty = False
+                return True
+            except Exception as e:
+                print(f"保存渲染缓存清单失败: {e}")
+                return False
+
+    def path_for(self, key: str, ext: str) -> str:
+        """键对应的缓存文件路径"""
+        return os.path.join(self.root, key[:2], key[2:4], f"{key}{ext.lower()}")
+
+    def temp_path(self, ext: str) -> str:
+        """渲染中间结果的临时文件路径"""
+        temp_dir = os.path.join(self.root, TEMP_DIR)
+        os.makedirs(temp_dir, exist_ok=True)
+        return os.path.join(temp_dir, f"{uuid.uuid4().hex}{ext.lower()}")
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            self._load()
+            return key in self._entries
+
+    def get(self, key: Optional[str]) -> Optional[str]:
+        """已缓存的渲染结果路径，不存在时返回 None"""
+        if not key:
+            return None
+        with self._lock:
+            self._load()
+            entry = self._entries.get(key)
+            if not entry:
+                self.metrics["misses"] += 1
+                return None
+            path = os.path.join(self.root, entry["file"])
+            if not os.path.exists(path):
+                # 文件被外部删除
+                self._drop(key)
+                self.save()
+                self.metrics["misses"] += 1
+                return None
+            entry["last_used"] = time.time()
+            self._entries.move_to_end(key)
+            self._dirty = True
+            self.metrics["hits"] += 1
+            return path
+
+    def put(self, key: str, rendered_path: str, source_hash: Optional[str] = None,
+            params: Optional[Dict[str, Any]] = None) -> str:
+        """把渲染好的文件移入缓存，返回缓存路径"""
+        ext = os.path.splitext(rendered_path)[1]
+        path = self.path_for(key, ext)
+        with self._lock:
+            self._load()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(rendered_path, path)
+            now = time.time()
+            self._drop(key)
+            size = os.path.getsize(path)
+            self._entries[key] = {
+                "file": os.path.relpath(path, self.root),
+                "size": size,
+                "source": source_hash,
+                "params": params or {},
+                "created": now,
+                "last_used": now,
+            }
+            self._size += size
+            self.save()
+            over_budget = self._size > self.max_bytes
+        if over_budget:
+            self._wake.set()
+        return path
+
+    def _drop(self, key: str) -> Optional[Dict[str, Any]]:
+        """从清单中移除条目并更新总大小（需持有锁）"""
+        entry = self._entries.pop(key, None)
+        if entry:
+            self._size -= entry.get("size", 0)
+        return entry
+
+    def _delete_file(self, entry: Dict[str, Any]) -> None:
+        try:
+            os.remove(os.path.join(self.root, entry["file"]))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"删除渲染缓存失败: {entry['file']}, 错误: {e}")
+
+    def remove(self, key: str) -> bool:
+        """删除一个渲染结果"""
+        with self._lock:
+            self._load()
+            entry = self._drop(key)
+            if not entry:
+                return False
+            self._delete_file(entry)
+            return True
+
+    def pin(self, key: str) -> None:
+        """固定条目，不参与淘汰"""
+        with self._lock:
+            self._pinned.add(key)
+
+    def unpin(self, key: str) -> None:
+        with self._lock:
+            self._pinned.discard(key)
+
+    def evict(self, max_bytes: Optional[int] = None, batch: Optional[int] = None) -> int:
+        """从最久未使用的一端淘汰未固定的条目，直到总大小不超过预算
+
+        batch 限制本次最多淘汰的条目数，返回淘汰的条目数量。
+        """
+        budget = self.max_bytes if max_bytes is None else max_bytes
+        evicted = 0
+        with self._lock:
+            self._load()
+            if self._size <= budget:
+                return 0
+            for key in list(self._entries):
+                if self._size <= budget or (batch is not None and evicted >= batch):
+                    break
+                if key in self._pinned:
+                    continue
+                entry = self._drop(key)
+                self._delete_file(entry)
+                self.metrics["evictions"] += 1
+                self.metrics["evicted_bytes"] += entry.get("size", 0)
+                evicted += 1
+            if evicted:
+                self.save()
+        return evicted
+
+    def request_eviction(self) -> None:
+        """唤醒后台线程检查预算（例如预算被调小后）"""
+        self._wake.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.check_interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                # 分批淘汰，每批之间释放锁，不阻塞前台的读取和写入
+                while self.evict(batch=EVICT_BATCH) == EVICT_BATCH and not self._stop.is_set():
+                    pass
+                with self._lock:
+                    if self._dirty:
+                        self.save()
+            except Exception as e:
+                print(f"淘汰渲染缓存失败: {e}")
+
+    def stop(self) -> None:
+        """停止后台线程并保存使用时间"""
+        self._stop.set()
+        self._wake.set()
+        with self._lock:
+            if self._dirty:
+                self.save()
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计：条目数、总大小、预算、命中和未命中次数等"""
+        with self._lock:
+            self._load()
+            lookups = self.metrics["hits"] + self.metrics["misses"]
+            return {
+                "entries": len(self._entries),
+                "size": self._size,
+                "max_bytes": self.max_bytes,
+                "pinned": len(self._pinned & self._entries.keys()),
+                "hit_rate": self.metrics["hits"] / lookups if lookups else 0.0,
+                **self.metrics,
+            }
+
+    def cleanup(self, valid_keys: Iterable[str]) -> int:
+        """删除没有被任何图片引用的渲染结果、清单之外的文件和残留的临时文件，返回删除的文件数量"""
+        valid_keys = set(valid_keys) | self._pinned
+        deleted = 0
+        with self._lock:
+            self._load()
+            for key in [key for key in self._entries if key not in valid_keys]:
+                if self.remove(key):
+                    deleted += 1
+            known = {os.path.normcase(entry["file"]) for entry in self._entries.values()}
+            known.add(os.path.normcase(MANIFEST_FILE))
+            for dirpath, _, files in os.walk(self.root):
+                for file in files:
+                    path = os.path.join(dirpath, file)
+                    if os.path.normcase(os.path.relpath(path, self.root)) in known:
+                        continue
+                    try:
+                        os.remove(path)
+                        deleted += 1
+                    except Exception as e:
+                        print(f"删除缓存文件失败: {file}, 错误: {e}")
+            self.save()
+        return deleted
@@ -0,0 +1,160 @@
+import time
+import threading
+from typing import Any, Dict, Optional, Set
+
+
+class IndexSnapshot:
+    """一次保存的数据快照（在修改索引的线程上生成，写入可在其他线程进行）"""
+
+    __slots__ = ("upserts", "deletes", "meta", "full")
+
+    def __init__(self, upserts: Optional[Dict[str, Dict[str, Any]]] = None,
+                 deletes: Optional[Set[str]] = None, meta: Optional[Dict[str, Any]] = None,
+                 full: Optional[Dict[str, Any]] = None):
+        self.upserts = upserts or {}
+        self.deletes = deletes or set()
+        self.meta = meta or {}
+        self.full = full  # 不支持增量写入的存储使用完整数据
+
+    def merge(self, newer: 'IndexSnapshot') -> None:
+        """合并更新的快照，同一键以较新的为准"""
+        if newer.full is not None:
+            self.full = newer.full
+            self.upserts, self.deletes = {}, set()
+        elif self.full is not None:
+            wallpapers = self.full.setdefault("wallpapers", {})
+            wallpapers.update(newer.upserts)
+            for key in newer.deletes:
+                wallpapers.pop(key, None)
+            self.full.update(newer.meta)
+        else:
+            for key in newer.deletes:
+                self.upserts.pop(key, None)
+            self.deletes -= newer.upserts.keys()
+            self.upserts.update(newer.upserts)
+            self.deletes |= newer.deletes
+        self.meta.update(newer.meta)
+
+    def __len__(self) -> int:
+        if self.full is not None:
+            return len(self.full.get("wallpapers", {}))
+        return len(self.upserts) + len(self.deletes)
+
+
+class SaveScheduler:
+    """索引保存调度器
+
+    request() 在调用线程上取出变化的快照并合并到待写入数据，
+    后台线程在静默期（quiet）内没有新请求、或距第一次请求超过 max_delay 时写入一次。
+    flush() 在调用线程上立即写入全部待保存数据，所有写入按快照顺序串行进行。
+    """
+
+    def __init__(self, index, quiet: float = 2.0, max_delay: float = 30.0):
+        self.index = index
+        self.quiet = quiet
+        self.max_delay = max_delay
+        self._pending: Optional[IndexSnapshot] = None
+        self._first_request = 0.0
+        self._last_request = 0.0
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._stopped = False
+        self.metrics: Dict[str, float] = {
+            "saves": 0, "failures": 0, "rows": 0,
+            "last_ms": 0.0, "max_ms": 0.0, "total_ms": 0.0
+        }
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _collect(self) -> None:
+        """取出索引的变化并合并到待写入数据（需持有 _cond）"""
+        snapshot = self.index.take_snapshot()
+        if snapshot is None:
+            return
+        if self._pending is None:
+            self._pending = snapshot
+        else:
+            self._pending.merge(snapshot)
+
+    def request(self) -> None:
+        """请求保存，短时间内的多次请求合并为一次写入"""
+        with self._cond:
+            self._collect()
+            if self._pending is None:
+                return
+            now = time.monotonic()
+            if not self._first_request:
+                self._first_request = now
+            self._last_request = now
+            self._cond.notify()
+
+    def flush(self) -> bool:
+        """立即写入全部待保存数据"""
+        with self._write_lock:
+            with self._cond:
+                self._collect()
+                snapshot = self._take()
+            return self._write(snapshot)
+
+    def _take(self) -> Optional[IndexSnapshot]:
+        snapshot, self._pending = self._pending, None
+        self._first_request = self._last_request = 0.0
+        return snapshot
+
+    def _write(self, snapshot: Optional[IndexSnapshot]) -> bool:
+        if snapshot is None:
+            return True
+        start = time.perf_counter()
+        success = self.index.write_snapshot(snapshot)
+        elapsed = (time.perf_counter() - start) * 1000
+        if not success:
+            # 写入失败，放回待写入数据，之后的修改以较新的为准
+            with self._cond:
+                if self._pending is not None:
+                    snapshot.merge(self._pending)
+                self._pending = snapshot
+                self._first_request = self._last_request = time.monotonic()
+                self.metrics["failures"] += 1
+                self._cond.notify()
+            return False
+        self.metrics["saves"] += 1
+        self.metrics["rows"] += len(snapshot)
+        self.metrics["last_ms"] = elapsed
+        self.metrics["max_ms"] = max(self.metrics["max_ms"], elapsed)
+        self.metrics["total_ms"] += elapsed
+        return True
+
+    def stats(self) -> Dict[str, float]:
+        """保存耗时统计"""
+        stats = dict(self.metrics)
+        stats["avg_ms"] = stats["total_ms"] / stats["saves"] if stats["saves"] else 0.0
+        return stats
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._stopped:
+                    if self._pending is None:
+                        self._cond.wait()
+                        continue
+                    now = time.monotonic()
+                    due = min(self._last_request + self.quiet, self._first_request + self.max_delay)
+                    if now >= due:
+                        break
+                    self._cond.wait(due - now)
+                if self._stopped:
+                    return
+
+            with self._write_lock:
+                with self._cond:
+                    snapshot = self._take()
+                # 写入失败时数据会放回，静默期后重试
+                self._write(snapshot)
+
+    def stop(self) -> bool:
+        """停止后台线程，并写入剩余数据"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self._thread.join(timeout=5)
+        return self.flush()
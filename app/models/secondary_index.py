@@ -0,0 +1,300 @@
+import heapq
+import threading
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from .picture import Picture
+from .trigram_index import TrigramIndex
+from .similarity_index import HammingIndex, MAX_RADIUS
+from .color_index import ColorIndex
+
+
+class SortedIndex:
+    """按排序值维护的有序键列表
+
+    rebuild 只记录数据源，首次查询时才排序，未使用的排序顺序不占启动时间。
+    修改先记录下来，查询时再应用：少量修改通过二分查找逐个插入和删除，
+    超过 MERGE_THRESHOLD 个时（构建或缩略图批量写入）把排好序的修改与原列表一次合并，
+    避免逐个插入的 O(n²)。
+    """
+
+    MERGE_THRESHOLD = 64
+
+    def __init__(self, sort_value: Callable[[Picture], Any]):
+        self.sort_value = sort_value
+        self._items: List[Tuple[Any, str]] = []
+        self._keys: List[str] = []  # 与 _items 同序的键列表，查询时直接复制
+        self._values: Dict[str, Any] = {}  # 键 -> 当前排序值，用于定位旧条目
+        self._source: Optional[Dict[str, Picture]] = None  # 待排序的数据源
+        self._pending: Dict[str, Optional[Picture]] = {}  # 尚未应用的修改，None 表示删除
+
+    def rebuild(self, pictures: Dict[str, Picture]) -> None:
+        self._source = pictures
+        self._items, self._keys, self._values = [], [], {}
+        self._pending = {}
+
+    def _build(self) -> None:
+        if self._source is None:
+            self._apply_pending()
+            return
+        pictures, self._source = self._source, None
+        self._values = {key: self.sort_value(pic) for key, pic in pictures.items()}
+        self._items = sorted((value, key) for key, value in self._values.items())
+        self._keys = [key for _, key in self._items]
+
+    def update(self, key: str, picture: Picture) -> None:
+        if self._source is not None:
+            return  # 尚未排序，首次查询时会读取最新数据
+        self._pending[key] = picture
+
+    def remove(self, key: str) -> None:
+        if self._source is None:
+            self._pending[key] = None
+
+    def _apply_pending(self) -> None:
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        new_values = {key: self.sort_value(pic) for key, pic in pending.items() if pic is not None}
+        changed = [key for key in pending
+                   if (key in new_values) != (key in self._values)
+                   or (key in new_values and new_values[key] != self._values[key])]
+        if len(changed) <= self.MERGE_THRESHOLD:
+            for key in changed:
+                self._remove_item(key)
+                if key in new_values:
+                    self._insert_item(key, new_values[key])
+            return
+        dropped = set(changed)
+        kept = [item for item in self._items if item[1] not in dropped]
+        added = sorted((new_values[key], key) for key in changed if key in new_values)
+        self._items = list(heapq.merge(kept, added))
+        self._keys = [key for _, key in self._items]
+        for key in changed:
+            if key in new_values:
+                self._values[key] = new_values[key]
+            else:
+                self._values.pop(key, None)
+
+    def _insert_item(self, key: str, value: Any) -> None:
+        i = bisect_left(self._items, (value, key))
+        self._items.insert(i, (value, key))
+        self._keys.insert(i, key)
+        self._values[key] = value
+
+    def _remove_item(self, key: str) -> None:
+        if key not in self._values:
+            return
+        value = self._values.pop(key)
+        i = bisect_left(self._items, (value, key))
+        if i < len(self._items) and self._items[i] == (value, key):
+            del self._items[i]
+            del self._keys[i]
+
+    def keys(self, reverse: bool = False) -> List[str]:
+        self._build()
+        return self._keys[::-1] if reverse else self._keys[:]
+
+
+class PictureIndexes:
+    """IndexManager 的二级索引：哈希 -> 键、排除状态、各排序顺序、名称/路径的三元组搜索、感知哈希和颜色特征
+
+    随图片的添加、删除和修改增量维护，查询不再需要遍历整个索引。
+    """
+
+    # 排序名称 -> 排序值
+    ORDERS: Dict[str, Callable[[Picture], Any]] = {
+        "name": lambda pic: pic.display_name.lower(),
+        "added": lambda pic: pic.added_date,
+        "accessed": lambda pic: pic.last_accessed,
+    }
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._by_hash: Dict[str, Set[str]] = {}
+        self._hash_of: Dict[str, str] = {}
+        # 用 dict 作为有序集合，保持插入顺序
+        self._excluded: Dict[str, None] = {}
+        self._included: Dict[str, None] = {}
+        self._orders = {name: SortedIndex(func) for name, func in self.ORDERS.items()}
+        self._search = TrigramIndex()
+        self._search_source: Optional[Dict[str, Picture]] = None  # 首次搜索时再建立
+        self._similar = HammingIndex(MAX_RADIUS)
+        self._similar_source: Optional[Dict[str, Picture]] = None  # 首次查找相似图片时再建立
+        self._colors = ColorIndex()
+        self._colors_source: Optional[Dict[str, Picture]] = None  # 首次按颜色查询时再建立
+        # 查询结果缓存，任何修改后清空
+        self._cache: Dict[Tuple[str, Optional[bool], bool], List[str]] = {}
+
+    def rebuild(self, pictures: Dict[str, Picture]) -> None:
+        """整体重建（加载索引后调用）"""
+        with self._lock:
+            self._cache.clear()
+            self._by_hash = {}
+            self._hash_of = {}
+            self._excluded = {}
+            self._included = {}
+            self._search.clear()
+            self._search_source = pictures
+            self._similar.clear()
+            self._similar_source = pictures
+            self._colors.clear()
+            self._colors_source = pictures
+            for key, pic in pictures.items():
+                self._index_hash(key, pic)
+                (self._excluded if pic.excluded else self._included)[key] = None
+            for order in self._orders.values():
+                order.rebuild(pictures)
+
+    @staticmethod
+    def _search_text(picture: Picture) -> str:
+        return TrigramIndex.make_text(picture.display_name, picture.relative_path)
+    
+    def _index_hash(self, key: str, picture: Picture) -> None:
+        old_hash = self._hash_of.get(key)
+        if old_hash == picture.hash:
+            return
+        if old_hash:
+            self._unindex_hash(key, old_hash)
+        if picture.hash:
+            self._by_hash.setdefault(picture.hash, set()).add(key)
+            self._hash_of[key] = picture.hash
+
+    def _unindex_hash(self, key: str, file_hash: str) -> None:
+        keys = self._by_hash.get(file_hash)
+        if keys:
+            keys.discard(key)
+            if not keys:
+                del self._by_hash[file_hash]
+        self._hash_of.pop(key, None)
+
+    def update(self, key: str, picture: Picture) -> None:
+        """添加图片或在图片修改后更新"""
+        with self._lock:
+            self._cache.clear()
+            self._index_hash(key, picture)
+            if picture.excluded:
+                self._included.pop(key, None)
+                self._excluded[key] = None
+            else:
+                self._excluded.pop(key, None)
+                self._included[key] = None
+            for order in self._orders.values():
+                order.update(key, picture)
+            if self._search_source is None:
+                self._search.add(key, self._search_text(picture))
+            if self._similar_source is None:
+                self._index_phash(key, picture)
+            if self._colors_source is None:
+                self._index_colors(key, picture)
+
+    def remove(self, key: str) -> None:
+        with self._lock:
+            self._cache.clear()
+            file_hash = self._hash_of.get(key)
+            if file_hash:
+                self._unindex_hash(key, file_hash)
+            self._excluded.pop(key, None)
+            self._included.pop(key, None)
+            for order in self._orders.values():
+                order.remove(key)
+            if self._search_source is None:
+                self._search.remove(key)
+            if self._similar_source is None:
+                self._similar.remove(key)
+            if self._colors_source is None:
+                self._colors.remove(key)
+
+    def keys_by_hash(self, file_hash: str) -> Set[str]:
+        with self._lock:
+            return set(self._by_hash.get(file_hash, ()))
+
+    def keys_by_state(self, excluded: bool) -> List[str]:
+        with self._lock:
+            return list(self._excluded if excluded else self._included)
+
+    def is_excluded(self, key: str) -> bool:
+        return key in self._excluded
+
+    def search(self, query: str) -> Set[str]:
+        """名称或相对路径包含所有查询词的键"""
+        with self._lock:
+            if self._search_source is not None:
+                for key, pic in self._search_source.items():
+                    self._search.add(key, self._search_text(pic))
+                self._search_source = None
+            return self._search.search(query)
+
+    def _index_phash(self, key: str, picture: Picture) -> None:
+        if picture.phash:
+            self._similar.add(key, int(picture.phash, 16))
+        else:
+            self._similar.remove(key)
+
+    def _build_similar(self) -> None:
+        if self._similar_source is not None:
+            for key, pic in self._similar_source.items():
+                self._index_phash(key, pic)
+            self._similar_source = None
+
+    def similar(self, phash: str, radius: int) -> List[Tuple[int, str]]:
+        """感知哈希距离不超过 radius 的 (距离, 键) 列表"""
+        with self._lock:
+            self._build_similar()
+            return self._similar.query(int(phash, 16), min(radius, MAX_RADIUS))
+
+    def phash_items(self) -> List[Tuple[str, int]]:
+        with self._lock:
+            self._build_similar()
+            return self._similar.items()
+
+    def _index_colors(self, key: str, picture: Picture) -> None:
+        if picture.palette:
+            self._colors.add(key, picture.luminance, picture.colorfulness, picture.palette)
+        else:
+            self._colors.remove(key)
+
+    def _build_colors(self) -> None:
+        if self._colors_source is not None:
+            self._colors.add_many((key, (pic.luminance, pic.colorfulness, pic.palette))
+                                  for key, pic in self._colors_source.items() if pic.palette)
+            self._colors_source = None
+
+    def _other_state(self, excluded: Optional[bool]) -> Dict[str, None]:
+        """excluded 为 True/False 时需要去掉的另一种状态的键，None 时不去掉"""
+        if excluded is None:
+            return {}
+        return self._included if excluded else self._excluded
+
+    def by_luminance(self, max_luminance: float, min_luminance: float, limit: Optional[int],
+                     excluded: Optional[bool] = None) -> List[Tuple[float, str]]:
+        with self._lock:
+            self._build_colors()
+            return self._colors.by_luminance(max_luminance, min_luminance, limit, self._other_state(excluded))
+
+    def similar_palette(self, palette: str, limit: Optional[int],
+                        excluded: Optional[bool] = None) -> List[Tuple[float, str]]:
+        with self._lock:
+            self._build_colors()
+            return self._colors.similar_palette(palette, limit, self._other_state(excluded))
+
+    def nearest_color(self, rgb: Tuple[int, int, int], limit: Optional[int],
+                      excluded: Optional[bool] = None) -> List[Tuple[float, str]]:
+        with self._lock:
+            self._build_colors()
+            return self._colors.nearest_color(rgb, limit, self._other_state(excluded))
+
+    def sorted_keys(self, order: str, excluded: Optional[bool] = None,
+                    reverse: bool = False) -> List[str]:
+        """按排序名称返回键列表，excluded 为 None 时包含全部"""
+        with self._lock:
+            cache_key = (order, excluded, reverse)
+            keys = self._cache.get(cache_key)
+            if keys is None:
+                keys = self._orders[order].keys(reverse)
+                if excluded is True:
+                    keys = [key for key in keys if key in self._excluded]
+                elif excluded is False and self._excluded:
+                    keys = [key for key in keys if key not in self._excluded]
+                self._cache[cache_key] = keys
+            return list(keys)
@@ -1,6 +1,7 @@
 # 导入QFluentWidgets组件
 from qfluentwidgets import (ConfigItem, QConfig, OptionsConfigItem, OptionsValidator, 
-                          BoolValidator, FolderValidator, Theme, EnumSerializer)
+                          BoolValidator, FolderValidator, FolderListValidator, Theme, EnumSerializer,
+                          RangeConfigItem, RangeValidator)
 import os
 from pathlib import Path
 from ..config import *
@@ -23,9 +24,38 @@ class WallpaperConfig(QConfig):
     )
     # 目录设置
     wallpaperDir = ConfigItem("Directories", "WallpaperDir", WALLPAPER_DIR, FolderValidator())
+    extraWallpaperDirs = ConfigItem("Directories", "ExtraWallpaperDirs", [], FolderListValidator())
     cacheDir = ConfigItem("Directories", "CacheDir", CACHE_DIR, FolderValidator())
     toolsDir = ConfigItem("Directories", "ToolsDir", TOOLS_DIR, FolderValidator())
     indexFile = ConfigItem("Directories", "IndexFile", INDEX_FILE, None)
+    indexDbFile = ConfigItem("Directories", "IndexDbFile", INDEX_DB_FILE, None)
+    indexBinFile = ConfigItem("Directories", "IndexBinFile", INDEX_BIN_FILE, None)
+    indexShardDir = ConfigItem("Directories", "IndexShardDir", INDEX_SHARD_DIR, None)
+    thumbnailPack = ConfigItem("Directories", "ThumbnailPack", THUMBNAIL_PACK_FILE, None)
+
+    # 索引设置
+    indexBackend = OptionsConfigItem(
+        "Index", "Backend", "sqlite",
+        OptionsValidator(["json", "sqlite", "binary"])
+    )
+    hashAlgorithm = OptionsConfigItem(
+        "Index", "HashAlgorithm", "md5",
+        OptionsValidator(["md5", "blake2b", "sha256"])
+    )
+    hashWorkers = RangeConfigItem(
+        "Index", "HashWorkers", min(8, os.cpu_count() or 4),
+        RangeValidator(1, 32)
+    )
+    thumbnailWorkers = RangeConfigItem(
+        "Index", "ThumbnailWorkers", DEFAULT_THUMBNAIL_WORKERS,
+        RangeValidator(1, 32)
+    )
+
+    # 缓存设置
+    renderCacheLimit = RangeConfigItem(
+        "Cache", "RenderCacheLimitMB", DEFAULT_RENDER_CACHE_MB,
+        RangeValidator(128, 32768)
+    )
 
     # 显示设置
     notifications = ConfigItem("Display", "ShowNotifications", True, BoolValidator())
@@ -0,0 +1,158 @@
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+HASH_BITS = 64
+DEFAULT_RADIUS = 6  # 视为相似图片的最大汉明距离
+MAX_RADIUS = 10  # 图片索引支持的最大查询距离
+
+# 每个字节中 1 的个数，用于没有 np.bitwise_count 的旧版 NumPy
+_BYTE_BITS = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _popcount(values: np.ndarray) -> np.ndarray:
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    return _BYTE_BITS[values.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+def _segments(parts: int) -> List[Tuple[int, int]]:
+    """把 64 位分成 parts 段，返回每段的 (位移, 掩码)"""
+    parts = max(1, min(parts, HASH_BITS))
+    base, extra = divmod(HASH_BITS, parts)
+    segments, shift = [], 0
+    for i in range(parts):
+        width = base + (1 if i < extra else 0)
+        segments.append((shift, (1 << width) - 1))
+        shift += width
+    return segments
+
+
+def cluster_hashes(keys: Sequence[str], values: Sequence[int],
+                   radius: int = DEFAULT_RADIUS) -> List[List[str]]:
+    """按汉明距离聚类：距离不超过 radius 的哈希连通为一组，只返回多于一个成员的组
+
+    每组内按键排序，组按大小降序排列。
+
+    多索引哈希：把哈希分成 radius + 1 段，距离不超过 radius 的两个哈希至少有一段完全相同，
+    因此只需比较某一段相同的候选对。每段排序后相同值相邻，候选对的生成和距离计算都用 NumPy 批量完成，
+    连通分量用并查集的挂接 + 路径压缩迭代求出，整体不需要 O(n²) 的两两比较。
+    """
+    if len(keys) < 2:
+        return []
+    hashes = np.asarray(values, dtype=np.uint64)
+    unique, inverse = np.unique(hashes, return_inverse=True)
+    count = len(unique)
+
+    # 收集距离不超过 radius 的不同哈希对（相同哈希已由 unique 合并）
+    left, right = [], []
+    for shift, mask in _segments(radius + 1):
+        segment = (unique >> np.uint64(shift)) & np.uint64(mask)
+        order = np.argsort(segment, kind="stable")
+        ordered = segment[order]
+        # active 为排序后与其后第 step 个元素段值相同的位置，逐步增大 step 直到没有
+        active = np.arange(count - 1)
+        step = 1
+        while active.size:
+            active = active[active + step < count]
+            active = active[ordered[active] == ordered[active + step]]
+            if not active.size:
+                break
+            a, b = order[active], order[active + step]
+            close = _popcount(unique[a] ^ unique[b]) <= radius
+            left.append(a[close])
+            right.append(b[close])
+            step += 1
+
+    labels = np.arange(count)
+    if left:
+        a, b = np.concatenate(left), np.concatenate(right)
+        while True:
+            # 挂接：把每对的根指向较小的根，再压缩路径直到每个节点直接指向根
+            root_a, root_b = labels[a], labels[b]
+            if np.array_equal(root_a, root_b):
+                break
+            low = np.minimum(root_a, root_b)
+            np.minimum.at(labels, root_a, low)
+            np.minimum.at(labels, root_b, low)
+            while True:
+                compressed = labels[labels]
+                if np.array_equal(compressed, labels):
+                    break
+                labels = compressed
+
+    components = labels[inverse]
+    order = np.argsort(components, kind="stable")
+    boundaries = np.flatnonzero(np.diff(components[order])) + 1
+    groups = [sorted(keys[i] for i in group) for group in np.split(order, boundaries) if len(group) > 1]
+    groups.sort(key=lambda group: (-len(group), group[0]))
+    return groups
+
+
+class HammingIndex:
+    """64 位感知哈希的多索引哈希表，支持按汉明距离查询
+
+    哈希分成 radius + 1 段，每段一个哈希表（段值 -> 键集合）；
+    查询时只比较至少一段相同的候选，结果与逐个比较完全一致。
+    """
+
+    def __init__(self, radius: int = DEFAULT_RADIUS):
+        self.radius = radius
+        self._segments = _segments(radius + 1)
+        self._tables: List[Dict[int, Set[str]]] = [{} for _ in self._segments]
+        self._values: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def clear(self) -> None:
+        self._tables = [{} for _ in self._segments]
+        self._values = {}
+
+    def add(self, key: str, value: int) -> None:
+        """添加或更新键的哈希"""
+        old = self._values.get(key)
+        if old == value:
+            return
+        if old is not None:
+            self.remove(key)
+        self._values[key] = value
+        for (shift, mask), table in zip(self._segments, self._tables):
+            table.setdefault((value >> shift) & mask, set()).add(key)
+
+    def remove(self, key: str) -> None:
+        value = self._values.pop(key, None)
+        if value is None:
+            return
+        for (shift, mask), table in zip(self._segments, self._tables):
+            segment = (value >> shift) & mask
+            keys = table.get(segment)
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    del table[segment]
+
+    def query(self, value: int, radius: Optional[int] = None) -> List[Tuple[int, str]]:
+        """距离不超过 radius 的 (距离, 键) 列表，按距离排序"""
+        radius = self.radius if radius is None else radius
+        if radius > self.radius:
+            raise ValueError(f"查询半径不能超过索引半径 {self.radius}")
+        candidates: Set[str] = set()
+        for (shift, mask), table in zip(self._segments, self._tables):
+            candidates.update(table.get((value >> shift) & mask, ()))
+        result = []
+        for key in candidates:
+            distance = bin(self._values[key] ^ value).count("1")
+            if distance <= radius:
+                result.append((distance, key))
+        result.sort()
+        return result
+
+    def items(self) -> List[Tuple[str, int]]:
+        return list(self._values.items())
+
+    def groups(self, radius: Optional[int] = None) -> List[List[str]]:
+        """相似图片分组"""
+        keys = list(self._values)
+        return cluster_hashes(keys, [self._values[key] for key in keys],
+                              self.radius if radius is None else radius)
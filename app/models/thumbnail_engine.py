@@ -0,0 +1,221 @@
+import os
+import queue
+import threading
+import multiprocessing
+from functools import partial
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.utils.thumbnail import THUMBNAIL_SIZE, create_thumbnails
+
+ThumbnailTask = Tuple[str, str, Optional[bytes]]  # (键, 原图路径, 已有缩略图JPEG字节)
+ThumbnailResult = Tuple[str, str, Optional[bytes], Optional[Dict[str, Any]]]  # (键, 原图路径, JPEG字节, 颜色特征)
+
+_DONE = object()  # 队列结束标记
+
+
+class ThumbnailEngine:
+    """多进程缩略图生成
+
+    大图的解码和缩放是 CPU 密集的计算，多线程会争用 GIL，因此放到进程池中进行。
+    调用线程用 submit() 陆续提交任务，分发线程把任务按 chunk_size 分组送入进程池，
+    进行中的组数有上限；工作进程只返回编码好的 JPEG 字节和颜色特征，
+    结果经队列交回调用线程，由调用线程（索引的所有者）分批写入缩略图包和索引。
+    close() 之后所有结果交出时 finished 为 True。
+    """
+
+    def __init__(self, workers: Optional[int] = None, chunk_size: int = 8,
+                 max_size: Tuple[int, int] = THUMBNAIL_SIZE, processes: bool = True):
+        """
+        Args:
+            workers: 工作进程数，默认为 CPU 核数
+            chunk_size: 每次发给工作进程的最多图片数
+            max_size: 缩略图最大尺寸
+            processes: 为 False 时用线程池（基准测试对比用）
+        """
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.chunk_size = max(1, chunk_size)
+        self.max_size = max_size
+        self.processes = processes
+        self.submitted = 0  # 已提交的任务数
+        self._processed = 0
+        self._capacity = self.workers * 2  # 进行中的组数上限，每个工作进程多排队一组
+        self._slots = threading.Semaphore(self._capacity)
+        self._tasks: queue.Queue = queue.Queue()
+        self._results: queue.Queue = queue.Queue()
+        self._stop = threading.Event()
+        self._running = threading.Event()  # 清除时不再分发新的任务
+        self._running.set()
+        self._executor: Optional[Executor] = None
+        self._feeder: Optional[threading.Thread] = None
+        self._closed = False
+        self._done = False
+
+    def _create_executor(self) -> Executor:
+        if self.processes:
+            try:
+                # spawn：不继承父进程的线程和锁（fork 可能死锁），工作进程只导入 app.utils.thumbnail
+                return ProcessPoolExecutor(max_workers=self.workers,
+                                           mp_context=multiprocessing.get_context("spawn"))
+            except (OSError, NotImplementedError, ImportError) as e:
+                print(f"无法创建进程池，改用线程: {e}")
+        return ThreadPoolExecutor(max_workers=self.workers)
+
+    def start(self) -> None:
+        """创建进程池并启动分发线程"""
+        if self._feeder is not None:
+            return
+        self._executor = self._create_executor()
+        self._feeder = threading.Thread(target=self._feed, daemon=True)
+        self._feeder.start()
+
+    def submit(self, tasks: Iterable[ThumbnailTask]) -> int:
+        """提交任务，返回提交的数量"""
+        if self._closed:
+            return 0
+        count = 0
+        for task in tasks:
+            self._tasks.put(task)
+            count += 1
+        self.submitted += count
+        return count
+
+    def close(self) -> None:
+        """不再提交新的任务，已提交的处理完后结束"""
+        if not self._closed:
+            self._closed = True
+            self._tasks.put(_DONE)
+
+    @property
+    def processed(self) -> int:
+        """已交出的结果数"""
+        return self._processed
+
+    @property
+    def pending(self) -> int:
+        """已提交但还没交出结果的任务数"""
+        return self.submitted - self._processed
+
+    @property
+    def finished(self) -> bool:
+        """所有结果都已交出（或已取消）"""
+        return self._done
+
+    def _wait_running(self) -> bool:
+        """暂停时等待恢复，取消时返回 False"""
+        while not self._running.wait(0.1):
+            if self._stop.is_set():
+                return False
+        return not self._stop.is_set()
+
+    def _next_chunk(self) -> Optional[List[ThumbnailTask]]:
+        """取出下一组任务，已关闭且没有剩余任务或已取消时返回 None"""
+        chunk: List[ThumbnailTask] = []
+        while not chunk:
+            if not self._wait_running():
+                return None
+            try:
+                task = self._tasks.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if task is _DONE:
+                return None
+            chunk.append(task)
+        while len(chunk) < self.chunk_size:
+            try:
+                task = self._tasks.get_nowait()
+            except queue.Empty:
+                break
+            if task is _DONE:
+                self._tasks.put(_DONE)  # 留给下一次取出时结束
+                break
+            chunk.append(task)
+        return chunk
+
+    def _acquire_slot(self) -> bool:
+        """等待进行中的组数低于上限，取消时返回 False"""
+        while self._wait_running():
+            if self._slots.acquire(timeout=0.1):
+                return True
+        return False
+
+    def _feed(self) -> None:
+        """分发线程：把任务分组送入进程池"""
+        try:
+            while True:
+                chunk = self._next_chunk()
+                if chunk is None or not self._acquire_slot():
+                    break
+                items = [(path, thumbnail) for _, path, thumbnail in chunk]
+                try:
+                    future = self._executor.submit(create_thumbnails, items, self.max_size)
+                except Exception as e:
+                    # 进程池已损坏，或取消时已关闭
+                    self._slots.release()
+                    if not self._stop.is_set():
+                        print(f"提交缩略图任务失败: {e}")
+                    break
+                future.add_done_callback(partial(self._on_done, chunk))
+            # 等待进行中的组结束（取消时未开始的组会立即结束）
+            for _ in range(self._capacity):
+                self._slots.acquire()
+        finally:
+            self._results.put(_DONE)
+
+    def _on_done(self, chunk: List[ThumbnailTask], future: Future) -> None:
+        try:
+            if future.cancelled():
+                return
+            try:
+                thumbnails = future.result()
+            except Exception as e:
+                print(f"生成缩略图失败: {e}")
+                thumbnails = [(None, None)] * len(chunk)
+            for (key, path, _), (data, features) in zip(chunk, thumbnails):
+                self._results.put((key, path, data, features))
+        finally:
+            self._slots.release()
+
+    def poll(self, timeout: Optional[float] = None, limit: Optional[int] = None) -> List[ThumbnailResult]:
+        """取出已完成的结果（完成顺序）
+
+        timeout 为 None 时阻塞到至少有一个结果或全部结束，为 0 时只取出已就绪的结果。
+        """
+        ready: List[ThumbnailResult] = []
+        block = timeout is None or timeout > 0
+        while not self._done and (limit is None or len(ready) < limit):
+            try:
+                item = self._results.get(block=block and not ready, timeout=timeout)
+            except queue.Empty:
+                break
+            if item is _DONE:
+                self._done = True
+                self._executor.shutdown(wait=False)
+                break
+            ready.append(item)
+        self._processed += len(ready)
+        return ready
+
+    def pause(self) -> None:
+        self._running.clear()
+
+    def resume(self) -> None:
+        self._running.set()
+
+    def cancel(self) -> None:
+        """停止分发，丢弃尚未开始的任务"""
+        self._stop.set()
+        self._running.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def run(self, tasks: Iterable[ThumbnailTask]) -> Iterator[ThumbnailResult]:
+        """处理一组任务，逐个产出结果"""
+        self.start()
+        self.submit(tasks)
+        self.close()
+        try:
+            while not self.finished:
+                yield from self.poll()
+        finally:
+            self.cancel()
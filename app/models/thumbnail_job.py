@@ -0,0 +1,143 @@
+import time
+from typing import List, Optional
+
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+
+from .thumbnail_engine import ThumbnailEngine
+
+
+class ThumbnailJob(QObject):
+    """后台缩略图生成任务
+
+    缩略图在 ThumbnailEngine 的工作进程中生成，主线程只做两件事：按需把下一批图片
+    整理成任务提交（进程池外排队的任务数不超过 backlog），以及把返回的结果写入
+    缩略图包和索引。两者都由定时器按时间片进行，索引只在主线程修改。
+    写入的结果每隔 commit_interval 秒提交一次（请求保存并发出 batchCommitted）。
+    是否缺少缩略图或颜色特征要用到延迟加载的字段，索引在后台加载完成后才筛选 keys，
+    加载期间定时器空转，不在主线程上等待。
+    """
+
+    progress = pyqtSignal(int, int)  # 已完成数, 总数
+    batchCommitted = pyqtSignal(int)  # 本批写入的缩略图数量
+    finished = pyqtSignal(bool)  # 是否被取消
+
+    def __init__(self, index, keys: List[str], workers: Optional[int] = None,
+                 interval_ms: int = 50, slice_ms: int = 10, commit_interval: float = 2.0,
+                 parent=None):
+        """
+        Args:
+            index: 提供 extras_loaded、keys_needing_thumbnails()、thumbnail_tasks()
+                和 apply_thumbnails() 的索引（LibraryIndex）
+            keys: 需要检查的图片，按优先顺序排列
+            workers: 工作进程数
+            interval_ms: 两次处理之间的间隔
+            slice_ms: 每次在主线程上处理的最长时间
+            commit_interval: 提交已写入结果的间隔（秒）
+        """
+        super().__init__(parent)
+        self.index = index
+        self.keys = keys
+        self.engine = ThumbnailEngine(workers)
+        self.backlog = self.engine.workers * self.engine.chunk_size * 4
+        self.slice = slice_ms / 1000
+        self.commit_interval = commit_interval
+        self._timer = QTimer(self)
+        self._timer.setInterval(interval_ms)
+        self._timer.timeout.connect(self._tick)
+        self._running = False
+        self._checked = False  # keys 是否已筛选为缺少缩略图或颜色特征的图片
+        self._next = 0  # 下一个待整理的键
+        self._applied = 0
+        self._last_commit = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    @property
+    def done(self) -> int:
+        """已完成数：不需要处理的图片加上已返回结果的图片"""
+        return self._next - self.engine.submitted + self.engine.processed
+
+    def start(self) -> bool:
+        """启动进程池，没有需要处理的图片时返回 False（finished 仍会异步发出）"""
+        if self._running:
+            return True
+        if not self.keys:
+            QTimer.singleShot(0, lambda: self.finished.emit(False))
+            return False
+        self.engine.start()
+        self._running = True
+        self._last_commit = time.monotonic()
+        self._timer.start()
+        return True
+
+    def pause(self) -> None:
+        if self._running:
+            self._timer.stop()
+            self.engine.pause()
+
+    def resume(self) -> None:
+        if self._running:
+            self.engine.resume()
+            self._timer.start()
+
+    def cancel(self) -> None:
+        """取消生成，已写入的缩略图会保存"""
+        if self._running:
+            self.engine.cancel()
+            self._finish(cancelled=True)
+
+    def _tick(self) -> None:
+        if not self._checked:
+            if not self.index.extras_loaded:
+                return
+            self._checked = True
+            try:
+                self.keys = self.index.keys_needing_thumbnails(self.keys)
+            except Exception as e:
+                print(f"检查缩略图失败: {e}")
+                self.keys = []
+            if not self.keys:
+                self.engine.cancel()
+                self._finish(cancelled=False)
+                return
+        deadline = time.perf_counter() + self.slice
+        try:
+            # 按需整理下一批任务，避免一次读出所有已有缩略图
+            while (self._next < len(self.keys) and self.engine.pending < self.backlog
+                   and time.perf_counter() < deadline):
+                batch = self.keys[self._next:self._next + 64]
+                self._next += len(batch)
+                self.engine.submit(self.index.thumbnail_tasks(batch))
+            if self._next >= len(self.keys):
+                self.engine.close()
+
+            while time.perf_counter() < deadline:
+                results = self.engine.poll(timeout=0, limit=64)
+                if not results:
+                    break
+                self._applied += self.index.apply_thumbnails(results)
+        except Exception as e:
+            print(f"写入缩略图失败: {e}")
+            self.engine.cancel()
+            self._finish(cancelled=False)
+            return
+
+        self.progress.emit(self.done, len(self.keys))
+        if self.engine.finished:
+            self._finish(cancelled=False)
+        elif time.monotonic() - self._last_commit >= self.commit_interval:
+            self._commit()
+
+    def _commit(self) -> None:
+        self._last_commit = time.monotonic()
+        applied, self._applied = self._applied, 0
+        self.index.schedule_save()
+        self.batchCommitted.emit(applied)
+
+    def _finish(self, cancelled: bool) -> None:
+        self._timer.stop()
+        self._running = False
+        self._commit()
+        self.finished.emit(cancelled)
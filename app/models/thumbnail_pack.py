@@ -0,0 +1,189 @@
+import os
+import mmap
+import struct
+import threading
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+# 记录格式: 魔数(4) | 哈希长度(u16) | 数据长度(u32) | 哈希 | JPEG数据
+RECORD_MAGIC = b"WKTB"
+RECORD_HEADER = struct.Struct("<4sHI")
+
+
+class ThumbnailPack:
+    """缩略图包文件
+
+    所有缩略图以原始JPEG字节追加写入同一个文件，通过 mmap 读取。
+    偏移表（哈希 -> (偏移, 长度)）在首次使用时扫描文件重建，
+    索引中只需保存偏移和长度；按偏移读取时可以核对记录的哈希，拒绝指向其他图片的旧偏移。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._offsets: Dict[str, Tuple[int, int]] = {}  # 哈希 -> 最新记录
+        self._records: Dict[Tuple[int, int], str] = {}  # 所有记录 -> 哈希
+        self._size = 0
+        self._file = None
+        self._mmap: Optional[mmap.mmap] = None
+        self._opened = False
+        self._lock = threading.RLock()
+
+    def _open(self) -> None:
+        """扫描包文件，重建偏移表"""
+        if self._opened:
+            return
+        self._opened = True
+        self._offsets.clear()
+        self._records.clear()
+        self._size = 0
+        if os.path.exists(self.temp_path):
+            # 上次压缩在替换包文件之前中断，包文件和索引中的偏移仍是压缩前的
+            os.remove(self.temp_path)
+        if not os.path.exists(self.path):
+            return
+
+        good_size = 0
+        with open(self.path, 'rb') as f:
+            file_size = os.fstat(f.fileno()).st_size
+            while good_size + RECORD_HEADER.size <= file_size:
+                f.seek(good_size)
+                magic, hash_len, data_len = RECORD_HEADER.unpack(f.read(RECORD_HEADER.size))
+                end = good_size + RECORD_HEADER.size + hash_len + data_len
+                if magic != RECORD_MAGIC or end > file_size:
+                    break
+                file_hash = f.read(hash_len).decode('ascii')
+                ref = (good_size + RECORD_HEADER.size + hash_len, data_len)
+                self._offsets[file_hash] = ref
+                self._records[ref] = file_hash
+                good_size = end
+
+        if good_size != file_size:
+            # 上次写入中断，截掉不完整的尾部记录
+            print(f"缩略图包尾部损坏，截断 {file_size - good_size} 字节")
+            with open(self.path, 'r+b') as f:
+                f.truncate(good_size)
+        self._size = good_size
+
+    @property
+    def temp_path(self) -> str:
+        """压缩时写入的临时文件"""
+        return f"{self.path}.tmp"
+
+    def _close_map(self) -> None:
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _ensure_map(self, end: int) -> bool:
+        """确保映射覆盖到 end 位置，文件增长后重新映射"""
+        if self._mmap is not None and len(self._mmap) >= end:
+            return True
+        self._close_map()
+        if self._size < end or self._size == 0:
+            return False
+        self._file = open(self.path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return len(self._mmap) >= end
+
+    def append(self, file_hash: str, data: bytes) -> Tuple[int, int]:
+        """追加一张缩略图，返回 (偏移, 长度)"""
+        encoded_hash = file_hash.encode('ascii')
+        with self._lock:
+            self._open()
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, 'ab') as f:
+                f.write(RECORD_HEADER.pack(RECORD_MAGIC, len(encoded_hash), len(data)))
+                f.write(encoded_hash)
+                f.write(data)
+            offset = self._size + RECORD_HEADER.size + len(encoded_hash)
+            self._size = offset + len(data)
+            self._offsets[file_hash] = (offset, len(data))
+            self._records[(offset, len(data))] = file_hash
+            return offset, len(data)
+
+    def read(self, offset: int, length: int, hashes: Optional[Iterable[str]] = None) -> Optional[bytes]:
+        """按偏移读取缩略图，偏移不对应任何记录、或记录的哈希不在 hashes 中时返回 None"""
+        with self._lock:
+            self._open()
+            file_hash = self._records.get((offset, length))
+            if file_hash is None or (hashes is not None and file_hash not in hashes):
+                return None
+            if not self._ensure_map(offset + length):
+                return None
+            return self._mmap[offset:offset + length]
+
+    def lookup(self, file_hash: str) -> Optional[Tuple[int, int]]:
+        """按哈希查找 (偏移, 长度)"""
+        with self._lock:
+            self._open()
+            return self._offsets.get(file_hash)
+
+    def get(self, file_hash: str) -> Optional[bytes]:
+        """按哈希读取缩略图"""
+        with self._lock:
+            ref = self.lookup(file_hash)
+            if not ref:
+                return None
+            return self.read(*ref)
+
+    def garbage_ratio(self, live_refs: Iterable[Tuple[int, int]]) -> float:
+        """无效数据（不再被引用的记录）所占比例"""
+        with self._lock:
+            self._open()
+            if not self._size:
+                return 0.0
+            live_bytes = 0
+            for ref in set(live_refs):
+                file_hash = self._records.get(ref)
+                if file_hash is not None:
+                    live_bytes += RECORD_HEADER.size + len(file_hash) + ref[1]
+            return 1.0 - live_bytes / self._size
+
+    def compact(self, live_refs: Iterable[Tuple[int, int]],
+                before_replace: Optional[Callable[[Dict[Tuple[int, int], Tuple[int, int]]], bool]] = None
+                ) -> Optional[Dict[Tuple[int, int], Tuple[int, int]]]:
+        """只保留仍被引用的记录重写包文件，返回 旧偏移 -> 新偏移
+
+        新的包先写入临时文件，替换原文件之前调用 before_replace(旧偏移 -> 新偏移)，
+        由索引写入并保存新的偏移；返回 False 时放弃压缩（删除临时文件，返回 None）。
+        在替换之前中断时索引中已是新的偏移而包文件仍是旧的，读取时核对哈希可以拒绝错位的偏移。
+        """
+        with self._lock:
+            self._open()
+            live = [ref for ref in dict.fromkeys(live_refs) if ref in self._records]
+            temp_file = self.temp_path
+            moved: Dict[Tuple[int, int], Tuple[int, int]] = {}
+            offsets: Dict[str, Tuple[int, int]] = {}
+            position = 0
+            with open(temp_file, 'wb') as f:
+                for ref in live:
+                    file_hash = self._records[ref]
+                    data = self.read(*ref)
+                    encoded_hash = file_hash.encode('ascii')
+                    f.write(RECORD_HEADER.pack(RECORD_MAGIC, len(encoded_hash), len(data)))
+                    f.write(encoded_hash)
+                    f.write(data)
+                    position += RECORD_HEADER.size + len(encoded_hash)
+                    moved[ref] = (position, len(data))
+                    offsets[file_hash] = moved[ref]
+                    position += len(data)
+                f.flush()
+                os.fsync(f.fileno())
+
+            if before_replace is not None and not before_replace(moved):
+                os.remove(temp_file)
+                return None
+
+            # Windows 下替换前必须先释放映射
+            self._close_map()
+            os.replace(temp_file, self.path)
+            self._offsets = offsets
+            self._records = {new: self._records[old] for old, new in moved.items()}
+            self._size = position
+            return moved
+
+    def close(self) -> None:
+        with self._lock:
+            self._close_map()
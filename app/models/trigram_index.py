@@ -0,0 +1,103 @@
+from array import array
+from typing import Dict, List, Optional, Set
+
+
+def _trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TrigramIndex:
+    """三元组倒排索引，用于名称和路径的子串搜索
+
+    每个文档分配递增的整数编号，倒排表是按编号递增的 array，只追加不删除；
+    文档删除或文本变化时旧编号作废，作废过多时整体重建。
+    查询时选出倒排表最短的三元组作为候选，再逐个做子串校验，结果与线性扫描完全一致。
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, array] = {}
+        self._ids: Dict[str, int] = {}  # 键 -> 当前编号
+        self._keys: List[Optional[str]] = []  # 编号 -> 键，作废为 None
+        self._texts: List[Optional[str]] = []  # 编号 -> 小写文本
+        self._dead = 0
+
+    @staticmethod
+    def make_text(*fields: str) -> str:
+        """合并多个字段，换行分隔避免跨字段匹配"""
+        return "\n".join(field.lower() for field in fields if field)
+
+    def clear(self) -> None:
+        self.__init__()
+
+    def add(self, key: str, text: str) -> None:
+        """添加或更新文档"""
+        doc_id = self._ids.get(key)
+        if doc_id is not None:
+            if self._texts[doc_id] == text:
+                return
+            self._kill(doc_id)
+        doc_id = len(self._keys)
+        self._ids[key] = doc_id
+        self._keys.append(key)
+        self._texts.append(text)
+        for gram in _trigrams(text):
+            postings = self._postings.get(gram)
+            if postings is None:
+                postings = self._postings[gram] = array("I")
+            postings.append(doc_id)
+
+    def remove(self, key: str) -> None:
+        doc_id = self._ids.pop(key, None)
+        if doc_id is not None:
+            self._kill(doc_id)
+            self._maybe_rebuild()
+
+    def _kill(self, doc_id: int) -> None:
+        self._keys[doc_id] = None
+        self._texts[doc_id] = None
+        self._dead += 1
+
+    def _maybe_rebuild(self) -> None:
+        """作废编号超过一半时重建，回收倒排表空间"""
+        if self._dead > 1000 and self._dead * 2 > len(self._keys):
+            live = [(key, self._texts[doc_id]) for key, doc_id in self._ids.items()]
+            self.clear()
+            for key, text in live:
+                self.add(key, text)
+
+    def _candidates(self, term: str) -> Optional[array]:
+        """返回词中倒排表最短的三元组的倒排表，词长不足3时返回 None"""
+        best = None
+        for gram in _trigrams(term):
+            postings = self._postings.get(gram)
+            if postings is None:
+                return array("I")
+            if best is None or len(postings) < len(best):
+                best = postings
+        return best
+
+    def search(self, query: str) -> Set[str]:
+        """多个词（空白分隔）均为子串时匹配，不区分大小写"""
+        terms = query.lower().split()
+        if not terms:
+            return set(self._ids)
+
+        # 从最有选择性的词开始，其余词只对候选做子串校验
+        best_postings = None
+        for term in terms:
+            postings = self._candidates(term)
+            if postings is not None and (best_postings is None or len(postings) < len(best_postings)):
+                best_postings = postings
+
+        if best_postings is None:
+            # 所有词都少于3个字符，只能逐个检查
+            docs = range(len(self._texts))
+        else:
+            docs = best_postings
+        result = set()
+        texts, keys = self._texts, self._keys
+        for doc_id in docs:
+            text = texts[doc_id]
+            if text is not None and all(term in text for term in terms):
+                result.add(keys[doc_id])
+        return result
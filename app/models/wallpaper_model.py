@@ -3,9 +3,15 @@ import random
 import os
 from typing import Callable
 from .manager import WallpaperManager
+from .index_watcher import IndexWatcher
+from .index_job import IndexJob
+from .thumbnail_job import ThumbnailJob
+from .hash_verify_job import HashVerifyJob
 
 from .. import wallpaperCfg
-from . import wallpaper_index
+from . import wallpaper_index, access_tracker, render_cache
+
+DARK_LUMINANCE = 0.25  # 平均亮度不超过此值视为暗色壁纸
 
 class WallpaperModel(QObject):
     """壁纸数据模型，管理业务逻辑和应用状态，发送状态变化信号"""
@@ -16,6 +22,9 @@ class WallpaperModel(QObject):
     indexingStarted = pyqtSignal()  # 索引开始构建
     indexingProgress = pyqtSignal(int, int, str)  # current, total, filename
     indexingFinished = pyqtSignal(bool)  # success
+    _filesChanged = pyqtSignal(object, object)  # changed, deleted（来自监视线程）
+    _accessFlushDue = pyqtSignal()  # 需要写入缓冲的访问记录（来自访问记录线程）
+    _extrasLoaded = pyqtSignal()  # 后台加载的字段中有需要写入索引的修改（来自加载线程）
     
     def __init__(self, wallpaper_manager):
         super().__init__()
@@ -28,37 +37,42 @@ class WallpaperModel(QObject):
             "sort_by": "filename", 
             "filter": ""
         }
+        self._watchers = []
+        self._pinned_render = None  # 当前壁纸使用的渲染缓存键
+        self.index_job = None  # 进行中的后台构建任务
+        self.thumbnail_job = None  # 进行中的缩略图生成任务
+        self.hash_verify_job = None  # 进行中的完整哈希补算任务
+        self._deferred_changes = []  # 构建期间收到的文件变化，构建结束后应用
+        # 跨线程信号，在主线程中应用文件变化、写入访问记录和加载时迁移的缩略图
+        self._filesChanged.connect(self._on_files_changed)
+        self._accessFlushDue.connect(self._flush_access_records)
+        self._extrasLoaded.connect(self._apply_loaded_extras)
+        access_tracker.start(self._accessFlushDue.emit)
         self._update_filtered_keys()
     
     def _update_filtered_keys(self):
         """更新过滤后的键列表 - 根据视图设置过滤并排序"""
-        # 根据是否显示排除的壁纸获取基础列表
-        if self.view_settings["show_excluded"]:
-            keys = wallpaper_index.get_all_keys()
-        else:
-            keys = wallpaper_index.get_filtered_keys(excluded=False)
-        
-        # 应用搜索过滤
-        if self.view_settings["filter"]:
-            query = self.view_settings["filter"].lower()
-            filtered_keys = []
-            for key in keys:
-                pic = wallpaper_index.get_picture(key)
-                if pic and (query in pic.display_name.lower() or query in pic.path.lower()):
-                    filtered_keys.append(key)
-            keys = filtered_keys
-        
-        # 应用排序
+        # 排序和排除状态由索引的二级索引维护，无需逐个查询图片
+        excluded = None if self.view_settings["show_excluded"] else False
         sort_by = self.view_settings["sort_by"]
         if sort_by == "filename":
             # 按文件名排序
-            keys.sort(key=lambda k: wallpaper_index.get_picture(k).display_name.lower())
+            keys = wallpaper_index.get_sorted_keys("name", excluded)
         elif sort_by == "date":
             # 按添加日期排序
-            keys.sort(key=lambda k: wallpaper_index.get_picture(k).added_date)
+            keys = wallpaper_index.get_sorted_keys("added", excluded)
         elif sort_by == "access":
             # 按最近访问排序
-            keys.sort(key=lambda k: wallpaper_index.get_picture(k).last_accessed, reverse=True)
+            keys = wallpaper_index.get_sorted_keys("accessed", excluded, reverse=True)
+        elif excluded is None:
+            keys = wallpaper_index.get_all_keys()
+        else:
+            keys = wallpaper_index.get_filtered_keys(excluded=False)
+        
+        # 应用搜索过滤
+        if self.view_settings["filter"]:
+            matches = self.search(self.view_settings["filter"])
+            keys = [key for key in keys if key in matches]
         
         # 更新过滤后的列表
         old_keys = self.filtered_keys
@@ -93,18 +107,62 @@ class WallpaperModel(QObject):
         if settings_changed:
             self._update_filtered_keys()
     
-    def get_all_wallpapers(self):
-        """获取所有壁纸信息 (包括已排除的)"""
+    def search(self, query):
+        """搜索名称或相对路径，返回匹配的键集合"""
+        return set(wallpaper_index.search_by_name(query))
+    
+    def get_dark_wallpapers(self, threshold=DARK_LUMINANCE, limit=None):
+        """平均亮度不超过 threshold 的已启用壁纸，从暗到亮排序"""
+        return wallpaper_index.find_by_luminance(max_luminance=threshold, limit=limit, excluded=False)
+    
+    def get_similar_palette(self, key=None, limit=50):
+        """主色与指定壁纸（默认为当前壁纸）最接近的已启用壁纸，limit 为 None 时返回全部"""
+        key = key or self.current_key
+        if not key:
+            return []
+        return wallpaper_index.find_similar_palette(key, limit, excluded=False)
+    
+    def find_by_color(self, color, limit=50):
+        """主色中含有与 color（"#rrggbb" 或 (r, g, b)）最接近颜色的已启用壁纸，limit 为 None 时返回全部"""
+        if isinstance(color, str):
+            value = color.lstrip("#")
+            color = (int(value[0:2], 16), int(value[2:4], 16), int(value[4:6], 16))
+        return wallpaper_index.find_nearest_color(color, limit, excluded=False)
+    
+    def get_wallpapers_by_resolution(self, min_width=0, min_height=0):
+        """显示尺寸不小于指定分辨率的壁纸键列表"""
+        return wallpaper_index.get_keys_by_resolution(min_width, min_height)
+    
+    def find_similar(self, key):
+        """与指定壁纸相似的壁纸键列表，按相似程度排序"""
+        return wallpaper_index.find_similar(key)
+    
+    def get_duplicate_groups(self):
+        """相似壁纸分组（缩放、重新编码的副本）"""
+        return wallpaper_index.duplicate_groups()
+    
+    def get_all_wallpapers(self, with_thumbnails=False):
+        """获取所有壁纸信息 (包括已排除的)
+        
+        Args:
+            with_thumbnails (bool): 是否附带缩略图JPEG字节 ("thumbnail" 字段)
+        """
         result = {}
         for key in wallpaper_index.get_all_keys():
             pic = wallpaper_index.get_picture(key)
             if pic:
                 result[key] = pic.to_dict()
+                if with_thumbnails:
+                    result[key]["thumbnail"] = wallpaper_index.read_thumbnail(key)
     
         # 调试信息
         print(f"模型返回的壁纸数量: {len(result)}")
         return result
     
+    def get_thumbnail_candidates(self):
+        """需要检查缩略图的壁纸键，已启用的优先（只用核心字段，不触发延迟加载）"""
+        return wallpaper_index.get_filtered_keys(excluded=False) + wallpaper_index.get_filtered_keys(excluded=True)
+    
     def get_excluded_wallpapers(self):
         """获取所有已排除的壁纸键列表"""
         return wallpaper_index.get_filtered_keys(excluded=True)
@@ -117,7 +175,7 @@ class WallpaperModel(QObject):
             
         pic.set_excluded(True)
         # 保存更改
-        wallpaper_index.save()
+        wallpaper_index.schedule_save()
         
         # 如果当前设置不显示已排除壁纸，需要更新过滤列表
         if not self.view_settings["show_excluded"]:
@@ -133,7 +191,7 @@ class WallpaperModel(QObject):
             
         pic.set_excluded(False)
         # 保存更改
-        wallpaper_index.save()
+        wallpaper_index.schedule_save()
         
         # 如果当前设置不显示已排除壁纸，需要更新过滤列表
         if not self.view_settings["show_excluded"]:
@@ -150,7 +208,7 @@ class WallpaperModel(QObject):
     
     def set_current_key(self, key):
         """设置当前壁纸键"""
-        if key not in wallpaper_index.wallpaper_index:
+        if key not in wallpaper_index:
             return False
             
         old_key = self.current_key
@@ -200,14 +258,19 @@ class WallpaperModel(QObject):
         return self.set_current_by_index(current_index - 1)
     
     def load_index(self):
-        """加载索引文件"""
-        result = wallpaper_index.load_index()
+        """加载索引文件（两阶段：先核心字段，其余字段后台加载）"""
+        result = wallpaper_index.load_index(lazy=True, notify=self._extrasLoaded.emit)
         if result:
             self._update_filtered_keys()
         return result
     
-    def build_index(self, progress_callback: Callable = None) -> bool:
-        """构建索引"""
+    def build_index(self, progress_callback: Callable = None, verify: bool = False) -> bool:
+        """构建索引
+        
+        Args:
+            progress_callback: 进度回调 (current, total, filename)
+            verify (bool): 是否强制重新计算所有文件的哈希
+        """
         self.indexingStarted.emit()
         
         # 如果没有提供回调，使用内部回调函数
@@ -228,7 +291,7 @@ class WallpaperModel(QObject):
         
         # 调用管理器构建索引
         success = wallpaper_index.build_index(
-            progress_callback=progress_callback)
+            progress_callback=progress_callback, verify=verify)
         
         # 完成后发出信号并更新列表
         self.indexingFinished.emit(success)
@@ -237,6 +300,82 @@ class WallpaperModel(QObject):
         
         return success
     
+    def has_interrupted_build(self) -> bool:
+        """是否有被中断的索引构建"""
+        return wallpaper_index.has_interrupted_build()
+    
+    def start_index_job(self, verify: bool = False) -> IndexJob:
+        """在后台构建索引，已有构建进行中时返回该任务
+        
+        构建期间每提交一批结果刷新一次列表，新找到的壁纸陆续出现。
+        """
+        if self.index_job is not None:
+            return self.index_job
+        job = IndexJob(wallpaper_index, verify, parent=self)
+        job.progress.connect(lambda current, total, filename, eta:
+                             self.indexingProgress.emit(current, total, filename))
+        job.batchCommitted.connect(self._on_index_batch_committed)
+        job.finished.connect(self._on_index_job_finished)
+        self.index_job = job
+        self.indexingStarted.emit()
+        job.start()
+        return job
+    
+    def _on_index_batch_committed(self, added):
+        if added:
+            self._update_filtered_keys()
+    
+    def _on_index_job_finished(self, success, cancelled):
+        """构建结束：刷新列表，再应用构建期间收到的文件变化"""
+        self.index_job = None
+        self.indexingFinished.emit(success)
+        self._update_filtered_keys()
+        deferred, self._deferred_changes = self._deferred_changes, []
+        for changed, deleted in deferred:
+            self._on_files_changed(changed, deleted)
+    
+    def start_watching(self):
+        """开始监视所有在线的壁纸目录，文件变化时增量更新索引"""
+        if self._watchers:
+            return False
+        for root in wallpaper_index.roots():
+            if os.path.isdir(root):
+                watcher = IndexWatcher(root, self._filesChanged.emit)
+                watcher.start()
+                self._watchers.append(watcher)
+        return bool(self._watchers)
+    
+    def stop_watching(self):
+        """停止监视壁纸目录"""
+        for watcher in self._watchers:
+            watcher.stop()
+        self._watchers = []
+    
+    def _on_files_changed(self, changed, deleted):
+        """应用一批文件变化，只刷新一次列表"""
+        if self.index_job is not None:
+            # 构建进行中，扫描使用的查找表是构建开始时的快照，变化留到构建结束后应用；
+            # 事件丢失时的整体同步由这次构建完成
+            if changed is not None or deleted is not None:
+                self._deferred_changes.append((changed, deleted))
+        elif changed is None and deleted is None:
+            # 事件丢失，整体同步
+            self.start_index_job()
+        elif wallpaper_index.apply_changes(changed, deleted):
+            self._update_filtered_keys()
+    
+    def _flush_access_records(self):
+        try:
+            access_tracker.flush()
+        except Exception as e:
+            print(f"写入访问记录失败: {e}")
+    
+    def _apply_loaded_extras(self):
+        try:
+            wallpaper_index.apply_loaded_extras()
+        except Exception as e:
+            print(f"写入加载结果失败: {e}")
+    
     def get_current_wallpaper(self):
         """获取当前壁纸信息"""
         if not self.current_key:
@@ -254,39 +393,74 @@ class WallpaperModel(QObject):
         if key:
             self.currentWallpaperChanged.emit(key, info)
     
-    def set_wallpaper(self, path, async_mode=True):
-        """设置壁纸"""
+    def set_wallpaper(self, path, async_mode=True, key=None, render_key=None):
+        """设置壁纸，key 为对应的壁纸键时记录一次展示，render_key 为使用的渲染缓存的键"""
+        if key:
+            access_tracker.record(key)
+        self._pin_render(render_key)
         return self.manager.set_wallpaper(path, async_mode)
     
-    def set_current_wallpaper(self):
-        """设置当前壁纸"""
+    def _pin_render(self, render_key):
+        """固定当前壁纸使用的渲染结果，不被缓存淘汰"""
+        if self._pinned_render and self._pinned_render != render_key:
+            render_cache.unpin(self._pinned_render)
+        if render_key:
+            render_cache.pin(render_key)
+        self._pinned_render = render_key
+    
+    def set_current_wallpaper(self, render=None):
+        """设置当前壁纸
+        
+        render(info, crop_region) 返回 (渲染缓存的键, 文件路径)，有裁剪区域但渲染结果已被缓存淘汰时
+        用它重新渲染，没有传入或渲染失败时使用原图。
+        """
         if not self.current_key:
             return False
             
         pic = wallpaper_index.get_picture(self.current_key)
         if not pic:
             return False
+        access_tracker.record(self.current_key)
         
-        # 优先使用缓存文件
+        # 优先使用渲染缓存（cache_path 为渲染缓存的键，旧索引中为缓存目录下的文件名）
         if pic.cache_path:
-            cache_path = os.path.join(wallpaperCfg.cacheDir.value, pic.cache_path)
-            if os.path.exists(cache_path):
+            cache_path = render_cache.get(pic.cache_path)
+            if not cache_path:
+                legacy_path = os.path.join(wallpaperCfg.cacheDir.value, pic.cache_path)
+                cache_path = legacy_path if os.path.isfile(legacy_path) else None
+            if cache_path:
+                self._pin_render(pic.cache_path)
+                self.manager.set_wallpaper(cache_path)
+                return True
+        
+        # 渲染结果已被缓存淘汰时按裁剪区域重新渲染，不退回未裁剪的原图
+        if pic.crop_region and render is not None:
+            try:
+                cache_key, cache_path = render(pic.to_dict(), pic.crop_region)
+            except Exception as e:
+                print(f"重新渲染裁剪失败: {pic.path}, 错误: {e}")
+            else:
+                if cache_key != pic.cache_path:
+                    pic.update_crop(pic.crop_region, cache_key)
+                    wallpaper_index.schedule_save()
+                self._pin_render(cache_key)
                 self.manager.set_wallpaper(cache_path)
                 return True
         
         # 使用原图
+        self._pin_render(None)
         self.manager.set_wallpaper(pic.path)
         return True
     
-    def update_crop_region(self, key, crop_region, cache_filename=None):
-        """更新裁剪区域"""
+    def update_crop_region(self, key, crop_region, cache_key=None):
+        """更新裁剪区域，cache_key 为渲染缓存的键"""
         pic = wallpaper_index.get_picture(key)
         if not pic:
             return False
             
-        pic.update_crop(crop_region, cache_filename)
+        pic.update_crop(crop_region, cache_key)
         # 保存更改
-        wallpaper_index.save()
+        wallpaper_index.schedule_save()
         
         # 如果是当前壁纸，通知变化
         if key == self.current_key:
@@ -300,17 +474,40 @@ class WallpaperModel(QObject):
         if not pic:
             return None
             
-        # 生成缩略图
-        thumb = wallpaper_index.regenerate_thumbnail(key)
-        # _create_thumbnail_base64(pic.path)
+        # 已有缩略图时直接读取（同时补算颜色特征），否则生成并写入缩略图包
+        thumb = wallpaper_index.get_thumbnail_bytes(key)
 
         if thumb:
-            pic.set_thumbnail(thumb)
-            # 异步保存索引（避免频繁保存）
-            wallpaper_index.save()
+            wallpaper_index.schedule_save()
             
         return thumb
     
+    def start_thumbnail_job(self, keys) -> ThumbnailJob:
+        """在工作进程中为 keys（按优先顺序）生成缩略图，已有任务进行中时返回该任务"""
+        if self.thumbnail_job is not None:
+            return self.thumbnail_job
+        job = ThumbnailJob(wallpaper_index, keys, wallpaperCfg.thumbnailWorkers.value, parent=self)
+        job.finished.connect(self._on_thumbnail_job_finished)
+        self.thumbnail_job = job
+        job.start()
+        return job
+    
+    def _on_thumbnail_job_finished(self, cancelled):
+        self.thumbnail_job = None
+    
+    def start_hash_verify_job(self) -> HashVerifyJob:
+        """在后台线程中为只有采样哈希的壁纸补算完整哈希，已有任务进行中时返回该任务"""
+        if self.hash_verify_job is not None:
+            return self.hash_verify_job
+        job = HashVerifyJob(wallpaper_index, wallpaperCfg.hashAlgorithm.value, parent=self)
+        job.finished.connect(self._on_hash_verify_job_finished)
+        self.hash_verify_job = job
+        job.start()
+        return job
+    
+    def _on_hash_verify_job_finished(self, cancelled):
+        self.hash_verify_job = None
+    
     def get_random_key(self):
         """获取随机键，不同于当前键"""
         if not self.filtered_keys:
@@ -335,9 +532,21 @@ class WallpaperModel(QObject):
             return self.set_current_key(random_key)
         return False
     
+    def get_render_cache_stats(self):
+        """渲染缓存统计"""
+        return render_cache.stats()
+    
+    def evict_render_cache(self):
+        """立即按预算淘汰渲染缓存，返回淘汰的数量"""
+        return render_cache.evict()
+    
     def cleanup_cache(self):
         """清理无效缓存"""
-        return wallpaper_index.cleanup_cache()
+        deleted = wallpaper_index.cleanup_cache()
+        deleted += render_cache.cleanup(wallpaper_index.cache_files())
+        if wallpaper_index.compact_thumbnails():
+            wallpaper_index.schedule_save()
+        return deleted
     
     def get_wallpaper_count(self):
         """获取当前过滤条件下的壁纸数量"""
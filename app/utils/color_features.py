@@ -0,0 +1,82 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+PALETTE_SIZE = 5  # 主色数量
+QUANT_BITS = 3  # 主色统计时每个通道保留的位数（8 x 8 x 8 个颜色桶）
+
+
+def compute_color_features(img: Image.Image, palette_size: int = PALETTE_SIZE) -> Optional[Dict[str, Any]]:
+    """由已解码的缩略图计算颜色特征
+
+    - luminance: 平均亮度（Rec.709 加权，0~1）
+    - colorfulness: Hasler–Süsstrunk 色彩丰富度（灰度图为 0，一般不超过 150）
+    - palette: 主色，每种颜色 8 位十六进制 rrggbbww（ww 为占比 * 255），按占比降序
+    """
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    pixels = np.asarray(img, dtype=np.uint8).reshape(-1, 3)
+    if not len(pixels):
+        return None
+    rgb = pixels.astype(np.float32)
+    r, g, b = rgb[:, 0], rgb[:, 1], rgb[:, 2]
+
+    luminance = float((0.2126 * r + 0.7152 * g + 0.0722 * b).mean() / 255)
+    rg, yb = r - g, 0.5 * (r + g) - b
+    colorfulness = float(np.hypot(rg.std(), yb.std()) + 0.3 * np.hypot(rg.mean(), yb.mean()))
+
+    # 量化后统计颜色桶，取像素最多的几个桶，主色为桶内像素的平均值
+    shift = 8 - QUANT_BITS
+    bins = ((pixels[:, 0] >> shift).astype(np.int32) << (2 * QUANT_BITS)
+            | (pixels[:, 1] >> shift).astype(np.int32) << QUANT_BITS
+            | (pixels[:, 2] >> shift))
+    size = 1 << (3 * QUANT_BITS)
+    counts = np.bincount(bins, minlength=size)
+    top = np.argsort(counts)[::-1][:palette_size]
+    top = top[counts[top] > 0]
+    means = np.stack([np.bincount(bins, weights=rgb[:, c], minlength=size)[top] for c in range(3)], axis=1)
+    colors = np.rint(means / counts[top, None]).astype(np.uint8)
+    weights = np.rint(counts[top] * 255 / len(pixels)).astype(np.uint8)
+    palette = np.concatenate([colors, weights[:, None]], axis=1).tobytes().hex()
+
+    return {
+        "luminance": round(luminance, 4),
+        "colorfulness": round(colorfulness, 2),
+        "palette": palette,
+    }
+
+
+def _pad_palette(palette: str, palette_size: int) -> str:
+    """截取或补齐到 palette_size 种颜色，补齐项为第一种颜色、占比为 0"""
+    width = 8 * palette_size
+    if len(palette) >= width:
+        return palette[:width]
+    return palette + (palette[:6] + "00") * ((width - len(palette)) // 8)
+
+
+def parse_palettes(palettes: List[str], palette_size: int = PALETTE_SIZE) -> Tuple[np.ndarray, np.ndarray]:
+    """批量解析主色字符串，返回 (Lab 颜色 (N, palette_size, 3), 占比 (N, palette_size))"""
+    joined = "".join(_pad_palette(palette, palette_size) for palette in palettes)
+    entries = np.frombuffer(bytes.fromhex(joined), dtype=np.uint8).reshape(len(palettes), palette_size, 4)
+    return rgb_to_lab(entries[..., :3]), entries[..., 3].astype(np.float32) / 255
+
+
+def parse_palette(palette: str, palette_size: int = PALETTE_SIZE) -> Tuple[np.ndarray, np.ndarray]:
+    """解析单个主色字符串，返回 (Lab 颜色 (palette_size, 3), 占比 (palette_size,))"""
+    colors, weights = parse_palettes([palette], palette_size)
+    return colors[0], weights[0]
+
+
+def rgb_to_lab(rgb: np.ndarray) -> np.ndarray:
+    """sRGB (0~255) 转 CIELAB（D65），颜色距离更接近人眼感受"""
+    c = np.asarray(rgb, dtype=np.float32) / 255
+    c = np.where(c > 0.04045, ((c + 0.055) / 1.055) ** 2.4, c / 12.92)
+    xyz = c @ np.array([[0.4124, 0.2126, 0.0193],
+                        [0.3576, 0.7152, 0.1192],
+                        [0.1805, 0.0722, 0.9505]], dtype=np.float32)
+    xyz /= np.array([0.95047, 1.0, 1.08883], dtype=np.float32)
+    f = np.where(xyz > 0.008856, np.cbrt(xyz), 7.787 * xyz + 16 / 116)
+    return np.stack([116 * f[..., 1] - 16,
+                     500 * (f[..., 0] - f[..., 1]),
+                     200 * (f[..., 1] - f[..., 2])], axis=-1).astype(np.float32)
@@ -0,0 +1,57 @@
+import os
+import hashlib
+from typing import Optional
+
+# 可选的完整内容哈希算法，md5 用于兼容旧索引
+HASH_ALGORITHMS = ("md5", "blake2b", "sha256")
+
+SAMPLE_BLOCK_SIZE = 64 * 1024
+
+
+def _new_hash(algorithm: str):
+    if algorithm == "blake2b":
+        return hashlib.blake2b(digest_size=16)
+    if algorithm not in HASH_ALGORITHMS:
+        raise ValueError(f"不支持的哈希算法: {algorithm}")
+    return hashlib.new(algorithm)
+
+
+def sampled_hash(filepath: str, size: Optional[int] = None,
+                 block_size: int = SAMPLE_BLOCK_SIZE) -> Optional[str]:
+    """快速采样哈希：文件大小 + 头、中、尾三个块的 blake2b
+
+    小于三个块的文件直接对全部内容计算。只用于初筛，相同不代表内容一定相同。
+    """
+    try:
+        if size is None:
+            size = os.path.getsize(filepath)
+        h = hashlib.blake2b(digest_size=16)
+        h.update(size.to_bytes(8, "little"))
+        with open(filepath, "rb") as f:
+            if size <= 3 * block_size:
+                h.update(f.read())
+            else:
+                for offset in (0, (size - block_size) // 2, size - block_size):
+                    f.seek(offset)
+                    h.update(f.read(block_size))
+        return h.hexdigest()
+    except Exception:
+        return None
+
+
+def full_hash(filepath: str, algorithm: str = "md5",
+              chunk_size: int = 1024 * 1024) -> Optional[str]:
+    """完整内容哈希（大块读取，复用缓冲区）"""
+    h = _new_hash(algorithm)
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    try:
+        with open(filepath, "rb", buffering=0) as f:
+            while True:
+                n = f.readinto(buffer)
+                if not n:
+                    break
+                h.update(view[:n])
+        return h.hexdigest()
+    except Exception:
+        return None
@@ -0,0 +1,47 @@
+from typing import Tuple
+
+from PIL import Image
+
+# 两阶段缩小时，第一阶段（DCT 缩放或整数倍盒式缩小）之后离目标尺寸至少还有这么多倍，
+# 最后一步再用 Lanczos，结果与直接 Lanczos 几乎没有差别
+REDUCING_GAP = 2.0
+# 缩小到屏幕尺寸时最后一步的像素仍然很多，间隔取小一些：6000 宽的图片适配 1920 的屏幕时
+# 第一阶段可以先缩小一半（JPEG 按 1/2 解码），与直接 Lanczos 的 PSNR 仍在 50 dB 以上
+FIT_REDUCING_GAP = 1.5
+
+
+def fit_size(size: Tuple[int, int], bounds: Tuple[int, int]) -> Tuple[int, int]:
+    """保持宽高比缩小到 bounds 之内的尺寸，不放大"""
+    width, height = size
+    scale = min(1.0, bounds[0] / width, bounds[1] / height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def reduce_factor(size: Tuple[int, int], target: Tuple[int, int],
+                  reducing_gap: float = REDUCING_GAP) -> int:
+    """第一阶段可以整数倍缩小的倍数：缩小后仍不小于目标尺寸的 reducing_gap 倍"""
+    return max(1, int(min(size[0] / (target[0] * reducing_gap), size[1] / (target[1] * reducing_gap))))
+
+
+def scale_image(img: Image.Image, target: Tuple[int, int],
+                reducing_gap: float = REDUCING_GAP) -> Image.Image:
+    """以较低的分辨率解码并缩小到 target
+
+    JPEG 在解码时直接按 1/2~1/8 缩小（draft，需要在像素解码之前调用），
+    其他格式解码后先用 reduce() 整数倍盒式缩小，最后一步用 Lanczos。
+    6000x4000 的 JPEG 缩成缩略图时只需解码约 1/64 的像素。
+    """
+    target = (int(target[0]), int(target[1]))
+    if img.size == target:
+        return img
+    img.draft(None, (int(target[0] * reducing_gap), int(target[1] * reducing_gap)))
+    if img.mode in ("1", "P"):
+        # 调色板图片的 resize 只能用最近邻，先转换为 RGB(A)
+        img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+    factor = reduce_factor(img.size, target, reducing_gap)
+    if factor > 1:
+        try:
+            img = img.reduce(factor)
+        except ValueError:
+            pass  # reduce() 不支持的模式，直接 Lanczos
+    return img.resize(target, Image.LANCZOS)
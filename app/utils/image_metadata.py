@@ -0,0 +1,37 @@
+from typing import Any, Dict, Optional, Tuple
+
+from PIL import Image
+
+ORIENTATION_TAG = 0x0112  # EXIF 方向
+ROTATED_ORIENTATIONS = (5, 6, 7, 8)  # 显示时需要旋转 90° 的方向，宽高互换
+
+
+def read_image_info(filepath: str) -> Optional[Dict[str, Any]]:
+    """只解析文件头，读取宽高、格式、颜色模式和 EXIF 方向，不解码像素
+
+    Image.open 是惰性的，在 load() 之前只读取文件头；JPEG/WebP 的 EXIF 随文件头一起解析。
+    无法识别的文件返回 None。
+    """
+    try:
+        with Image.open(filepath) as img:
+            width, height = img.size
+            orientation = 1
+            # 只在文件头里已有 EXIF 时读取，PNG 等格式的 getexif() 在没有 EXIF 时会解码整张图
+            if "exif" in img.info:
+                orientation = img.getexif().get(ORIENTATION_TAG, 1)
+            return {
+                "width": width,
+                "height": height,
+                "image_format": img.format,
+                "color_mode": img.mode,
+                "orientation": orientation if orientation in range(1, 9) else 1,
+            }
+    except Exception:
+        return None
+
+
+def display_size(width: int, height: int, orientation: Optional[int]) -> Tuple[int, int]:
+    """按 EXIF 方向旋转后的显示尺寸"""
+    if orientation in ROTATED_ORIENTATIONS:
+        return height, width
+    return width, height
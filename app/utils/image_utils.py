@@ -1,45 +1,53 @@
 from PIL import Image
 import subprocess
-import hashlib
 import os
 
 from app.models.settings import wallpaperCfg
+from app.utils.fingerprint import full_hash
+from app.utils.image_decode import FIT_REDUCING_GAP, scale_image
 
 class ImageUtils:
 
     realesrgan_path = wallpaperCfg.realesrganPath.value
+    upscale_model = "realesrgan-x4plus-anime"
+    upscale_scale = 4
         
-    def fit_image_to_screen(image_path, cache_path, screen_width, screen_height):
-        """将图片缩放到适合屏幕大小"""
-        img = Image.open(image_path)
-        iw, ih = img.size
-        width_ratio = screen_width / iw
-        height_ratio = screen_height / ih
-
-        # 判断是否需要缩小
-        if iw > 2 * screen_width or ih > 2 * screen_height:
-            scale = min(screen_width / iw, screen_height / ih)
-            new_size = (int(iw * scale), int(ih * scale))
-            img = img.resize(new_size, Image.LANCZOS)
-            img.save(cache_path)
-            return cache_path
+    def fit_image_to_screen(image_path, cache_path, screen_width, screen_height, size=None):
+        """将图片缩放到适合屏幕大小
         
-        elif width_ratio > 1 or height_ratio > 1:
-            # 需要放大
-            scale = int(max(width_ratio, height_ratio))
-            scale = max(2, min(scale, 8))  # 限制在2-8之间
-            scale = 4
-            if ImageUtils.upscale(image_path, cache_path, scale):
+        size 为已知的 (宽, 高) 时直接使用；否则由惰性的 Image.open 从文件头读取，
+        只有确实需要缩放或另存时才解码像素；缩小时以较低的分辨率解码。
+        """
+        # 关闭源文件句柄，调用方随后可以删除或移动源文件
+        with Image.open(image_path) as img:
+            iw, ih = size or img.size
+            width_ratio = screen_width / iw
+            height_ratio = screen_height / ih
+
+            # 判断是否需要缩小
+            if iw > 2 * screen_width or ih > 2 * screen_height:
+                scale = min(screen_width / iw, screen_height / ih)
+                new_size = (int(iw * scale), int(ih * scale))
+                img = scale_image(img, new_size, FIT_REDUCING_GAP)
+                img.save(cache_path)
                 return cache_path
+        
+            elif width_ratio > 1 or height_ratio > 1:
+                # 需要放大
+                scale = int(max(width_ratio, height_ratio))
+                scale = max(2, min(scale, 8))  # 限制在2-8之间
+                scale = ImageUtils.upscale_scale
+                if ImageUtils.upscale(image_path, cache_path, scale):
+                    return cache_path
+                else:
+                    # 超分失败，采用普通缩放
+                    img.save(cache_path)
+                    return cache_path
+        
             else:
-                # 超分失败，采用普通缩放
+                # 不需要处理，直接保存副本
                 img.save(cache_path)
                 return cache_path
-        
-        else:
-            # 不需要处理，直接保存副本
-            img.save(cache_path)
-            return cache_path
     
     def upscale(input_path, output_path, scale_factor):
         """使用realesrgan进行超分辨率处理"""
@@ -51,7 +59,7 @@ class ImageUtils:
             "-i", input_path,
             "-o", output_path,
             # "--outscale", str(scale_factor),
-            "-n", "realesrgan-x4plus-anime"
+            "-n", ImageUtils.upscale_model
         ]
         
         try:
@@ -61,13 +69,12 @@ class ImageUtils:
             print(f"超分辨率处理失败: {e}")
             return False
     
-    def calculate_file_hash(filepath):
-        """计算文件MD5哈希值"""
-        hash_md5 = hashlib.md5()
-        try:
-            with open(filepath, "rb") as f:
-                for chunk in iter(lambda: f.read(4096), b""):
-                    hash_md5.update(chunk)
-            return hash_md5.hexdigest()
-        except Exception:
-            return None
\ No newline at end of file
+    def upscale_params():
+        """超分设置 (模型, 倍数)，超分工具不可用时为 None；渲染缓存的键包含此项"""
+        if not os.path.exists(ImageUtils.realesrgan_path):
+            return None
+        return ImageUtils.upscale_model, ImageUtils.upscale_scale
+    
+    def calculate_file_hash(filepath, algorithm="md5"):
+        """计算文件完整内容哈希值，默认MD5"""
+        return full_hash(filepath, algorithm)
\ No newline at end of file
@@ -0,0 +1,28 @@
+from typing import Optional
+
+import numpy as np
+from PIL import Image
+
+HASH_SIZE = 8  # 8 x 8 = 64 位
+
+
+def dhash(filepath: str, hash_size: int = HASH_SIZE) -> Optional[str]:
+    """差异哈希（dHash）：缩小为 (hash_size + 1) x hash_size 的灰度图，逐行比较相邻像素
+
+    缩放、重新编码后的图片哈希相同或只差几位。返回十六进制字符串，无法解码时返回 None。
+    """
+    try:
+        with Image.open(filepath) as img:
+            # JPEG 在解码时直接按 1/2~1/8 缩小，不需要解码整张大图
+            img.draft("L", ((hash_size + 1) * 8, hash_size * 8))
+            small = img.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS)
+    except Exception:
+        return None
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = pixels[:, 1:] > pixels[:, :-1]
+    return np.packbits(bits).tobytes().hex()
+
+
+def hamming_distance(a: str, b: str) -> int:
+    """两个十六进制哈希的汉明距离"""
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
@@ -0,0 +1,53 @@
+# 缩略图引擎工作进程的入口：只依赖 PIL 和 app.utils，不导入 app.models，
+# spawn 启动的工作进程导入时不会加载配置、创建索引或启动线程
+from io import BytesIO
+from typing import Any, Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from app.utils.color_features import compute_color_features
+from app.utils.image_decode import fit_size, scale_image
+
+THUMBNAIL_SIZE = (120, 120)
+
+Thumbnail = Tuple[Optional[bytes], Optional[Dict[str, Any]]]  # (JPEG字节, 颜色特征)
+
+
+def create_thumbnail(image_path: str, max_size: Tuple[int, int] = THUMBNAIL_SIZE) -> Thumbnail:
+    """创建图片缩略图，返回 (JPEG字节, 颜色特征)
+
+    原图以较低的分辨率解码（见 scale_image），颜色特征直接由已解码的缩略图计算，不需要再次解码原图。
+    """
+    try:
+        with Image.open(image_path) as img:
+            img = scale_image(img, fit_size(img.size, max_size))
+            if img.mode != 'RGB':
+                img = img.convert('RGB')
+
+            buffer = BytesIO()
+            img.save(buffer, format='JPEG', quality=85)
+            return buffer.getvalue(), compute_color_features(img)
+
+    except Exception as e:
+        print(f"创建缩略图失败: {image_path}, 错误: {e}")
+        return None, None
+
+
+def create_thumbnails(items: List[Tuple[str, Optional[bytes]]],
+                      max_size: Tuple[int, int] = THUMBNAIL_SIZE) -> List[Thumbnail]:
+    """在工作进程中处理一组 (原图路径, 已有缩略图)，一次往返处理多张图片
+
+    已有缩略图的只解码缩略图补算颜色特征。
+    """
+    results = []
+    for path, thumbnail in items:
+        if not thumbnail:
+            results.append(create_thumbnail(path, max_size))
+            continue
+        try:
+            with Image.open(BytesIO(thumbnail)) as img:
+                results.append((thumbnail, compute_color_features(img)))
+        except Exception as e:
+            print(f"计算颜色特征失败: {path}, 错误: {e}")
+            results.append((thumbnail, None))
+    return results
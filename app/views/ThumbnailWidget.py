@@ -1,4 +1,3 @@
-import base64
 from PyQt6.QtCore import Qt, pyqtSlot, QSize, pyqtSignal, QByteArray, QBuffer, QIODevice, QTimer, QThread, QEvent, QRectF
 from PyQt6.QtGui import QIcon, QPixmap, QAction, QColor, QPainter, QPainterPath, QBrush, QPen
 from PyQt6.QtWidgets import QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QFrame, QSizePolicy, QScrollArea, QLabel
@@ -10,7 +9,7 @@ from qfluentwidgets import (FluentIcon as FIF, NavigationItemPosition, CardWidge
                           setTheme, Theme, InfoBar, InfoBarPosition, FlowLayout, SearchLineEdit,
                           HyperlinkButton, TitleLabel, PushButton, ToolTipFilter,
                           PrimaryToolButton, TransparentPushButton, FluentStyleSheet,
-                          ImageLabel, InfoBadge, SingleDirectionScrollArea)
+                          ImageLabel, InfoBadge, SingleDirectionScrollArea, RoundMenu, Action)
 
 MINIMUM_HEIGHT = 160  # 固定高度
 
@@ -137,7 +136,9 @@ class RoundedImageLabel(QWidget):
                     self.parent().hideButton()
                     
             elif event.type() == QEvent.Type.MouseButtonRelease:
-                self.clicked.emit()
+                # 右键用于弹出菜单，不触发选择
+                if event.button() == Qt.MouseButton.LeftButton:
+                    self.clicked.emit()
                 
         return super().eventFilter(obj, event)
 
@@ -147,6 +148,7 @@ class ThumbnailWidget(QWidget):
     itemClicked = pyqtSignal(str)  # 发送点击信号，包含文件名
     excludeClicked = pyqtSignal(str)  # 排除按钮信号
     includeClicked = pyqtSignal(str)  # 恢复按钮信号
+    similarClicked = pyqtSignal(str)  # 查找相似图片信号
     
     def __init__(self, filename, info, is_excluded=False, parent=None):
         super().__init__(parent)
@@ -173,7 +175,11 @@ class ThumbnailWidget(QWidget):
         self.image_label.setExcluded(is_excluded)
         self.image_label.clicked.connect(self._on_image_clicked)
             
-        self.image_label.setToolTip(display_name)
+        # 分辨率取自索引中记录的文件头信息
+        if info.get("width") and info.get("height"):
+            self.image_label.setToolTip(f"{display_name}\n{info['width']} x {info['height']}")
+        else:
+            self.image_label.setToolTip(display_name)
         self.image_label.installEventFilter(ToolTipFilter(self.image_label))
         
         # 创建按钮 (初始隐藏)
@@ -222,11 +228,10 @@ class ThumbnailWidget(QWidget):
     def _load_thumbnail(self):
         """加载缩略图"""
         try:
-            if "view_pic" in self.info and self.info["view_pic"]:
-                # 从base64加载
-                base64_data = self.info["view_pic"]
+            if self.info.get("thumbnail"):
+                # 从缩略图包读取的JPEG字节
                 pixmap = QPixmap()
-                if pixmap.loadFromData(QByteArray.fromBase64(base64_data.encode())):
+                if pixmap.loadFromData(self.info["thumbnail"]):
                     self.image_label.setPixmap(pixmap)
                 else:
                     self.image_label.setText("加载失败\n无效的图片数据")
@@ -236,14 +241,6 @@ class ThumbnailWidget(QWidget):
                 if not pixmap.isNull():
                     # 设置缩略图
                     self.image_label.setPixmap(pixmap)
-                    
-                    # 如果需要，创建并保存缩略图的base64
-                    if "view_pic" not in self.info:
-                        buffer = QBuffer()
-                        buffer.open(QIODevice.OpenModeFlag.WriteOnly)
-                        pixmap.save(buffer, "JPG", 80)
-                        base64_data = base64.b64encode(buffer.data()).decode()
-                        self.info["view_pic"] = base64_data
                 else:
                     self.image_label.setText("加载失败\n无效的图片")
             else:
@@ -284,4 +281,14 @@ class ThumbnailWidget(QWidget):
     
     def _on_image_clicked(self):
         """图片点击事件"""
-        self.itemClicked.emit(self.filename)
\ No newline at end of file
+        self.itemClicked.emit(self.filename)
+    
+    def contextMenuEvent(self, event):
+        """右键菜单"""
+        menu = RoundMenu(parent=self)
+        menu.addAction(Action(FIF.SEARCH, "查找相似", triggered=lambda: self.similarClicked.emit(self.filename)))
+        if self.is_excluded:
+            menu.addAction(Action(FIF.ACCEPT, "恢复此壁纸", triggered=self._on_include_clicked))
+        else:
+            menu.addAction(Action(FIF.CANCEL, "排除此壁纸", triggered=self._on_exclude_clicked))
+        menu.exec(event.globalPos())
\ No newline at end of file
@@ -1,16 +1,25 @@
-from PyQt6.QtWidgets import QDialog, QLabel, QVBoxLayout, QProgressBar, QMessageBox
-from PyQt6.QtCore import Qt
+from PyQt6.QtWidgets import (QDialog, QLabel, QVBoxLayout, QHBoxLayout, QProgressBar, QMessageBox,
+                             QPushButton)
+from PyQt6.QtCore import Qt, pyqtSignal
 
 class ProgressDialog(QDialog):
-    """进度对话框"""
-    def __init__(self, parent=None, title="处理中", message="请稍候..."):
+    """进度对话框
+    
+    cancellable 为 True 时用于后台任务：窗口不阻塞主界面，提供暂停和取消按钮，
+    关闭窗口不会停止任务。
+    """
+    cancelRequested = pyqtSignal()
+    pauseToggled = pyqtSignal(bool)  # 是否暂停
+    
+    def __init__(self, parent=None, title="处理中", message="请稍候...", cancellable=False):
         super().__init__(parent)
         self.setWindowTitle(title)
         self.setMinimumWidth(400)
-        self.setModal(True)
+        self.setModal(not cancellable)
         
         layout = QVBoxLayout(self)
         
+        self.message = message
         self.message_label = QLabel(message)
         layout.addWidget(self.message_label)
         
@@ -20,11 +29,38 @@ class ProgressDialog(QDialog):
         self.progress_bar = QProgressBar()
         self.progress_bar.setRange(0, 100)
         layout.addWidget(self.progress_bar)
+        
+        if cancellable:
+            buttons = QHBoxLayout()
+            buttons.addStretch(1)
+            self.pause_button = QPushButton("暂停")
+            self.pause_button.setCheckable(True)
+            self.pause_button.toggled.connect(self._on_pause_toggled)
+            buttons.addWidget(self.pause_button)
+            self.cancel_button = QPushButton("取消")
+            self.cancel_button.clicked.connect(self._on_cancel_clicked)
+            buttons.addWidget(self.cancel_button)
+            layout.addLayout(buttons)
     
-    def update_progress(self, current, total, text):
-        """更新进度"""
+    def update_progress(self, current, total, text, eta=None):
+        """更新进度，current 为已处理数量，eta 为预计剩余秒数"""
         self.progress_bar.setValue(int(100 * current / max(1, total)))
-        self.progress_label.setText(f"处理中: {current+1}/{total} - {text}")
+        status = f"处理中: {current}/{total} - {text}"
+        if eta is not None and eta >= 0:
+            minutes, seconds = divmod(int(eta), 60)
+            status += f" (剩余约 {minutes}:{seconds:02d})"
+        self.progress_label.setText(status)
+    
+    def _on_pause_toggled(self, paused):
+        self.pause_button.setText("继续" if paused else "暂停")
+        self.message_label.setText("已暂停" if paused else self.message)
+        self.pauseToggled.emit(paused)
+    
+    def _on_cancel_clicked(self):
+        self.cancel_button.setEnabled(False)
+        self.pause_button.setEnabled(False)
+        self.message_label.setText("正在取消...")
+        self.cancelRequested.emit()
 
 def show_error(parent, title, message):
     """显示错误对话框"""
@@ -29,8 +29,10 @@ class GalleryInterface(QFrame):
         # 数据存储
         self.wallpaper_data = {}  # 存储所有壁纸数据
         self.excluded_files = set()  # 排除的壁纸
-        self.current_filter = "all"  # 当前筛选: all, included, excluded
+        self.current_filter = "all"  # 当前筛选: all, included, excluded, duplicates
         self.search_text = ""  # 搜索文本
+        self.similar_to = None  # 查找相似模式下的源壁纸
+        self.similar_keys = []  # 相似壁纸，按相似程度排序
         
         self.setup_ui()
         self.connect_signals()
@@ -59,7 +61,7 @@ class GalleryInterface(QFrame):
         
         # 筛选下拉框
         self.filter_combo = ComboBox()
-        self.filter_combo.addItems(["所有壁纸", "已启用", "已排除"])
+        self.filter_combo.addItems(["所有壁纸", "已启用", "已排除", "重复图片"])
         self.filter_combo.setCurrentIndex(0)
         self.filter_combo.setMinimumWidth(100)
         self.filter_combo.currentIndexChanged.connect(self.on_filter_changed)
@@ -246,14 +248,24 @@ class GalleryInterface(QFrame):
             self._show_empty_message()
             return
     
-        # 排序 (按文件名)
-        sorted_items = sorted(filtered_data.items(), key=lambda x: x[0])
+        # 相似图片和重复分组保持相似程度/分组顺序，其余按文件名排序
+        if self._is_grouped_view():
+            sorted_items = list(filtered_data.items())
+        else:
+            sorted_items = sorted(filtered_data.items(), key=lambda x: x[0])
     
         # 填充流布局
         self._populate_layout(sorted_items)
     
         # 更新状态
-        self.status_label.setText(f"显示 {len(filtered_data)} 张壁纸 (共 {len(self.wallpaper_data)} 张)")
+        if self.similar_to:
+            self.status_label.setText(f"与 {self.similar_to} 相似的壁纸 {len(filtered_data) - (self.similar_to in filtered_data)} 张")
+        else:
+            self.status_label.setText(f"显示 {len(filtered_data)} 张壁纸 (共 {len(self.wallpaper_data)} 张)")
+    
+    def _is_grouped_view(self):
+        """是否为查找相似或重复图片视图"""
+        return bool(self.similar_to) or self.current_filter == "duplicates"
     
     def _clear_layout(self):
         """清空布局"""
@@ -283,7 +295,21 @@ class GalleryInterface(QFrame):
         """过滤壁纸数据"""
         filtered_data = {}
         
-        for filename, info in self.wallpaper_data.items():
+        # 搜索通过索引的三元组索引完成，不再逐条比较
+        matches = self.controller.search_wallpapers(self.search_text) if self.search_text else None
+        
+        # 查找相似时源壁纸在最前；重复图片按分组顺序排列
+        if self.similar_to:
+            keys = [self.similar_to] + self.similar_keys
+        elif self.current_filter == "duplicates":
+            keys = [key for group in self.controller.get_duplicate_groups() for key in group]
+        else:
+            keys = self.wallpaper_data
+        
+        for filename in keys:
+            info = self.wallpaper_data.get(filename)
+            if info is None:
+                continue
             is_excluded = info.get("excluded", False)
             
             # 应用筛选
@@ -294,11 +320,8 @@ class GalleryInterface(QFrame):
                 continue
                 
             # 应用搜索
-            if self.search_text:
-                display_name = info.get("display_name", filename)
-                if (self.search_text.lower() not in display_name.lower() and 
-                    self.search_text.lower() not in filename.lower()):
-                    continue
+            if matches is not None and filename not in matches:
+                continue
             
             filtered_data[filename] = info
         
@@ -309,12 +332,16 @@ class GalleryInterface(QFrame):
         empty_label = BodyLabel()
         empty_label.setObjectName("emptyLabel")
         
-        if self.search_text:
+        if self.similar_to:
+            empty_label.setText("没有找到相似的壁纸")
+        elif self.search_text:
             empty_label.setText(f"没有找到包含 '{self.search_text}' 的壁纸")
         elif self.filter_combo.currentIndex() == 1:
             empty_label.setText("没有已启用的壁纸")
         elif self.filter_combo.currentIndex() == 2:
             empty_label.setText("没有已排除的壁纸")
+        elif self.filter_combo.currentIndex() == 3:
+            empty_label.setText("没有发现重复的壁纸")
         else:
             empty_label.setText("没有壁纸数据\n请确保壁纸目录中有图片文件")
         
@@ -340,14 +367,16 @@ class GalleryInterface(QFrame):
             thumbnail.itemClicked.connect(self._on_thumbnail_clicked)
             thumbnail.excludeClicked.connect(self._on_exclude_wallpaper)
             thumbnail.includeClicked.connect(self._on_include_wallpaper)
+            thumbnail.similarClicked.connect(self._on_find_similar)
             
             # 添加到流布局
             self.flow_layout.addWidget(thumbnail)
     
     def on_filter_changed(self):
         """筛选条件改变时异步刷新"""
-        filter_names = ["all", "included", "excluded"]
+        filter_names = ["all", "included", "excluded", "duplicates"]
         self.current_filter = filter_names[self.filter_combo.currentIndex()]
+        self.similar_to = None
         
         # 立即执行刷新显示
         self.refresh_display()
@@ -367,6 +396,7 @@ class GalleryInterface(QFrame):
     def _do_search(self):
         """执行搜索时异步刷新"""
         self.search_text = self.search_input.text().strip()
+        self.similar_to = None
         
         # 立即执行刷新显示
         self.refresh_display()
@@ -393,6 +423,16 @@ class GalleryInterface(QFrame):
                 parent=self
             )
     
+    def _on_find_similar(self, filename):
+        """查找与指定壁纸相似的壁纸"""
+        try:
+            self.similar_keys = self.controller.find_similar_wallpapers(filename)
+            self.similar_to = filename
+            self.refresh_display()
+        except Exception as e:
+            print(f"查找相似壁纸时出错: {e}")
+            self.show_error(f"查找相似壁纸失败: {str(e)}")
+    
     def _on_exclude_wallpaper(self, filename):
         """将壁纸添加到排除列表"""
         try:
@@ -458,9 +498,10 @@ class GalleryInterface(QFrame):
             # self.show_loading("正在刷新图库...")
             
             # 获取当前筛选和搜索
-            filter_names = ["all", "included", "excluded"]
+            filter_names = ["all", "included", "excluded", "duplicates"]
             current_filter = filter_names[self.filter_combo.currentIndex()]
             search_text = self.search_input.text().strip()
+            self.similar_to = None
             
             # 创建并启动异步线程
             self.refresh_thread = GalleryRefreshThread(
@@ -625,10 +666,20 @@ class GalleryRefreshThread(QThread):
                 # 过滤数据(如果需要)
                 filtered_data = {}
                 total = len(wallpaper_data)
+                matches = self.controller.search_wallpapers(self.filter_text) if self.filter_text else None
                 
-                for i, (filename, info) in enumerate(wallpaper_data.items()):
+                # 重复图片按分组顺序排列
+                if self.filter_mode == "duplicates":
+                    keys = [key for group in self.controller.get_duplicate_groups() for key in group]
+                else:
+                    keys = list(wallpaper_data)
+                
+                for i, filename in enumerate(keys):
                     # 发送进度信号
                     self.progress.emit(int((i / total) * 100) if total > 0 else 0)
+                    info = wallpaper_data.get(filename)
+                    if info is None:
+                        continue
                     
                     # 应用过滤规则 (如果数据量大，这部分可以移到主线程做)
                     is_excluded = info.get("excluded", False)
@@ -640,11 +691,8 @@ class GalleryRefreshThread(QThread):
                         continue
                         
                     # 应用搜索
-                    if self.filter_text:
-                        display_name = info.get("display_name", filename)
-                        if (self.filter_text.lower() not in display_name.lower() and 
-                            self.filter_text.lower() not in filename.lower()):
-                            continue
+                    if matches is not None and filename not in matches:
+                        continue
                     
                     filtered_data[filename] = info
                 
@@ -1,5 +1,5 @@
 from PyQt6.QtCore import Qt, pyqtSlot, QSize, pyqtSignal
-from PyQt6.QtGui import QIcon, QPixmap, QAction, QColor
+from PyQt6.QtGui import QIcon, QPixmap, QAction, QColor, QImageReader
 from PyQt6.QtWidgets import QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QFrame, QSizePolicy
 import os  # 确保导入os模块
 
@@ -10,6 +10,7 @@ from qfluentwidgets import (FluentWindow, FluentIcon as FIF, NavigationItemPosit
                           setTheme, Theme, InfoBar, InfoBarPosition,PrimaryToolButton,ToolTipFilter)
 
 from .crop_view import CropGraphicsView
+from ..utils.image_decode import fit_size
 
 class HomeInterface(QFrame):
     """主页界面"""
@@ -194,10 +195,19 @@ class HomeInterface(QFrame):
             info (dict): 壁纸信息
         """
         try:
-            # 加载图片
-            pixmap = QPixmap(info["path"])
+            # 加载图片：预览不需要超过屏幕的分辨率，按屏幕长边缩小解码（JPEG 直接按 DCT 缩放解码）；
+            # 裁剪时按场景与原图的尺寸比例换算坐标，不依赖预览的分辨率
+            reader = QImageReader(info["path"])
+            size = reader.size()
+            if size.isValid():
+                screen = self.screen()
+                edge = max(screen.size().width(), screen.size().height()) * screen.devicePixelRatio()
+                width, height = fit_size((size.width(), size.height()), (int(edge), int(edge)))
+                if (width, height) != (size.width(), size.height()):
+                    reader.setScaledSize(QSize(width, height))
+            pixmap = QPixmap.fromImage(reader.read())
             if pixmap.isNull():
-                raise Exception("无法加载图片")
+                raise Exception(f"无法加载图片: {reader.errorString()}")
                 
             # 显示图片
             self.image_view.setImage(pixmap)
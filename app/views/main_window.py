@@ -235,5 +235,7 @@ class WallpaperMainWindow(FluentWindow):
             # 阻止应用关闭
             event.ignore()
         else:
-            # 否则执行默认的关闭操作
+            # 否则执行默认的关闭操作，退出前写入所有未保存的修改
+            if hasattr(self.controller, 'cleanup'):
+                self.controller.cleanup()
             super().closeEvent(event)
\ No newline at end of file
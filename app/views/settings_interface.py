@@ -11,7 +11,7 @@ from qfluentwidgets import (FluentWindow, FluentIcon as FIF, NavigationItemPosit
                           SwitchButton, ComboBox, TitleLabel, SubtitleLabel, CaptionLabel, 
                           setTheme, Theme, InfoBar, InfoBarPosition, CardWidget, 
                           ScrollArea, ExpandLayout, SettingCardGroup, SwitchSettingCard,
-                          ComboBoxSettingCard, PushSettingCard, LineEdit, 
+                          ComboBoxSettingCard, PushSettingCard, FolderListSettingCard, RangeSettingCard, LineEdit, 
                           ConfigItem, QConfig, OptionsConfigItem, OptionsValidator, 
                           BoolValidator, FolderValidator, pyqtSignal)
 import os
@@ -84,6 +84,7 @@ class SettingsInterface(QFrame):
         # 创建各个设置组
         self.create_general_group()
         self.create_directory_group()
+        self.create_cache_group()
         self.create_display_group()
         self.create_realesrgan_group()
         
@@ -112,6 +113,14 @@ class SettingsInterface(QFrame):
         self.config.realesrganEnabled.valueChanged.connect(self._notify_settings_changed)
         self.config.realesrganScale.valueChanged.connect(self._notify_settings_changed)
         self.config.realesrganModel.valueChanged.connect(self._notify_settings_changed)
+        
+        # 缓存设置
+        self.config.renderCacheLimit.valueChanged.connect(self._on_render_cache_limit_changed)
+    
+    def showEvent(self, event):
+        """每次显示设置页时刷新缓存统计"""
+        super().showEvent(event)
+        self.update_cache_stats()
     
     def _on_defaultTheme_changed(self, defaultTheme):
         """主题改变时的处理"""
@@ -136,6 +145,12 @@ class SettingsInterface(QFrame):
         self.config.set(self.config.cacheDir, folder)
         self._notify_settings_changed()
     
+    def _on_render_cache_limit_changed(self, value):
+        """渲染缓存预算改变时的处理"""
+        self._notify_settings_changed()
+        if hasattr(self.controller, 'trim_render_cache'):
+            self.controller.trim_render_cache()
+    
     def _on_tools_dir_changed(self, folder):
         """工具目录改变时的处理"""
         self.config.set(self.config.toolsDir, folder)
@@ -235,6 +250,17 @@ class SettingsInterface(QFrame):
         self.wallpaper_dir_card.clicked.connect(self.browse_wallpaper_dir)
         directory_group.addSettingCard(self.wallpaper_dir_card)
         
+        # 附加壁纸目录（每个目录有独立的索引分片，刷新索引后生效）
+        self.extra_dirs_card = FolderListSettingCard(
+            self.config.extraWallpaperDirs,
+            "附加壁纸目录",
+            "其他磁盘上的壁纸文件夹，未连接的目录会被跳过",
+            directory=self.config.wallpaperDir.value,
+            parent=directory_group
+        )
+        self.extra_dirs_card.folderChanged.connect(self._notify_settings_changed)
+        directory_group.addSettingCard(self.extra_dirs_card)
+        
         # 缓存目录
         self.cache_dir_card = PushSettingCard(
             "选择文件夹",
@@ -259,6 +285,65 @@ class SettingsInterface(QFrame):
         
         self.scroll_layout.addWidget(directory_group)
     
+    def create_cache_group(self):
+        """创建缓存设置组"""
+        cache_group = SettingCardGroup("缓存设置", self.scroll_content)
+        
+        # 渲染缓存预算（MB）
+        self.render_cache_limit_card = RangeSettingCard(
+            self.config.renderCacheLimit,
+            FIF.SAVE,
+            "渲染缓存上限 (MB)",
+            "超出后自动删除最久未使用的裁剪结果，当前壁纸不会被删除",
+            parent=cache_group
+        )
+        cache_group.addSettingCard(self.render_cache_limit_card)
+        
+        # 缓存统计和清理
+        self.cache_stats_card = PushSettingCard(
+            "立即清理",
+            FIF.BROOM,
+            "渲染缓存",
+            "",
+            parent=cache_group
+        )
+        self.cache_stats_card.clicked.connect(self.cleanup_cache)
+        cache_group.addSettingCard(self.cache_stats_card)
+        
+        self.scroll_layout.addWidget(cache_group)
+    
+    def update_cache_stats(self):
+        """刷新渲染缓存统计"""
+        if not hasattr(self.controller, 'get_render_cache_stats'):
+            return
+        try:
+            stats = self.controller.get_render_cache_stats()
+            mb = 1024 * 1024
+            self.cache_stats_card.setContent(
+                f"{stats['entries']} 个文件, {stats['size'] / mb:.1f} / {stats['max_bytes'] / mb:.0f} MB, "
+                f"命中 {stats['hits']} 次, 未命中 {stats['misses']} 次 ({stats['hit_rate']:.0%}), "
+                f"已淘汰 {stats['evictions']} 个"
+            )
+        except Exception as e:
+            print(f"读取缓存统计失败: {e}")
+    
+    def cleanup_cache(self):
+        """清理无效缓存并刷新统计"""
+        try:
+            deleted = self.controller.cleanup_cache()
+            self.update_cache_stats()
+            InfoBar.success(
+                title='清理完成',
+                content=f"已删除 {deleted} 个缓存文件",
+                orient=Qt.Orientation.Horizontal,
+                isClosable=True,
+                position=InfoBarPosition.TOP_RIGHT,
+                duration=3000,
+                parent=self
+            )
+        except Exception as e:
+            self.show_error(f"清理缓存失败: {str(e)}")
+    
     def create_display_group(self):
         """创建显示设置组"""
         display_group = SettingCardGroup("显示设置", self.scroll_content)
@@ -0,0 +1,80 @@
+"""颜色查询延迟：逐个图片计算 vs 颜色特征矩阵
+
+用法: python benchmarks/color_query.py [数量]
+默认 100k 条合成颜色特征。
+"""
+import os
+import sys
+import time
+import random
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.color_index import ColorIndex  # noqa: E402
+from app.utils.color_features import compute_color_features, parse_palette, rgb_to_lab  # noqa: E402
+
+
+def synthetic_palettes(count):
+    rng = random.Random(0)
+    result = []
+    for i in range(count):
+        colors = [bytes(rng.randrange(256) for _ in range(3)) for _ in range(5)]
+        weights = sorted((rng.randrange(1, 256) for _ in range(5)), reverse=True)
+        palette = b"".join(color + bytes([weight]) for color, weight in zip(colors, weights)).hex()
+        result.append((f"{i:08d}.jpg", rng.random(), rng.random() * 100, palette))
+    return result
+
+
+def scan_nearest_color(features, rgb, limit):
+    """旧方式：逐张图片解析主色并计算距离"""
+    target = rgb_to_lab(np.asarray(rgb, dtype=np.float32))
+    scores = []
+    for key, _, _, palette in features:
+        colors, weights = parse_palette(palette)
+        scores.append((float(np.linalg.norm(colors[weights >= 0.05] - target, axis=-1).min()), key))
+    scores.sort()
+    return scores[:limit]
+
+
+def timed(func, *args, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    features = synthetic_palettes(count)
+
+    from PIL import Image
+    thumb = Image.fromarray((np.random.default_rng(0).random((90, 120, 3)) * 255).astype(np.uint8))
+    compute_time, _ = timed(compute_color_features, thumb, repeat=50)
+    print(f"单张缩略图计算颜色特征: {compute_time * 1000:.2f} ms")
+
+    index = ColorIndex()
+    start = time.perf_counter()
+    index.add_many((key, (luminance, colorfulness, palette))
+                   for key, luminance, colorfulness, palette in features)
+    print(f"{count} 条建立矩阵: {time.perf_counter() - start:.2f} s")
+
+    dark_time, dark = timed(index.by_luminance, 0.25)
+    print(f"  暗色壁纸: {dark_time * 1000:8.1f} ms ({len(dark)} 张)")
+    palette_time, _ = timed(index.similar_palette, features[0][3], 50)
+    print(f"  相似主色 (前50): {palette_time * 1000:8.1f} ms")
+    color_time, nearest = timed(index.nearest_color, (200, 40, 40), 50)
+    scan_time, scanned = timed(scan_nearest_color, features, (200, 40, 40), 50, repeat=1)
+    # 矩阵查询用展开式计算距离，与逐张计算只有浮点误差
+    assert np.allclose([score for score, _ in nearest], [score for score, _ in scanned], atol=1e-2)
+    print(f"  最接近颜色 (前50): 矩阵 {color_time * 1000:8.1f} ms   逐张计算 {scan_time * 1000:8.1f} ms")
+
+    update_time, _ = timed(index.add, features[0][0], 0.5, 50.0, features[1][3])
+    print(f"  单张图片更新: {update_time * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""重新扫描壁纸目录：os.walk + 逐个 stat vs 按目录修改时间跳过未变化的目录
+
+用法: python benchmarks/dir_scan.py [文件数量] [每个目录的文件数]
+默认在临时目录中创建 50k 个空图片文件（每个目录 100 个，两级目录），
+然后修改其中一个目录，比较重新扫描的耗时。
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.dir_scanner import IMAGE_EXTENSIONS, scan_images  # noqa: E402
+
+
+def create_tree(root, count, per_dir):
+    dirs = []
+    for i in range(0, count, per_dir):
+        directory = os.path.join(root, f"g{i // (per_dir * 50):03d}", f"d{i // per_dir:05d}")
+        os.makedirs(directory, exist_ok=True)
+        for j in range(min(per_dir, count - i)):
+            open(os.path.join(directory, f"{i + j:08d}.jpg"), "wb").close()
+        dirs.append(directory)
+    # 目录修改时间放到过去，避免落在时间精度的保护区间内
+    past = time.time() - 3600
+    for dirpath, _, _ in os.walk(root):
+        os.utime(dirpath, (past, past))
+    return dirs
+
+
+def walk_and_stat(root):
+    """旧方式：列出全部目录并逐个 stat"""
+    result = []
+    for dirpath, _, files in os.walk(root):
+        for file in files:
+            if file.lower().endswith(IMAGE_EXTENSIONS):
+                filepath = os.path.join(dirpath, file)
+                result.append((filepath, os.stat(filepath)))
+    return result
+
+
+def known_by_dir(root, paths):
+    known = {}
+    for path in paths:
+        known.setdefault(os.path.relpath(os.path.dirname(path), root), []).append(path)
+    known[""] = known.pop(os.curdir, [])
+    return known
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    per_dir = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    root = tempfile.mkdtemp(prefix="dir_scan_")
+    try:
+        start = time.perf_counter()
+        dirs = create_tree(root, count, per_dir)
+        print(f"创建 {count} 个文件, {len(dirs)} 个目录: {time.perf_counter() - start:.1f} s")
+
+        start = time.perf_counter()
+        walked = walk_and_stat(root)
+        print(f"os.walk + stat:        {time.perf_counter() - start:8.3f} s ({len(walked)} 个文件)")
+
+        tree = {}
+        start = time.perf_counter()
+        first = list(scan_images(root, tree=tree))
+        print(f"scandir 首次扫描:      {time.perf_counter() - start:8.3f} s ({len(first)} 个文件)")
+        assert sorted(path for path, _, _ in first) == sorted(path for path, _ in walked)
+
+        # 修改一个目录后重新扫描
+        open(os.path.join(dirs[len(dirs) // 2], "added.jpg"), "wb").close()
+        known = known_by_dir(root, [path for path, _, _ in first])
+        start = time.perf_counter()
+        rescan = list(scan_images(root, tree, known, {}))
+        elapsed = time.perf_counter() - start
+        listed = sum(1 for _, _, unchanged in rescan if not unchanged)
+        print(f"scandir 按目录记录重扫: {elapsed:8.3f} s ({len(rescan)} 个文件, 重新列出 {listed} 个)")
+        assert len(rescan) == len(first) + 1
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
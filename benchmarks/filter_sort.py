@@ -0,0 +1,102 @@
+"""过滤 + 排序 + 搜索延迟：逐个查询图片 vs 二级索引
+
+用法: python benchmarks/filter_sort.py [数量]
+默认 100k 条合成数据。
+"""
+import os
+import sys
+import time
+import random
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.index_manager import IndexManager  # noqa: E402
+from app.models.index_store import SqliteIndexStore  # noqa: E402
+
+
+def synthetic_index(count):
+    rng = random.Random(0)
+    wallpapers = {}
+    for i in range(count):
+        name = f"IMG_{rng.randrange(10**7):07d}.jpg"
+        wallpapers[f"{i:012x}_{name}"] = {
+            "path": os.path.join(os.sep, "wallpapers", name),
+            "relative_path": name,
+            "hash": f"{i:032x}",
+            "excluded": rng.random() < 0.05,
+            "last_accessed": 1.7e9 + rng.random() * 1e7,
+            "added_date": 1.7e9 + rng.random() * 1e7,
+        }
+    return {"wallpapers": wallpapers, "total_count": count}
+
+
+def scan_filter_sort(index, sort_by):
+    """旧实现：遍历过滤，再通过图片对象排序"""
+    keys = [k for k, v in index.wallpaper_index.items() if not v.excluded]
+    pictures = index.wallpaper_index
+    if sort_by == "filename":
+        keys.sort(key=lambda k: pictures[k].display_name.lower())
+    elif sort_by == "date":
+        keys.sort(key=lambda k: pictures[k].added_date)
+    else:
+        keys.sort(key=lambda k: pictures[k].last_accessed, reverse=True)
+    return keys
+
+
+def indexed_filter_sort(index, sort_by):
+    if sort_by == "filename":
+        return index.get_sorted_keys("name", excluded=False)
+    if sort_by == "date":
+        return index.get_sorted_keys("added", excluded=False)
+    return index.get_sorted_keys("accessed", excluded=False, reverse=True)
+
+
+def timed(func, *args, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    with tempfile.TemporaryDirectory() as temp_dir:
+        index = IndexManager(store=SqliteIndexStore(os.path.join(temp_dir, "index.db")))
+        index._load_dict(synthetic_index(count))
+
+        print(f"{count} 条")
+        for sort_by in ("filename", "date", "access"):
+            scan_time, scan_keys = timed(scan_filter_sort, index, sort_by)
+            # 修改后的首次查询需要重新过滤，之后命中缓存
+            cold_time, indexed_keys = timed(
+                lambda: (index.indexes._cache.clear(), indexed_filter_sort(index, sort_by))[1])
+            warm_time, _ = timed(indexed_filter_sort, index, sort_by)
+            assert scan_keys == indexed_keys
+            print(f"  {sort_by:>8}: 遍历排序 {scan_time * 1000:8.1f} ms   "
+                  f"二级索引 {cold_time * 1000:8.1f} ms (缓存 {warm_time * 1000:.1f} ms)")
+
+        target = f"{count - 1:032x}"
+        scan_time, _ = timed(lambda: next(k for k, v in index.wallpaper_index.items() if v.hash == target))
+        indexed_time, _ = timed(index.search_by_hash, target)
+        print(f"  按哈希查找: 遍历 {scan_time * 1000:8.3f} ms   二级索引 {indexed_time * 1000:8.3f} ms")
+
+        for query in ("IMG_12345", "img_99 jpg", "7"):
+            terms = query.lower().split()
+            scan_time, scan_result = timed(lambda: {
+                k for k, v in index.wallpaper_index.items()
+                if all(t in v.display_name.lower() or t in v.relative_path.lower() for t in terms)})
+            indexed_time, indexed_result = timed(index.search_by_name, query)
+            assert scan_result == set(indexed_result)
+            print(f"  搜索 {query!r:>14}: 遍历 {scan_time * 1000:8.3f} ms   "
+                  f"三元组索引 {indexed_time * 1000:8.3f} ms ({len(indexed_result)} 条)")
+
+        key = next(iter(index.wallpaper_index))
+        update_time, _ = timed(index.get_picture(key).set_excluded, True)
+        print(f"  单张图片修改后的索引维护: {update_time * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""缩小解码：完整解码 + Lanczos vs scale_image（JPEG DCT 缩放 / reduce() + Lanczos）
+
+用法: python benchmarks/image_decode.py [宽度] [重复次数] [最低PSNR]
+默认在临时目录中生成 6000x4000 的 JPEG、PNG、WEBP 照片式图片，分别缩小为
+缩略图（120x120 以内）和屏幕尺寸（1920x1080 以内），输出每种格式的耗时、加速比，
+以及快速路径结果相对完整解码结果的 PSNR，低于最低 PSNR（默认 30 dB）时报错。
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.image_decode import FIT_REDUCING_GAP, REDUCING_GAP, fit_size, scale_image  # noqa: E402
+
+FORMATS = (("JPEG", ".jpg", {"quality": 90}), ("PNG", ".png", {"compress_level": 1}),
+           ("WEBP", ".webp", {"quality": 90}))
+# (名称, 尺寸上限, 两阶段缩小的间隔)，与缩略图和适配屏幕时使用的一致
+TARGETS = (("缩略图", (120, 120), REDUCING_GAP), ("屏幕", (1920, 1080), FIT_REDUCING_GAP))
+
+
+def create_image(width):
+    """渐变、色块和噪声组成的照片式图片"""
+    height = width * 2 // 3
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    pixels = np.stack([x / width * 255, y / height * 255, (np.sin(x / 97) + np.cos(y / 61) + 2) * 64], axis=-1)
+    for _ in range(40):
+        cx, cy, r = rng.integers(0, width), rng.integers(0, height), rng.integers(width // 40, width // 8)
+        mask = (x - cx) ** 2 + (y - cy) ** 2 < r * r
+        pixels[mask] = rng.integers(0, 256, size=3)
+    pixels += rng.normal(0, 6, size=pixels.shape)
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+
+def full_decode(path, bounds):
+    """旧方式：解码整张图片后直接 Lanczos"""
+    with Image.open(path) as img:
+        img.load()
+        return img.resize(fit_size(img.size, bounds), Image.LANCZOS)
+
+
+def fast_decode(path, bounds, reducing_gap):
+    with Image.open(path) as img:
+        return scale_image(img, fit_size(img.size, bounds), reducing_gap)
+
+
+def psnr(a, b):
+    diff = np.asarray(a, dtype=np.float64) - np.asarray(b, dtype=np.float64)
+    mse = np.mean(diff * diff)
+    return float("inf") if mse == 0 else 10 * np.log10(255 * 255 / mse)
+
+
+def timed(func, repeat):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    width = int(sys.argv[1]) if len(sys.argv) > 1 else 6000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    min_psnr = float(sys.argv[3]) if len(sys.argv) > 3 else 30.0
+    root = tempfile.mkdtemp(prefix="image_decode_")
+    try:
+        image = create_image(width)
+        print(f"图片尺寸 {image.size[0]}x{image.size[1]}，每项取 {repeat} 次中最快的一次")
+        failed = False
+        for name, ext, options in FORMATS:
+            path = os.path.join(root, f"sample{ext}")
+            image.save(path, name, **options)
+            for label, bounds, reducing_gap in TARGETS:
+                full_time, reference = timed(lambda: full_decode(path, bounds), repeat)
+                fast_time, result = timed(lambda: fast_decode(path, bounds, reducing_gap), repeat)
+                assert result.size == reference.size, (result.size, reference.size)
+                quality = psnr(result, reference)
+                failed |= quality < min_psnr
+                print(f"{name:<5} {label:<4} 完整解码 {full_time * 1000:8.1f} ms  快速 {fast_time * 1000:8.1f} ms  "
+                      f"加速 {full_time / fast_time:5.1f}x  PSNR {quality:5.1f} dB")
+        if failed:
+            raise SystemExit(f"PSNR 低于 {min_psnr} dB")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
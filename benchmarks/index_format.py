@@ -0,0 +1,75 @@
+"""索引快照格式对比：JSON vs 二进制
+
+分别测量编码、解码耗时和文件大小，并校验二进制格式往返后数据不变。
+用法: python benchmarks/index_format.py [数量 ...]
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.binary_index import BinaryIndexStore  # noqa: E402
+from app.models.index_store import JsonIndexStore  # noqa: E402
+
+
+def synthetic_index(count):
+    wallpapers = {}
+    for i in range(count):
+        rel_path = os.path.join(f"set_{i // 500:05d}", f"IMG_{i:07d}.jpg")
+        wallpapers[f"{i:012x}_IMG_{i:07d}.jpg"] = {
+            "path": os.path.join(os.sep, "wallpapers", rel_path),
+            "relative_path": rel_path,
+            "hash": f"{i:032x}",
+            "hash_algo": "md5",
+            "sample_hash": f"{i:032x}",
+            "display_name": os.path.basename(rel_path),
+            "crop_region": {"x": 0.1, "y": 0.1, "width": 0.8, "height": 0.8} if i % 10 == 0 else None,
+            "cache_path": None,
+            "thumb_ref": [i * 4096, 4000],
+            "excluded": i % 50 == 0,
+            "last_accessed": 1.7e9 + i,
+            "added_date": 1.7e9 + i,
+            "file_size": 1 << 20,
+            "mtime_ns": 1 << 60,
+            "inode": i,
+            "device": 2049,
+        }
+    return {"wallpapers": wallpapers, "total_count": count, "last_updated": time.time()}
+
+
+def timed(func, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def measure(store, data):
+    save_time, _ = timed(lambda: store.save(data))
+    load_time, loaded = timed(store.load)
+    return save_time, load_time, os.path.getsize(store.path), loaded
+
+
+def main():
+    counts = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000]
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for count in counts:
+            data = synthetic_index(count)
+            print(f"{count} 条")
+            for name, store in (
+                    ("JSON", JsonIndexStore(os.path.join(temp_dir, f"index_{count}.json"))),
+                    ("二进制", BinaryIndexStore(os.path.join(temp_dir, f"index_{count}.bin")))):
+                save_time, load_time, size, loaded = measure(store, data)
+                # 往返后的数据与原数据一致
+                assert json.dumps(loaded, sort_keys=True) == json.dumps(data, sort_keys=True)
+                print(f"  {name:>4}: 保存 {save_time * 1000:8.1f} ms   加载 {load_time * 1000:8.1f} ms   "
+                      f"大小 {size / 1024 / 1024:6.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
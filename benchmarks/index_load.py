@@ -0,0 +1,71 @@
+"""索引加载耗时：完整加载 vs 两阶段延迟加载
+
+分别测量"首张壁纸可用"（核心字段加载完成）和"完整加载"两个时间点。
+用法: python benchmarks/index_load.py [数量 ...]
+"""
+import os
+import sys
+import time
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.index_manager import IndexManager  # noqa: E402
+from app.models.index_store import SqliteIndexStore  # noqa: E402
+
+
+def synthetic_index(count):
+    wallpapers = {}
+    for i in range(count):
+        rel_path = os.path.join(f"set_{i // 500:05d}", f"IMG_{i:07d}.jpg")
+        wallpapers[f"{i:012x}_IMG_{i:07d}.jpg"] = {
+            "path": os.path.join(os.sep, "wallpapers", rel_path),
+            "relative_path": rel_path,
+            "hash": f"{i:032x}",
+            "hash_algo": "md5",
+            "sample_hash": f"{i:032x}",
+            "display_name": os.path.basename(rel_path),
+            "crop_region": {"x": 0.1, "y": 0.1, "width": 0.8, "height": 0.8} if i % 10 == 0 else None,
+            "cache_path": None,
+            "thumb_ref": [i * 4096, 4000],
+            "excluded": i % 50 == 0,
+            "last_accessed": 1.7e9 + i,
+            "added_date": 1.7e9 + i,
+            "file_size": 1 << 20,
+            "mtime_ns": 1 << 60,
+            "inode": i,
+            "device": 2049,
+        }
+    return {"wallpapers": wallpapers, "total_count": count, "last_updated": time.time()}
+
+
+def measure(path, lazy):
+    index = IndexManager(store=SqliteIndexStore(path))
+    start = time.perf_counter()
+    index.load_index(lazy=lazy)
+    # 模拟首张壁纸：过滤 + 选择 + 读取详细信息
+    keys = index.get_filtered_keys(excluded=False)
+    index.wallpaper_index[keys[len(keys) // 2]].to_dict()
+    first = time.perf_counter() - start
+    index.wait_loaded()
+    full = time.perf_counter() - start
+    index.store.close()
+    return first, full
+
+
+def main():
+    counts = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000]
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for count in counts:
+            path = os.path.join(temp_dir, f"index_{count}.db")
+            store = SqliteIndexStore(path)
+            store.save(synthetic_index(count))
+            store.close()
+            eager_first, eager_full = measure(path, lazy=False)
+            lazy_first, lazy_full = measure(path, lazy=True)
+            print(f"{count:>8} 条  完整加载: 首张 {eager_first:.3f}s / 完整 {eager_full:.3f}s   "
+                  f"延迟加载: 首张 {lazy_first:.3f}s / 完整 {lazy_full:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
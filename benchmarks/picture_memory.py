@@ -0,0 +1,79 @@
+"""Picture 内存占用对比：旧的 __dict__ 表示 vs 当前的 __slots__ 表示
+
+用法: python benchmarks/picture_memory.py [数量 ...]
+默认测量 10k / 100k / 1M 条合成数据。
+"""
+import os
+import sys
+import datetime
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.picture import Picture  # noqa: E402
+
+ROOT = os.path.join(os.sep, "home", "user", "Pictures", "wallpapers")
+
+
+class LegacyPicture:
+    """旧版 Picture 的字段布局（__dict__、ISO 字符串时间戳、完整路径）"""
+
+    def __init__(self, path, relative_path, file_hash, display_name=None):
+        self.path = path
+        self.relative_path = relative_path
+        self.hash = file_hash
+        self.display_name = display_name or os.path.basename(path)
+        self.crop_region = None
+        self.cache_path = None
+        self.view_pic = None
+        self.excluded = False
+        self.last_accessed = datetime.datetime.now().isoformat()
+        self.added_date = datetime.datetime.now().isoformat()
+        self._modified = False
+
+
+def synthetic_paths(count):
+    """生成合成路径：每个目录 500 张图片"""
+    for i in range(count):
+        rel_dir = os.path.join(f"album_{i // 5000:04d}", f"set_{i // 500:05d}")
+        name = f"IMG_{i:07d}.jpg"
+        yield os.path.join(ROOT, rel_dir, name), os.path.join(rel_dir, name), f"{i:032x}"
+
+
+def measure(factory, count):
+    """返回 (总字节数, 每条字节数)"""
+    tracemalloc.start()
+    items = {}
+    for path, rel_path, file_hash in synthetic_paths(count):
+        items[f"{file_hash[:12]}_{os.path.basename(path)}"] = factory(path, rel_path, file_hash)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del items
+    return current, current / count
+
+
+def new_picture(path, rel_path, file_hash):
+    pic = Picture(path, rel_path, file_hash)
+    pic.sample_hash = file_hash
+    pic.file_size, pic.mtime_ns, pic.inode, pic.device = 1 << 20, 1 << 60, 1 << 30, 2049
+    return pic
+
+
+def legacy_picture(path, rel_path, file_hash):
+    pic = LegacyPicture(path, rel_path, file_hash)
+    pic._listener = lambda p, key=file_hash: None  # 旧版每张图片一个闭包
+    return pic
+
+
+def main():
+    counts = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    print(f"{'数量':>10} {'旧版 MB':>10} {'旧版 B/条':>10} {'新版 MB':>10} {'新版 B/条':>10} {'节省':>7}")
+    for count in counts:
+        old_total, old_each = measure(legacy_picture, count)
+        new_total, new_each = measure(new_picture, count)
+        print(f"{count:>10} {old_total / 2**20:>10.1f} {old_each:>10.0f} "
+              f"{new_total / 2**20:>10.1f} {new_each:>10.0f} {1 - new_total / old_total:>7.0%}")
+
+
+if __name__ == "__main__":
+    main()
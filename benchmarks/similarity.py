@@ -0,0 +1,87 @@
+"""相似图片查找：多索引哈希 vs 两两比较
+
+用法: python benchmarks/similarity.py [数量] [两两比较的数量]
+默认 100k 条合成感知哈希，约三分之一带有翻转了几位的“副本”；
+两两比较只在前 2000 条上运行，用来验证分组结果一致。
+"""
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.similarity_index import DEFAULT_RADIUS, HammingIndex, cluster_hashes  # noqa: E402
+
+
+def synthetic_hashes(count):
+    rng = random.Random(0)
+    keys, values = [], []
+    while len(keys) < count:
+        value = rng.getrandbits(64)
+        copies = 1 + (rng.random() < 0.3) * rng.randint(1, 3)
+        for _ in range(copies):
+            variant = value
+            for bit in rng.sample(range(64), rng.randint(0, 4)):
+                variant ^= 1 << bit
+            keys.append(f"{len(keys):08d}.jpg")
+            values.append(variant)
+    return keys[:count], values[:count]
+
+
+def naive_groups(keys, values, radius):
+    """两两比较 + 并查集"""
+    parent = list(range(len(keys)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i in range(len(keys)):
+        for j in range(i + 1, len(keys)):
+            if bin(values[i] ^ values[j]).count("1") <= radius:
+                parent[find(i)] = find(j)
+    groups = {}
+    for i, key in enumerate(keys):
+        groups.setdefault(find(i), []).append(key)
+    result = [sorted(group) for group in groups.values() if len(group) > 1]
+    result.sort(key=lambda group: (-len(group), group[0]))
+    return result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    naive_count = int(sys.argv[2]) if len(sys.argv) > 2 else 2_000
+    keys, values = synthetic_hashes(count)
+    radius = DEFAULT_RADIUS
+
+    start = time.perf_counter()
+    naive = naive_groups(keys[:naive_count], values[:naive_count], radius)
+    naive_time = time.perf_counter() - start
+    start = time.perf_counter()
+    indexed = cluster_hashes(keys[:naive_count], values[:naive_count], radius)
+    indexed_time = time.perf_counter() - start
+    assert naive == indexed
+    print(f"{naive_count} 条分组: 两两比较 {naive_time * 1000:8.1f} ms   "
+          f"多索引哈希 {indexed_time * 1000:8.1f} ms ({len(indexed)} 组)")
+
+    start = time.perf_counter()
+    groups = cluster_hashes(keys, values, radius)
+    print(f"{count} 条分组: {time.perf_counter() - start:.2f} s ({len(groups)} 组, "
+          f"{sum(len(group) for group in groups)} 张)")
+
+    index = HammingIndex()
+    start = time.perf_counter()
+    for key, value in zip(keys, values):
+        index.add(key, value)
+    print(f"建立查询索引: {time.perf_counter() - start:.2f} s")
+    start = time.perf_counter()
+    for value in values[:1000]:
+        index.query(value)
+    print(f"单张查找相似: {(time.perf_counter() - start):.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""缩略图生成吞吐量：单线程逐张生成 vs 线程池 vs 进程池（ThumbnailEngine）
+
+用法: python benchmarks/thumbnails.py [图片数量] [工作进程数] [图片宽度]
+默认在临时目录中生成 200 张 4000x2500 的 JPEG，输出每种方式每秒处理的图片数。
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.thumbnail import create_thumbnail  # noqa: E402
+
+
+def create_images(root, count, width):
+    """渐变加噪声的照片式图片，编码后的大小接近真实壁纸"""
+    height = width * 5 // 8
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:height, 0:width]
+    base = np.stack([x * 255 // width, y * 255 // height, (x + y) * 255 // (width + height)], axis=-1)
+    paths = []
+    for i in range(count):
+        path = os.path.join(root, f"{i:05d}.jpg")
+        if i < 4:
+            noise = rng.integers(-24, 24, size=base.shape)
+            Image.fromarray(np.clip(base + noise + i * 8, 0, 255).astype(np.uint8)).save(path, quality=90)
+        else:
+            shutil.copy(paths[i % 4], path)  # 内容相同不影响解码耗时，节省准备时间
+        paths.append(path)
+    return paths
+
+
+def measure(name, count, run):
+    start = time.perf_counter()
+    produced = run()
+    elapsed = time.perf_counter() - start
+    assert produced == count, f"{name}: {produced}/{count}"
+    print(f"{name:<24} {elapsed:8.2f} s {count / elapsed:8.1f} 张/秒")
+
+
+def main():
+    # 在函数内导入：进程池的工作进程（spawn）会重新导入本文件，不应加载配置、创建索引
+    from app.models.thumbnail_engine import ThumbnailEngine
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else (os.cpu_count() or 4)
+    width = int(sys.argv[3]) if len(sys.argv) > 3 else 4000
+    root = tempfile.mkdtemp(prefix="thumbnails_")
+    try:
+        start = time.perf_counter()
+        paths = create_images(root, count, width)
+        print(f"生成 {count} 张 {width} 宽的图片: {time.perf_counter() - start:.1f} s, 工作进程数 {workers}")
+        tasks = [(str(i), path, None) for i, path in enumerate(paths)]
+
+        measure("单线程逐张生成", count,
+                lambda: sum(1 for path in paths if create_thumbnail(path)[0]))
+        measure(f"线程池 x{workers}", count,
+                lambda: sum(1 for result in ThumbnailEngine(workers, processes=False).run(tasks) if result[2]))
+        measure(f"进程池 x{workers}", count,
+                lambda: sum(1 for result in ThumbnailEngine(workers).run(tasks) if result[2]))
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,27 @@
 import sys
 import os
 import argparse
+import multiprocessing
 import random
 from PyQt6.QtWidgets import QApplication
 from PyQt6.QtGui import QIcon
 from qfluentwidgets import setTheme
 
-from app.models.manager import WallpaperManager
-from app.models.wallpaper_model import WallpaperModel
-from app.controllers.wallpaper_controller import WallpaperController
-from app.views.main_window import WallpaperMainWindow
+def main():
+    # 在函数内导入：spawn 启动的缩略图工作进程会重新导入本文件，不应加载配置、创建索引
+    from app.models.manager import WallpaperManager
+    from app.models import wallpaper_index
+    from app.models.wallpaper_model import WallpaperModel
+    from app.controllers.wallpaper_controller import WallpaperController
+    from app.views.main_window import WallpaperMainWindow
 
-from app.models.settings import wallpaperCfg  # 确保配置类已正确导入
+    from app.models.settings import wallpaperCfg  # 确保配置类已正确导入
 
-def main():
     # 命令行参数
     parser = argparse.ArgumentParser(description='壁纸刀')
     parser.add_argument('--cli', action='store_true', help='使用命令行模式')
     parser.add_argument('--rebuild', action='store_true', help='重建索引')
+    parser.add_argument('--verify', action='store_true', help='重建索引时强制重新计算所有文件的哈希')
     args = parser.parse_args()
     
     # 初始化核心组件
@@ -29,9 +33,10 @@ def main():
     if args.cli:
         # 命令行模式
         print("命令行模式")
-        if not wallpaper_manager.load_index() or args.rebuild:
+        if not wallpaper_index.load_index() or args.rebuild or args.verify:
             print("构建索引中...")
-            wallpaper_manager.build_index(lambda c, t, f: print(f"处理中: {c}/{t} - {f}"))
+            wallpaper_index.build_index(lambda c, t, f: print(f"处理中: {c}/{t} - {f}"),
+                                        verify=args.verify)
         
         # 这里可以实现命令行交互
         while True:
@@ -51,10 +56,12 @@ def main():
         
         # 连接视图和控制器
         controller.set_view(view)
+        # 任何方式退出都写入未保存的修改
+        app.aboutToQuit.connect(controller.cleanup)
         
         # 初始化应用
-        if args.rebuild:
-            controller.rebuild_index()
+        if args.rebuild or args.verify:
+            controller.rebuild_index(verify=args.verify)
             
         if controller.initialize():
             # 显示窗口
@@ -63,4 +70,6 @@ def main():
             sys.exit(app.exec())
 
 if __name__ == "__main__":
+    # 打包后的程序启动缩略图工作进程时需要
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
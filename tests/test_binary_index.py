@@ -0,0 +1,176 @@
+"""二进制索引格式的往返测试和版本迁移测试
+
+往返测试用固定种子随机生成记录（覆盖空值、空字符串和 unicode 路径），
+检查 decode(encode(x)) == x，以及再次编码得到相同的字节。
+"""
+import json
+import random
+import struct
+
+import pytest
+
+from app.models.binary_index import (FORMAT_VERSION, HEADER, MAGIC, MIGRATIONS, RECORD, RECORD_V1,
+                                     BinaryIndexStore, decode_index, encode_index, migrate)
+from app.models.index_store import JsonIndexStore
+
+NAMES = ["a.jpg", "壁纸.png", "ｆｕｌｌｗｉｄｔｈ.webp", "emoji 🌄.jpeg", "space name.bmp", "x"]
+DIRS = ["", "C:\\壁纸\\", "/home/用户/pictures/", "/tmp/ünïcödé/深/层/"]
+
+
+def random_record(rng: random.Random) -> dict:
+    """解码结果形式的完整记录：所有定长字段都存在，空值为 None"""
+    name = rng.choice(NAMES)
+    path = rng.choice(DIRS) + name
+    maybe = lambda value: value if rng.random() < 0.7 else None  # noqa: E731
+    relative_path = rng.choice([name, f"子目录/{name}", "不以文件名结尾", ""])
+    record = {
+        "path": path,
+        "relative_path": relative_path,
+        "hash": maybe(f"{rng.getrandbits(128):032x}"),
+        "hash_algo": maybe(rng.choice(["md5", "blake2b", "sha256"])),
+        "sample_hash": maybe(f"{rng.getrandbits(64):016x}"),
+        "display_name": rng.choice([name, "显示名称", "", "🌄"]),
+        "crop_region": maybe({"x": rng.uniform(0, 100), "y": 0.0, "width": 1.5, "height": rng.uniform(1, 9)}),
+        "cache_path": maybe(rng.choice(["", "renders/ab/cd/key.jpg", "缓存/裁剪.png"])),
+        "thumb_ref": maybe([rng.randrange(0, 2 ** 40), rng.randrange(0, 2 ** 20)]),
+        "excluded": rng.random() < 0.3,
+        "last_accessed": rng.choice([0.0, rng.uniform(0, 2e9)]),
+        "added_date": rng.uniform(0, 2e9),
+        "file_size": maybe(rng.randrange(0, 2 ** 40)),
+        "mtime_ns": maybe(rng.randrange(0, 2 ** 62)),
+        "inode": maybe(rng.randrange(0, 2 ** 64 - 1)),
+        "device": maybe(rng.randrange(0, 2 ** 63)),
+        "phash": maybe(f"{rng.getrandbits(64):016x}"),
+    }
+    if rng.random() < 0.5:
+        # 定长字段以外的字段保存在 extra JSON 中
+        record.update({"width": rng.randrange(1, 10000), "height": None,
+                       "palette": "ff0000ff", "luminance": rng.random(), "备注": "中文"})
+    return record
+
+
+def random_index(rng: random.Random, count: int) -> dict:
+    wallpapers = {}
+    for i in range(count):
+        wallpapers[f"{rng.getrandbits(48):012x}_{rng.choice(NAMES)}_{i}"] = random_record(rng)
+    return {"version": "2.0", "last_updated": rng.uniform(0, 2e9), "total_count": count,
+            "wallpapers": wallpapers}
+
+
+def as_v1(data: bytes) -> bytes:
+    """把当前版本的编码结果改写为版本1：头部版本号为1，记录去掉末尾的感知哈希"""
+    _, _, reserved, meta_len, strings_len, count = HEADER.unpack_from(data)
+    offset = HEADER.size + meta_len + strings_len
+    records = data[offset:]
+    v1_records = b"".join(records[i * RECORD.size:i * RECORD.size + RECORD_V1.size] for i in range(count))
+    header = HEADER.pack(MAGIC, 1, reserved, meta_len, strings_len, count)
+    return header + data[HEADER.size:offset] + v1_records
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_round_trip(seed):
+    rng = random.Random(seed)
+    data = random_index(rng, rng.randrange(0, 40))
+    encoded = encode_index(data)
+    decoded = decode_index(encoded)
+    assert decoded == data
+    assert encode_index(decoded) == encoded
+
+
+def test_empty_index():
+    data = {"wallpapers": {}}
+    assert decode_index(encode_index(data)) == data
+
+
+def test_sparse_record_gets_defaults():
+    """缺少的字段解码为 None 或默认值"""
+    decoded = decode_index(encode_index({"wallpapers": {"k": {"path": "/壁纸/a.jpg"}}}))
+    record = decoded["wallpapers"]["k"]
+    assert record["path"] == "/壁纸/a.jpg"
+    assert record["display_name"] == "a.jpg"
+    assert record["relative_path"] == ""
+    assert record["excluded"] is False
+    assert record["last_accessed"] == 0.0 and record["added_date"] == 0.0
+    for field in ("hash", "hash_algo", "sample_hash", "crop_region", "cache_path", "thumb_ref",
+                  "file_size", "mtime_ns", "inode", "device", "phash"):
+        assert record[field] is None, field
+
+
+def test_empty_strings_only():
+    """字符串表只有一个空字符串时也能解码"""
+    data = {"wallpapers": {"": {"path": "", "relative_path": "", "display_name": ""}}}
+    record = decode_index(encode_index(data))["wallpapers"][""]
+    assert record["path"] == "" and record["relative_path"] == "" and record["display_name"] == ""
+
+
+def test_rejects_bad_files():
+    encoded = encode_index(random_index(random.Random(1), 3))
+    with pytest.raises(ValueError):
+        decode_index(encoded[:HEADER.size - 1])
+    with pytest.raises(ValueError):
+        decode_index(b"XXXX" + encoded[4:])
+    with pytest.raises(ValueError):
+        decode_index(encoded[:-1])
+    future = bytearray(encoded)
+    struct.pack_into("<H", future, 4, FORMAT_VERSION + 1)
+    with pytest.raises(ValueError):
+        decode_index(bytes(future))
+
+
+def test_migrations_cover_every_version():
+    assert sorted(MIGRATIONS) == list(range(FORMAT_VERSION))
+
+
+def test_migrate_v0_iso_timestamps():
+    """版本0（JSON）-> 版本1：ISO 时间戳转换为 epoch 秒，数字和空值保持不变"""
+    data = {"wallpapers": {
+        "a": {"path": "/a.jpg", "last_accessed": "2024-01-02T03:04:05", "added_date": "1700000000.5"},
+        "b": {"path": "/b.jpg", "last_accessed": 12.5, "added_date": ""},
+        "c": {"path": "/c.jpg"},
+    }}
+    expected_a = __import__("datetime").datetime(2024, 1, 2, 3, 4, 5).timestamp()
+    migrated = MIGRATIONS[0](json.loads(json.dumps(data)))["wallpapers"]
+    assert migrated["a"]["last_accessed"] == expected_a
+    assert migrated["a"]["added_date"] == 1700000000.5
+    assert migrated["b"]["last_accessed"] == 12.5 and migrated["b"]["added_date"] == 0.0
+    assert "last_accessed" not in migrated["c"]
+
+
+def test_migrate_v1_keeps_records():
+    data = random_index(random.Random(7), 5)
+    assert MIGRATIONS[1](json.loads(json.dumps(data))) == data
+
+
+def test_migrate_v0_to_current_then_round_trip():
+    data = {"wallpapers": {"k": {"path": "/壁纸/a.jpg", "relative_path": "a.jpg",
+                                 "last_accessed": "2024-01-02T03:04:05", "added_date": "2023-05-06T00:00:00"}}}
+    migrated = migrate(json.loads(json.dumps(data)), 0)
+    decoded = decode_index(encode_index(migrated))
+    record = decoded["wallpapers"]["k"]
+    assert record["added_date"] == migrated["wallpapers"]["k"]["added_date"] > 0
+    assert record["phash"] is None
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_decode_v1_records(seed):
+    """版本1的文件解码后迁移到当前版本，感知哈希为 None，其余字段不变"""
+    data = random_index(random.Random(seed), 10)
+    decoded = decode_index(as_v1(encode_index(data)))
+    for record in data["wallpapers"].values():
+        record["phash"] = None
+    assert decoded == data
+
+
+def test_store_migrates_legacy_json(tmp_path):
+    legacy = JsonIndexStore(str(tmp_path / "index.json"))
+    legacy.save({"wallpapers": {"k": {"path": "/壁纸/a.jpg", "relative_path": "a.jpg",
+                                      "last_accessed": "2024-01-02T03:04:05"}}})
+    legacy.close()
+    store = BinaryIndexStore(str(tmp_path / "index.bin"), legacy_json=legacy.path)
+    assert store.exists()
+    data = store.load()
+    assert isinstance(data["wallpapers"]["k"]["last_accessed"], float)
+    assert store.save(data)
+    store.close()
+    reloaded = BinaryIndexStore(str(tmp_path / "index.bin")).load()
+    assert reloaded["wallpapers"]["k"]["last_accessed"] == data["wallpapers"]["k"]["last_accessed"]
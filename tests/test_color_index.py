@@ -0,0 +1,55 @@
+"""颜色查询：skip 中的键在取前 limit 个之前去掉，已启用图片不会被挤出结果"""
+import random
+
+import pytest
+
+from app.models.color_index import ColorIndex
+from app.models.picture import Picture
+from app.models.secondary_index import PictureIndexes
+
+
+def random_palette(rng):
+    return "".join(f"{rng.randrange(256):02x}{rng.randrange(256):02x}{rng.randrange(256):02x}{rng.randrange(1, 256):02x}"
+                   for _ in range(3))
+
+
+@pytest.fixture
+def colors():
+    rng = random.Random(7)
+    index = ColorIndex()
+    features = {f"k{i}": (rng.random(), rng.random(), random_palette(rng)) for i in range(300)}
+    index.add_many(features.items())
+    skip = set(rng.sample(sorted(features), 120))
+    return index, skip, random_palette(rng)
+
+
+@pytest.mark.parametrize("limit", [None, 0, 1, 10, 500])
+def test_skip_matches_filtering_full_result(colors, limit):
+    index, skip, palette = colors
+    for query in (lambda **kw: index.by_luminance(0.6, 0.1, **kw),
+                  lambda **kw: index.similar_palette(palette, **kw),
+                  lambda **kw: index.nearest_color((200, 40, 40), **kw)):
+        expected = [item for item in query(limit=None) if item[1] not in skip]
+        result = query(limit=limit, skip=skip)
+        assert result == (expected[:limit] if limit is not None else expected)
+        assert not skip & {key for _, key in result}
+
+
+def test_skip_ignores_unknown_and_removed_keys(colors):
+    index, _, palette = colors
+    index.remove("k0")
+    assert index.similar_palette(palette, 5, skip={"k0", "不存在"}) == \
+        [item for item in index.similar_palette(palette) if item[1] != "k0"][:5]
+
+
+def test_indexes_filter_by_state():
+    pictures = {}
+    for i in range(20):
+        pictures[f"k{i}"] = Picture.from_dict({"path": f"/p/{i}.jpg", "palette": "ff0000ff",
+                                               "luminance": i / 20, "excluded": i % 3 == 0})
+    indexes = PictureIndexes()
+    indexes.rebuild(pictures)
+    enabled = [key for _, key in indexes.by_luminance(1.0, 0.0, 3, excluded=False)]
+    assert enabled == ["k1", "k2", "k4"]
+    assert all(pictures[key].excluded for _, key in indexes.by_luminance(1.0, 0.0, None, excluded=True))
+    assert len(indexes.nearest_color((255, 0, 0), None)) == 20
@@ -0,0 +1,68 @@
+"""哈希流水线：单个文件出错时工作线程不退出，结束标记总会送出；旧索引的完整MD5在工作线程中算好"""
+import hashlib
+import os
+import threading
+
+import pytest
+
+from app.models import index_pipeline
+from app.models.index_pipeline import HashPipeline
+
+
+def write_files(root, count):
+    for i in range(count):
+        with open(os.path.join(root, f"img{i}.jpg"), "wb") as f:
+            f.write(os.urandom(100 + i))
+
+
+def run_with_timeout(pipeline, timeout=10.0):
+    results = []
+    thread = threading.Thread(target=lambda: results.extend(pipeline.run()), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "流水线没有结束"
+    return results
+
+
+def test_failed_file_does_not_hang(tmp_path, monkeypatch):
+    write_files(tmp_path, 8)
+    original = index_pipeline.fingerprint_file
+
+    def flaky(item, *args, **kwargs):
+        if item.filepath.endswith("img3.jpg"):
+            raise RuntimeError("读取失败")
+        return original(item, *args, **kwargs)
+
+    monkeypatch.setattr(index_pipeline, "fingerprint_file", flaky)
+    results = run_with_timeout(HashPipeline(str(tmp_path), {}, workers=2))
+    assert [r.seq for r in results] == list(range(8))
+    failed = [r for r in results if r.failed]
+    assert len(failed) == 1 and failed[0].filepath.endswith("img3.jpg")
+    assert failed[0].known_key is None
+    assert all(r.sample_hash for r in results if not r.failed)
+
+
+def test_every_file_failing(tmp_path, monkeypatch):
+    write_files(tmp_path, 5)
+
+    def broken(item, *args, **kwargs):
+        raise ValueError("坏文件")
+
+    monkeypatch.setattr(index_pipeline, "fingerprint_file", broken)
+    results = run_with_timeout(HashPipeline(str(tmp_path), {}, workers=3))
+    assert len(results) == 5 and all(r.failed for r in results)
+
+
+@pytest.mark.parametrize("legacy, verify, algorithm", [
+    (True, False, "md5"), (True, True, "md5"), (True, True, "sha256"), (False, False, "md5"),
+])
+def test_legacy_md5_computed_by_workers(tmp_path, legacy, verify, algorithm):
+    write_files(tmp_path, 4)
+    results = run_with_timeout(HashPipeline(str(tmp_path), {}, workers=2, verify=verify,
+                                            algorithm=algorithm, legacy=legacy))
+    for r in results:
+        with open(r.filepath, "rb") as f:
+            expected = hashlib.md5(f.read()).hexdigest()
+        assert r.legacy_md5 == (expected if legacy else None)
+        if verify:
+            assert r.hash_algo == algorithm
@@ -0,0 +1,87 @@
+"""部分加载的图片：非核心字段在读写前加载，加载不会覆盖本次会话中的修改"""
+import pytest
+
+from app.models.picture import Picture
+
+EXTRA = {"hash_algo": "blake2b", "sample_hash": "s1", "phash": "00ff", "file_size": 10, "mtime_ns": 5,
+         "width": 1920, "height": 1080, "luminance": 0.5, "colorfulness": 0.1, "palette": "ff0000ff",
+         "crop_region": {"x": 1.0, "y": 2.0, "width": 3.0, "height": 4.0}, "cache_path": "key"}
+
+
+def partial_picture(extra=EXTRA):
+    """只有核心字段的图片，首次访问非核心字段时由加载回调填充 extra"""
+    pic = Picture.from_dict({"path": "/壁纸/a.jpg", "relative_path": "a.jpg", "hash": "h"}, partial=True)
+    loads = []
+
+    def loader(key, picture):
+        loads.append(key)
+        picture.load_extra(dict(extra))
+
+    pic._key = "k"
+    pic._loader = loader
+    return pic, loads
+
+
+def test_core_fields_do_not_load():
+    pic, loads = partial_picture()
+    assert pic.path == "/壁纸/a.jpg" and pic.hash == "h" and not pic.excluded
+    assert loads == []
+
+
+def test_hash_algo_reads_stored_value():
+    """部分加载时不能报告构造时的默认算法"""
+    pic, loads = partial_picture()
+    assert pic.hash_algo == "blake2b"
+    assert loads == ["k"]
+
+
+def test_hash_algo_defaults_to_md5_for_legacy_records():
+    pic, _ = partial_picture({})
+    assert pic.hash_algo == "md5"
+
+
+@pytest.mark.parametrize("setter, field, value", [
+    (lambda pic: pic.set_color_features({"luminance": 0.9, "colorfulness": 0.2, "palette": "00ff00ff"}),
+     "palette", "00ff00ff"),
+    (lambda pic: pic.set_image_info({"width": 800, "height": 600}), "width", 800),
+    (lambda pic: pic.set_fingerprint(file_hash="h2", hash_algo="sha256"), "hash_algo", "sha256"),
+    (lambda pic: pic.set_phash("abcd"), "phash", "abcd"),
+    (lambda pic: pic.update_crop({"x": 0.0, "y": 0.0, "width": 1.0, "height": 1.0}, "new"), "cache_path", "new"),
+])
+def test_writes_survive_to_dict(setter, field, value):
+    pic, loads = partial_picture()
+    setter(pic)
+    assert loads == ["k"]
+    assert pic.is_modified()
+    data = pic.to_dict()
+    assert data[field] == value
+    # 没有修改的字段来自索引
+    assert data["sample_hash"] == "s1" and data["file_size"] == 10
+    assert loads == ["k"]
+
+
+def test_full_picture_never_calls_loader():
+    pic = Picture.from_dict(dict(EXTRA, path="/a.jpg", relative_path="a.jpg", hash="h"))
+    pic._loader = lambda key, picture: pytest.fail("不应加载")
+    assert pic.to_dict()["palette"] == "ff0000ff"
+
+
+@pytest.mark.parametrize("path, relative_path, expected", [
+    ("/壁纸/子目录/a.jpg", "子目录/a.jpg", "子目录/a.jpg"),
+    ("/壁纸/a.jpg", "a.jpg", "a.jpg"),
+    ("/壁纸/a.jpg", "", "a.jpg"),
+    ("/壁纸/新名字.jpg", "旧目录/旧名字.jpg", "旧目录/旧名字.jpg"),
+    ("/壁纸/a.jpg", "b.jpg", "b.jpg"),
+    ("/壁纸/a.jpg", "不以文件名结尾", "不以文件名结尾"),
+])
+def test_relative_path_round_trip(path, relative_path, expected):
+    """保存的相对路径与 path 的文件名不同时原样保留，缺少时由文件名得出"""
+    pic = Picture.from_dict({"path": path, "relative_path": relative_path})
+    assert pic.path == path and pic.relative_path == expected
+    assert Picture.from_dict(pic.to_dict()).relative_path == expected
+
+
+def test_update_path_replaces_stored_relative_path():
+    pic = Picture.from_dict({"path": "/壁纸/a.jpg", "relative_path": "其他/b.jpg"})
+    pic.update_path("/壁纸/新/c.jpg", "新/c.jpg")
+    assert pic.relative_path == "新/c.jpg" and pic._rel_path is None
@@ -0,0 +1,50 @@
+"""有序索引：逐个修改和批量合并得到的顺序都与整体排序一致"""
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from app.models.secondary_index import SortedIndex
+
+
+def expected(values):
+    return [key for _, key in sorted((value, key) for key, value in values.items())]
+
+
+@pytest.mark.parametrize("seed", range(10))
+@pytest.mark.parametrize("batch", [1, 10, SortedIndex.MERGE_THRESHOLD + 1, 500])
+def test_updates_match_full_sort(seed, batch):
+    rng = random.Random(seed)
+    index = SortedIndex(lambda pic: pic.value)
+    values = {f"k{i}": rng.randrange(100) for i in range(300)}
+    index.rebuild({key: SimpleNamespace(value=value) for key, value in values.items()})
+    assert index.keys() == expected(values)
+    for _ in range(5):
+        for _ in range(batch):
+            key = f"k{rng.randrange(400)}"
+            if rng.random() < 0.2:
+                index.remove(key)
+                values.pop(key, None)
+            else:
+                values[key] = rng.randrange(100)
+                index.update(key, SimpleNamespace(value=values[key]))
+        assert index.keys() == expected(values)
+        assert index.keys(reverse=True) == expected(values)[::-1]
+
+
+def test_updates_before_first_query_use_source():
+    pictures = {"a": SimpleNamespace(value=2), "b": SimpleNamespace(value=1)}
+    index = SortedIndex(lambda pic: pic.value)
+    index.rebuild(pictures)
+    pictures["c"] = SimpleNamespace(value=0)
+    index.update("c", pictures["c"])
+    assert index.keys() == ["c", "b", "a"]
+
+
+def test_remove_then_update_same_key():
+    index = SortedIndex(lambda pic: pic.value)
+    index.rebuild({"a": SimpleNamespace(value=1), "b": SimpleNamespace(value=2)})
+    index.keys()
+    index.remove("a")
+    index.update("a", SimpleNamespace(value=3))
+    assert index.keys() == ["b", "a"]
@@ -0,0 +1,69 @@
+"""缩略图包压缩：索引先保存新的偏移再替换包文件，中断时旧偏移和新偏移都不会读到其他图片"""
+import os
+
+import pytest
+
+from app.models.thumbnail_pack import ThumbnailPack
+
+
+def filled_pack(path, count=6):
+    pack = ThumbnailPack(str(path))
+    refs = {f"h{i}": pack.append(f"h{i}", bytes([i]) * (10 + i)) for i in range(count)}
+    return pack, refs
+
+
+def test_compact_calls_before_replace_with_moved_refs(tmp_path):
+    pack, refs = filled_pack(tmp_path / "t.pack")
+    live = [refs["h1"], refs["h4"]]
+    seen = {}
+
+    def before_replace(moved):
+        seen.update(moved)
+        # 替换之前包文件仍是旧的
+        assert pack.read(*refs["h0"]) == bytes([0]) * 10
+        return True
+
+    moved = pack.compact(live, before_replace)
+    assert moved == seen and set(moved) == set(live)
+    assert pack.read(*moved[refs["h4"]], hashes=("h4",)) == bytes([4]) * 14
+    assert pack.lookup("h0") is None
+    assert not os.path.exists(pack.temp_path)
+    reopened = ThumbnailPack(pack.path)
+    assert reopened.lookup("h1") == moved[refs["h1"]]
+
+
+def test_compact_abandoned_when_index_not_saved(tmp_path):
+    pack, refs = filled_pack(tmp_path / "t.pack")
+    size = os.path.getsize(pack.path)
+    assert pack.compact([refs["h2"]], lambda moved: False) is None
+    assert os.path.getsize(pack.path) == size
+    assert not os.path.exists(pack.temp_path)
+    assert all(pack.read(*ref, hashes=(file_hash,)) for file_hash, ref in refs.items())
+
+
+def test_interrupted_compact_keeps_old_pack(tmp_path):
+    """保存索引之后、替换包文件之前中断：临时文件被丢弃，新偏移按哈希核对后被拒绝"""
+    pack, refs = filled_pack(tmp_path / "t.pack")
+
+    def crash(moved):
+        raise KeyboardInterrupt
+
+    moved = {}
+    with pytest.raises(KeyboardInterrupt):
+        pack.compact([refs["h3"], refs["h5"]], lambda m: moved.update(m) or crash(m))
+    assert os.path.exists(pack.temp_path)
+
+    reopened = ThumbnailPack(pack.path)
+    assert reopened.read(*refs["h5"], hashes=("h5",)) == bytes([5]) * 15
+    assert not os.path.exists(pack.temp_path)
+    for old, new in moved.items():
+        file_hash = next(h for h, ref in refs.items() if ref == old)
+        data = reopened.read(*new, hashes=(file_hash,))
+        assert data is None or data == bytes([int(file_hash[1:])]) * (10 + int(file_hash[1:]))
+
+
+def test_read_rejects_other_hash(tmp_path):
+    pack, refs = filled_pack(tmp_path / "t.pack", 2)
+    assert pack.read(*refs["h0"], hashes=("h1", None)) is None
+    assert pack.read(*refs["h0"], hashes=(None, "h0")) == bytes([0]) * 10
+    assert pack.read(*refs["h0"]) == bytes([0]) * 10